@@ -0,0 +1,453 @@
+import re
+import sqlite3
+
+from flask import Blueprint, current_app, jsonify, request, session
+
+import auth
+import passwords
+import queries
+import recipes
+import throttle
+from db import get_read_db
+from writer import write
+
+# json api for scripts and scanner clients: the inventory, the ingredient catalog,
+# categories and macros, without html or redirects.
+#
+#   GET    /api/v1/<resource>         list. inventory and ingredients page like the
+#                                     html pages (?after= ?before= ?per_page=, the
+#                                     cursors come back as next / prev)
+#   POST   /api/v1/<resource>         create, 201 with the new item
+#   GET    /api/v1/<resource>/<id>    one item
+#   PATCH  /api/v1/<resource>/<id>    change the fields given, 200 with the item
+#   DELETE /api/v1/<resource>/<id>    204
+#   POST   /api/v1/batch              {"operations": [{"method", "path", "body", "query"}, ...],
+#                                      "atomic": false}
+#
+# resources are inventory, ingredients, categories and macros. categories and
+# macros are referred to by name everywhere else, like the forms and the importer
+# do. POST /api/v1/inventory with a name the catalog doesn't have creates the
+# ingredient too when a category is given, one call instead of the html pages' three.
+#
+# every operation is a function of (db, user id, item id, body, query args)
+# returning (status, payload), so a batch runs the same code as single requests.
+# all of a batch goes through one write(), one transaction, each operation in its
+# own savepoint so a failing one only undoes itself; with "atomic": true any
+# failure rolls back the lot. results come back per operation, in order.
+#
+# auth is the session cookie the pages use, POST /api/v1/login {"login",
+# "password"} gets one. writes must be sent as application/json, which a cross
+# site form can't do, so the api doesn't need csrf tokens.
+
+MAX_BATCH = 1000
+
+OPERATION_PATH = re.compile(r"^(?:/api/v1)?/?([a-z]+)(?:/(\d+))?/?$")
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+class ApiError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class BatchFailed(Exception):
+
+    def __init__(self, results):
+        super().__init__("batch rolled back")
+        self.results = results
+
+
+###################################################################################
+## request bodies
+
+def _text(body, key, required=False, default=None, lower=True, min_length=1, max_length=50):
+    value = body.get(key)
+    if value is None:
+        if required:
+            raise ApiError(422, f"{key} is required")
+        return default
+    if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+        raise ApiError(422, f"{key} must be a string")
+    value = str(value).strip()
+    if lower:
+        value = value.lower()
+    if not min_length <= len(value) <= max_length:
+        raise ApiError(422, f"{key} must be {min_length}-{max_length} characters")
+    return value
+
+
+# an ingredient name, stored stripped + lowercased like the forms do
+def _ingredient_name(body, default=None):
+    return _text(body, "ingredient", required=default is None, default=default, min_length=2)
+
+
+# a category name that exists, None if the body has none
+def _category(db, body, required=False):
+    name = _text(body, "category", required, lower=False)
+    if name is not None and queries.category_id_by_name(db, name) is None:
+        raise ApiError(422, f"unknown category {name!r}")
+    return name
+
+
+# macro ids for the "macros" list of names, None if the body has none
+def _macro_ids(db, body):
+    macros = body.get("macros")
+    if macros is None:
+        return None
+    if not isinstance(macros, list) or not all(isinstance(macro, str) for macro in macros):
+        raise ApiError(422, "macros must be a list of names")
+    found = queries.macro_ids_by_name(db, macros)
+    unknown = [macro for macro in macros if macro not in found]
+    if unknown:
+        raise ApiError(422, f"unknown macros: {', '.join(unknown)}")
+    return [found[macro] for macro in macros]
+
+
+def _name_taken(db, name, ingredient_id=None):
+    if queries.ingredient_name_taken(db, name, ingredient_id):
+        raise ApiError(409, f"ingredient '{name}' already exists")
+
+
+###################################################################################
+## operations: (db, user_id, item_id, body, args) -> (status, payload)
+
+def _page(fetch, args, to_json):
+    try:
+        page = fetch({name: str(args[name]) for name in ("after", "before", "per_page") if args.get(name)})
+    except ValueError:
+        raise ApiError(400, "invalid page cursor or page size") from None
+    return 200, {"items": [to_json(row) for row in page.rows], "next": page.next_cursor, "prev": page.prev_cursor}
+
+
+def _inventory_json(row):
+    return {"id": row.id, "ingredient": row.ingredient, "category": row.category, "quantity": row.quantity,
+            "macros": row.macros.split(", ") if row.macros else [], "last_updated": row.last_updated}
+
+
+def _ingredient_json(db, ingredient):
+    return {"id": ingredient.id, "ingredient": ingredient.ingredient_name, "category": ingredient.category_name,
+            "macros": queries.ingredient_macro_names(db, ingredient.id)}
+
+
+def _inventory_row(db, user_id, inventory_id):
+    row = queries.inventory_row(db, inventory_id, user_id)
+    if row is None:
+        raise ApiError(404, f"no inventory item {inventory_id}")
+    return row
+
+
+def list_inventory(db, user_id, item_id, body, args):
+    return _page(lambda page_args: queries.user_inventory_page(db, user_id, page_args), args, _inventory_json)
+
+
+def get_inventory(db, user_id, item_id, body, args):
+    return 200, _inventory_json(_inventory_row(db, user_id, item_id))
+
+
+def create_inventory(db, user_id, item_id, body, args):
+    name = _ingredient_name(body)
+    quantity = _text(body, "quantity", default="1")
+    inventory_id = queries.add_inventory_by_name(db, user_id, name, quantity)
+    if inventory_id is None:
+        existing = queries.ingredient_by_name(db, name)
+        if existing:
+            raise ApiError(409, f"'{existing.ingredient_name}' is already in the inventory")
+        category = _category(db, body)
+        if category is None:
+            raise ApiError(404, f"'{name}' is not in the catalog, send a category to create it")
+        queries.create_ingredient(db, name, category, _macro_ids(db, body) or ())
+        inventory_id = queries.add_inventory_by_name(db, user_id, name, quantity)
+    return 201, _inventory_json(_inventory_row(db, user_id, inventory_id))
+
+
+# like the edit form: the quantity and category are the inventory row's, a new
+# name and macros change the catalog ingredient
+def patch_inventory(db, user_id, item_id, body, args):
+    item = queries.inventory_item(db, item_id, user_id)
+    if item is None:
+        raise ApiError(404, f"no inventory item {item_id}")
+    name = _ingredient_name(body, item.ingredient_name)
+    if name != item.ingredient_name:
+        _name_taken(db, name, item.ingredient_id)
+    macro_ids = _macro_ids(db, body)
+    if macro_ids is None:
+        macro_ids = queries.ingredient_macro_ids(db, item.ingredient_id)
+    queries.update_inventory(db, item_id, user_id, name, _category(db, body) or item.category_name,
+                             _text(body, "quantity", default=item.quantity), macro_ids)
+    return 200, _inventory_json(_inventory_row(db, user_id, item_id))
+
+
+def delete_inventory(db, user_id, item_id, body, args):
+    if not queries.delete_inventory(db, item_id, user_id):
+        raise ApiError(404, f"no inventory item {item_id}")
+    return 204, None
+
+
+def _ingredient(db, ingredient_id):
+    ingredient = queries.ingredient_by_id(db, ingredient_id)
+    if ingredient is None:
+        raise ApiError(404, f"no ingredient {ingredient_id}")
+    return ingredient
+
+
+# list items leave out the macros, that would be a query per row
+def list_ingredients(db, user_id, item_id, body, args):
+    return _page(lambda page_args: queries.catalog_page(db, page_args), args,
+                 lambda row: {"id": row.id, "ingredient": row.ingredient, "category": row.category})
+
+
+def get_ingredient(db, user_id, item_id, body, args):
+    return 200, _ingredient_json(db, _ingredient(db, item_id))
+
+
+def create_ingredient(db, user_id, item_id, body, args):
+    name = _ingredient_name(body)
+    category = _category(db, body, required=True)
+    ingredient_id = queries.create_ingredient(db, name, category, _macro_ids(db, body) or ())
+    if ingredient_id is None:
+        raise ApiError(409, f"ingredient '{name}' already exists")
+    return 201, _ingredient_json(db, _ingredient(db, ingredient_id))
+
+
+def patch_ingredient(db, user_id, item_id, body, args):
+    ingredient = _ingredient(db, item_id)
+    name = _ingredient_name(body, ingredient.ingredient_name)
+    if name != ingredient.ingredient_name:
+        _name_taken(db, name, item_id)
+    queries.update_ingredient(db, item_id, name, _category(db, body) or ingredient.category_name)
+    macro_ids = _macro_ids(db, body)
+    if macro_ids is not None:
+        queries.set_ingredient_macros(db, item_id, macro_ids)
+    return 200, _ingredient_json(db, _ingredient(db, item_id))
+
+
+def delete_ingredient(db, user_id, item_id, body, args):
+    if not queries.delete_ingredient(db, item_id):
+        raise ApiError(404, f"no ingredient {item_id}")
+    return 204, None
+
+
+# categories and macros are (id, name) rows with the same five operations
+def _reference(label, sql_list, by_id, create, update, delete, in_use):
+
+    def as_json(row):
+        return {"id": row[0], "name": row[1]}
+
+    def lookup(db, item_id):
+        row = by_id(db, item_id)
+        if row is None:
+            raise ApiError(404, f"no {label} {item_id}")
+        return row
+
+    def list_items(db, user_id, item_id, body, args):
+        return 200, {"items": [as_json(row) for row in db.execute(sql_list)]}
+
+    def get_item(db, user_id, item_id, body, args):
+        return 200, as_json(lookup(db, item_id))
+
+    def create_item(db, user_id, item_id, body, args):
+        name = _text(body, "name", required=True, lower=False)
+        new_id = create(db, name)
+        if new_id is None:
+            raise ApiError(409, f"{label} {name!r} already exists")
+        return 201, {"id": new_id, "name": name}
+
+    def patch_item(db, user_id, item_id, body, args):
+        row = lookup(db, item_id)
+        name = _text(body, "name", default=row[1], lower=False)
+        try:
+            update(db, item_id, name)
+        except sqlite3.IntegrityError:
+            raise ApiError(409, f"{label} {name!r} already exists") from None
+        return 200, {"id": item_id, "name": name}
+
+    def delete_item(db, user_id, item_id, body, args):
+        try:
+            deleted = delete(db, item_id)
+        except sqlite3.IntegrityError:
+            raise ApiError(409, in_use) from None
+        if not deleted:
+            raise ApiError(404, f"no {label} {item_id}")
+        return 204, None
+
+    return {"list": list_items, "get": get_item, "create": create_item, "patch": patch_item, "delete": delete_item}
+
+
+RESOURCES = {
+    "inventory": {"list": list_inventory, "get": get_inventory, "create": create_inventory,
+                  "patch": patch_inventory, "delete": delete_inventory},
+    "ingredients": {"list": list_ingredients, "get": get_ingredient, "create": create_ingredient,
+                    "patch": patch_ingredient, "delete": delete_ingredient},
+    "categories": _reference("category", queries.CATEGORY_IDS, queries.category_by_id, queries.create_category,
+                             queries.update_category, queries.delete_category,
+                             "ingredients are still filed under this category"),
+    "macros": _reference("macro", queries.MACROS, queries.macro_by_id, queries.create_macro,
+                         queries.update_macro, queries.delete_macro, "macro is in use"),
+}
+
+COLLECTION_ACTIONS = {"GET": "list", "POST": "create"}
+ITEM_ACTIONS = {"GET": "get", "PATCH": "patch", "DELETE": "delete"}
+
+
+def _operation(method, resource, item_id):
+    handlers = RESOURCES.get(resource)
+    if handlers is None:
+        raise ApiError(404, f"no resource {resource!r}")
+    action = (COLLECTION_ACTIONS if item_id is None else ITEM_ACTIONS).get(method)
+    if action is None:
+        raise ApiError(405, f"{method} not allowed on {'a single item' if item_id else 'a collection'}")
+    return handlers[action]
+
+
+# run one operation. a unique constraint that fires anyway (someone else took a
+# name in the meantime) is a conflict, like in the html routes
+def _run(db, operation, user_id, item_id, body, args):
+    try:
+        return operation(db, user_id, item_id, body, args)
+    except sqlite3.IntegrityError:
+        raise ApiError(409, "conflicts with an existing item") from None
+
+
+# (per operation results, whether any inventory write went through). with
+# WRITE_QUEUE_ENABLED this runs on the writer thread, app is for the config the
+# paged GETs read
+def _batch(db, app, user_id, operations, atomic):
+    with app.app_context():
+        return _run_batch(db, user_id, operations, atomic)
+
+
+def _run_batch(db, user_id, operations, atomic):
+    results = []
+    failed = changed_inventory = False
+    for entry in operations:
+        db.execute("SAVEPOINT api_operation")
+        try:
+            if not isinstance(entry, dict):
+                raise ApiError(422, "operation must be an object")
+            match = OPERATION_PATH.match(str(entry.get("path", "")))
+            if not match:
+                raise ApiError(404, f"bad path {entry.get('path')!r}")
+            body, args = entry.get("body") or {}, entry.get("query") or {}
+            if not isinstance(body, dict) or not isinstance(args, dict):
+                raise ApiError(422, "body and query must be objects")
+            method = str(entry.get("method", "GET")).upper()
+            resource, item_id = match.group(1), int(match.group(2)) if match.group(2) else None
+            status, payload = _run(db, _operation(method, resource, item_id), user_id, item_id, body, args)
+        except ApiError as e:
+            db.execute("ROLLBACK TO api_operation")
+            db.execute("RELEASE api_operation")
+            results.append({"status": e.status, "error": e.message})
+            failed = True
+        else:
+            db.execute("RELEASE api_operation")
+            results.append({"status": status, "body": payload})
+            changed_inventory = changed_inventory or (resource == "inventory" and method != "GET")
+    if atomic and failed:
+        raise BatchFailed(results)
+    return results, changed_inventory
+
+
+###################################################################################
+## routes
+
+def _body():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise ApiError(400, "the body must be a JSON object")
+    return body
+
+
+def _respond(status, payload):
+    return (jsonify(payload), status) if payload is not None else ("", status)
+
+
+@api.errorhandler(ApiError)
+def api_error(e):
+    return jsonify(error=e.message), e.status
+
+
+@api.before_request
+def check_request():
+    if request.method in ("POST", "PATCH") and not request.is_json:
+        return jsonify(error="send the body as application/json"), 415
+    if request.endpoint != "api.login" and "username" not in session:
+        return jsonify(error="login required"), 401
+
+
+@api.route("/login", methods=["POST"])
+def login():
+    body = _body()
+    login_name, password = body.get("login"), body.get("password")
+    if not isinstance(login_name, str) or not isinstance(password, str) or not login_name or not password:
+        raise ApiError(422, "login and password are required")
+
+    retry_after = throttle.check_login(request.remote_addr, login_name)
+    if retry_after is not None:
+        return jsonify(error="too many login attempts"), 429, {"Retry-After": str(retry_after)}
+
+    user = queries.user_by_login(get_read_db(), login_name)
+    try:
+        if user is None or not passwords.check_password(password, user["hashed_password"]):
+            raise ApiError(401, "invalid login or password")
+        if passwords.needs_rehash(user["hashed_password"]):
+            write(queries.rehash_password, user["id"], user["hashed_password"], passwords.hash_password(password))
+    except passwords.PasswordBusy:
+        return jsonify(error="too many logins right now, try again in a moment"), 503
+
+    session['user_id'] = user["id"]
+    session['username'] = user["username"]
+    return jsonify(id=user["id"], username=user["username"])
+
+
+@api.route("/logout", methods=["POST"])
+def logout():
+    session.clear()
+    return "", 204
+
+
+@api.route("/batch", methods=["POST"])
+def batch():
+    body = _body()
+    operations = body.get("operations")
+    if not isinstance(operations, list):
+        raise ApiError(422, "operations must be a list")
+    if len(operations) > MAX_BATCH:
+        raise ApiError(413, f"at most {MAX_BATCH} operations per batch")
+
+    user_id = auth.current_user_id()
+    try:
+        results, changed_inventory = write(_batch, current_app._get_current_object(), user_id, operations,
+                                           bool(body.get("atomic")))
+    except BatchFailed as e:
+        return jsonify(committed=False, results=e.results), 409
+
+    # like the html routes, a changed inventory warms its recipe search
+    if changed_inventory:
+        recipes.schedule_prefetch(user_id)
+    return jsonify(committed=True, results=results)
+
+
+@api.route("/<resource>", methods=["GET", "POST"])
+@api.route("/<resource>/<int:item_id>", methods=["GET", "PATCH", "DELETE"])
+def resource(resource, item_id=None):
+    operation = _operation(request.method, resource, item_id)
+    user_id = auth.current_user_id()
+    body = _body() if request.method in ("POST", "PATCH") else {}
+    args = request.args.to_dict()
+    if request.method == "GET":
+        return _respond(*_run(get_read_db(), operation, user_id, item_id, body, args))
+
+    status, payload = write(_run, operation, user_id, item_id, body, args)
+    if resource == "inventory":
+        recipes.schedule_prefetch(user_id)
+    return _respond(status, payload)
+
+
+def init_app(app):
+    app.register_blueprint(api)
+    # writes only take application/json (checked above), which is what keeps other sites out
+    app.extensions["csrf"].exempt(api)
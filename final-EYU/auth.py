@@ -0,0 +1,10 @@
+from flask import g, session
+
+# the logged in user, shared by the pages (flaskapp.py) and the json api (api.py)
+
+
+# user id is put in the session at login, no need to look it up by username
+def current_user_id():
+    if '_user_id' not in g:
+        g._user_id = session.get('user_id')
+    return g._user_id
@@ -1,19 +1,19 @@
 import sqlite3
+import migrate
+import names
 
-conn = sqlite3.connect("inventory.db")
+if __name__ == "__main__":
+    conn = sqlite3.connect("inventory.db")
 
-cursor = conn.cursor()
+    # create / upgrade schema
+    migrate.upgrade(conn, echo=print)
+    # insert data
+    migrate.seed(conn)
 
-# create schema
-with open("schema.sql", "r") as schema:
-    cursor.executescript(schema.read())
-# insert data
-with open("data.sql", "r") as data:
-    cursor.executescript(data.read())
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM ingredient WHERE ingredient_name IS NULL")
+    cursor.execute("UPDATE ingredient SET ingredient_name = 'jiaozi dumplings', normalized_name = ? WHERE ingredient_name ='jiaozi'",
+                   (names.canonical_name("jiaozi dumplings"),))
 
-cursor.execute("DELETE FROM ingredient WHERE ingredient_name IS NULL")
-cursor.execute("UPDATE ingredient SET ingredient_name = 'jiaozi dumplings' WHERE ingredient_name ='jiaozi'")
-
-
-conn.commit()
-conn.close()
\ No newline at end of file
+    conn.commit()
+    conn.close()
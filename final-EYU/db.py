@@ -0,0 +1,185 @@
+import sqlite3
+import threading
+
+from flask import current_app, g
+
+# pragmas applied to every new connection. order matters a little:
+# journal_mode has to be set before anything opens a transaction
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,       # ms to wait on a locked db instead of failing
+    "cache_size": -16000,       # negative = KiB, so ~16MB page cache
+    "mmap_size": 134217728,     # 128MB
+    "foreign_keys": "ON",       # needed for ON DELETE CASCADE in schema.sql
+    "temp_store": "MEMORY",
+}
+
+
+# open a connection with the pragma profile applied. read_only opens with mode=ro,
+# so the connection can't write even by accident
+def connect(database, pragmas=None, read_only=False, isolation_level=""):
+    if read_only:
+        db = sqlite3.connect(f"file:{database}?mode=ro", uri=True, check_same_thread=False, isolation_level=isolation_level)
+    else:
+        db = sqlite3.connect(database, check_same_thread=False, isolation_level=isolation_level)
+    db.row_factory = sqlite3.Row
+
+    for name, value in (DEFAULT_PRAGMAS if pragmas is None else pragmas).items():
+        # journal_mode can't be changed from a read only connection
+        if read_only and name == "journal_mode":
+            continue
+        db.execute(f"PRAGMA {name} = {value}")
+
+    return db
+
+
+# keeps idle connections around so requests don't pay connection setup
+# + pragma round trips on every hit. a connection is only ever used by one
+# thread at a time: it is handed out by acquire() and given back by release()
+class ConnectionPool:
+
+    def __init__(self, database, pragmas=None, max_idle=8, read_only=False):
+        self.database = database
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.max_idle = max_idle
+        self.read_only = read_only
+
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {"opened": 0, "reused": 0, "closed": 0, "in_use": 0, "rollbacks": 0}
+
+    def _connect(self):
+        return connect(self.database, self.pragmas, read_only=self.read_only)
+
+    def acquire(self):
+        with self._lock:
+            db = self._idle.pop() if self._idle else None
+            self._stats["in_use"] += 1
+            if db is not None:
+                self._stats["reused"] += 1
+                return db
+
+        try:
+            db = self._connect()
+        except Exception:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            raise
+
+        with self._lock:
+            self._stats["opened"] += 1
+        return db
+
+    def release(self, db):
+        # don't hand a connection with a half finished transaction to the next request
+        try:
+            if db.in_transaction:
+                db.rollback()
+                with self._lock:
+                    self._stats["rollbacks"] += 1
+            reusable = True
+        except sqlite3.ProgrammingError:
+            # connection was closed by the caller
+            reusable = False
+
+        with self._lock:
+            self._stats["in_use"] -= 1
+            if reusable and not self._closed and len(self._idle) < self.max_idle:
+                self._idle.append(db)
+                return
+            if reusable:
+                self._stats["closed"] += 1
+
+        if reusable:
+            db.close()
+
+    def close_all(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._stats["closed"] += len(idle)
+
+        for db in idle:
+            db.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+        stats["database"] = self.database
+        return stats
+
+
+def get_pool(app=None, read_only=False):
+    app = app or current_app
+    pools = app.extensions.setdefault("sqlite_pools", {})
+    key = "ro" if read_only else "rw"
+    database = app.config["DATABASE"]
+
+    pool = pools.get(key)
+    # DATABASE can be swapped (tests do this), so don't keep serving the old file
+    if pool is None or pool.database != database:
+        if pool is not None:
+            pool.close_all()
+        pool = pools[key] = ConnectionPool(
+            database,
+            pragmas=app.config.get("SQLITE_PRAGMAS"),
+            max_idle=app.config.get("SQLITE_POOL_SIZE", 8),
+            read_only=read_only,
+        )
+    return pool
+
+
+def close_pools(app=None):
+    app = app or current_app
+    for pool in app.extensions.pop("sqlite_pools", {}).values():
+        pool.close_all()
+    # the write queue (writer.py) keeps its own connection
+    writer = app.extensions.pop("sqlite_writer", None)
+    if writer is not None:
+        writer.close()
+
+
+def pool_stats(app=None):
+    app = app or current_app
+    stats = {key: pool.stats() for key, pool in app.extensions.get("sqlite_pools", {}).items()}
+    writer = app.extensions.get("sqlite_writer")
+    if writer is not None:
+        stats["writer"] = writer.stats()
+    return stats
+
+
+# request scoped connection, borrowed from the pool
+def get_db():
+    db = getattr(g, '_database', None)
+    if db is None:
+        pool = g._database_pool = get_pool()
+        db = g._database = pool.acquire()
+    return db
+
+
+# request scoped mode=ro connection for views that only read
+def get_read_db():
+    db = getattr(g, '_read_database', None)
+    if db is None:
+        pool = g._read_database_pool = get_pool(read_only=True)
+        db = g._read_database = pool.acquire()
+    return db
+
+
+# give connections back to the pool at the end of the request
+def close_connection(exception):
+    for name in ('_database', '_read_database'):
+        db = g.pop(name, None)
+        pool = g.pop(name + '_pool', None)
+        if db is not None:
+            pool.release(db)
+
+
+def init_app(app):
+    app.config.setdefault("DATABASE", "inventory.db")
+    app.config.setdefault("SQLITE_PRAGMAS", dict(DEFAULT_PRAGMAS))
+    app.config.setdefault("SQLITE_POOL_SIZE", 8)
+    app.teardown_appcontext(close_connection)
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import time
+
+from flask import current_app, make_response, request, session
+from flask_wtf.csrf import generate_csrf
+
+import queries
+
+# conditional GET for the home (inventory) and catalog pages.
+#
+# both pages re-ran their joins and re-rendered everything on every visit, even
+# when nothing changed since the browser last loaded them. now the etag is
+# worked out first, from the version counters the triggers keep (see
+# migrations/0011): the user's inventory version and the catalog tables' versions,
+# one primary key lookup each. if the browser sends it back in If-None-Match the
+# answer is an empty 304 and no join runs.
+#
+# besides the data the rendered page holds the session's csrf token (which
+# expires after WTF_CSRF_TIME_LIMIT) and whatever the templates look like, so
+# those go into the etag too: a new session, half the token lifetime passing or
+# a deploy with changed templates all mean a fresh render.
+#
+# Cache-Control: no-cache makes the browser revalidate every time instead of
+# showing a stale copy, the revalidation is what's cheap now.
+
+
+def _template_hash(app):
+    digest = hashlib.sha1()
+    for root, dirs, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        dirs.sort()
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as f:
+                digest.update(name.encode() + b"\0" + f.read())
+    return digest.hexdigest()[:12]
+
+
+def _csrf_part():
+    config = current_app.config
+    if not config.get("WTF_CSRF_ENABLED", True):
+        return ""
+    # the page will hold a token for this session, make sure it exists before we hash it
+    generate_csrf()
+    limit = config.get("WTF_CSRF_TIME_LIMIT", 3600)
+    bucket = int(time.time() // (limit / 2)) if limit else 0
+    return f"{session.get(config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'))}:{bucket}"
+
+
+# strong etag for a page built from the user's inventory (user_id) and / or the catalog
+def page_etag(db, user_id=None):
+    inventory, catalog = queries.page_versions(db, user_id)
+    parts = (current_app.extensions.get("template_hash", ""), request.full_path, user_id,
+             session.get("username"), inventory, catalog, _csrf_part())
+    return hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:32]
+
+
+# 304 if the browser's copy is still current, else render() with the etag attached
+def conditional(etag, render):
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def init_app(app):
+    app.extensions["template_hash"] = _template_hash(app)
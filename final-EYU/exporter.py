@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+import queries
+
+# streaming CSV / NDJSON export. rows come straight off the sqlite cursor (no
+# fetchall) and are written out in ~64KB pieces, optionally gzipped as they go,
+# so exporting a huge inventory costs the worker one buffer, not the result set.
+# column names match what importer.py reads, so an export can be imported again
+
+FORMATS = ("csv", "ndjson")
+
+MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+INVENTORY_COLUMNS = ("ingredient", "category", "quantity", "macros", "last_updated")
+
+INGREDIENT_COLUMNS = ("ingredient", "category", "macros")
+
+FLUSH_SIZE = 64 * 1024
+
+
+# since=YYYY-MM-DD or YYYY-MM-DD HH:MM:SS, same format as inventory.last_updated.
+# raises ValueError for anything else
+def parse_since(value):
+    if not value:
+        return ""
+    return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _encode(rows, columns, fmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+
+    for row in rows:
+        if writer:
+            writer.writerow([row[column] for column in columns])
+        else:
+            buffer.write(json.dumps({column: row[column] for column in columns}))
+            buffer.write("\n")
+
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_rows(cursor, columns, fmt="csv", compress=False):
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}, expected one of {FORMATS}")
+    chunks = _encode(cursor, columns, fmt)
+    return _gzip(chunks) if compress else chunks
+
+
+def inventory_rows(db, user_id, since=""):
+    return db.execute(queries.EXPORT_INVENTORY, {"user_id": user_id, "since": since})
+
+
+def ingredient_rows(db):
+    return db.execute(queries.EXPORT_INGREDIENTS)
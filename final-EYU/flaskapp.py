@@ -1,46 +1,173 @@
-from flask import Flask, request, render_template, redirect, url_for, session, g
-from flask_bcrypt import Bcrypt
+from flask import Flask, request, render_template, redirect, url_for, session, jsonify, Response, stream_with_context, abort, make_response
 from flask_wtf import CSRFProtect
-from forms import ItemForm, UpdateForm, CreateUserForm, LoginForm, InventoryForm, InventoryItemForm
+from forms import ItemForm, UpdateForm, CreateUserForm, LoginForm, InventoryForm, InventoryItemForm, ImportForm
 from dotenv import load_dotenv
 import os
-import sqlite3
 import requests
+import sqlite3
+import db as database
+from db import get_db, get_read_db
+from writer import write
+import auth
+import queries
+import migrate
+import importer
+import exporter
+import pagination
+import refdata
+import recipe_cache
+import recipe_details
+import spoonacular
+import passwords
+import throttle
+import etags
+import fragments
+import api
+import jobs
+import recipes
+import local_recipes
+import query_planner
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY')
-print("SECRET KEY LOADED:", app.secret_key)
+# never print the key itself, only whether there is one
+if not app.secret_key:
+    app.logger.warning("FLASK_SECRET_KEY is not set, sessions and csrf tokens won't work")
 
 csrf = CSRFProtect(app)
-bcrypt = Bcrypt(app)
 
-SPOONACULAR_API_KEY = os.getenv("SPOONACULAR_API_KEY")
+# recipe api client, see spoonacular.py. SPOONACULAR_BASE_URL can point at spoonacular_stub.py
+app.config['SPOONACULAR_API_KEY'] = os.getenv("SPOONACULAR_API_KEY")
+app.config['SPOONACULAR_BASE_URL'] = os.getenv("SPOONACULAR_BASE_URL", spoonacular.DEFAULT_BASE_URL)
+app.config['SPOONACULAR_CONNECT_TIMEOUT'] = float(os.getenv("SPOONACULAR_CONNECT_TIMEOUT", 3.05))
+app.config['SPOONACULAR_READ_TIMEOUT'] = float(os.getenv("SPOONACULAR_READ_TIMEOUT", 10))
+
+app.config['DATABASE'] = os.getenv('DATABASE', 'inventory.db')
+# send every mutation through the single writer thread (group commit), see writer.py
+app.config['WRITE_QUEUE_ENABLED'] = os.getenv('WRITE_QUEUE_ENABLED', '0') == '1'
+# rows per page on the inventory and ingredient pages, ?per_page= overrides up to MAX_PAGE_SIZE
+app.config['PAGE_SIZE'] = int(os.getenv('PAGE_SIZE', pagination.DEFAULT_PAGE_SIZE))
+app.config['SUGGEST_LIMIT'] = int(os.getenv('SUGGEST_LIMIT', 10))
+# recipe search cache, see recipe_cache.py. seconds fresh, seconds servable while stale, upstream calls per day
+app.config['RECIPE_CACHE_TTL'] = int(os.getenv('RECIPE_CACHE_TTL', recipe_cache.DEFAULT_TTL))
+app.config['RECIPE_CACHE_STALE'] = int(os.getenv('RECIPE_CACHE_STALE', recipe_cache.DEFAULT_STALE))
+app.config['RECIPE_API_DAILY_QUOTA'] = int(os.getenv('RECIPE_API_DAILY_QUOTA', recipe_cache.DEFAULT_DAILY_QUOTA))
+# big pantries are searched in chunks of this many names, at most this many chunks, see query_planner.py
+app.config['RECIPE_QUERY_CHUNK_SIZE'] = int(os.getenv('RECIPE_QUERY_CHUNK_SIZE', query_planner.DEFAULT_CHUNK_SIZE))
+app.config['RECIPE_QUERY_MAX_CHUNKS'] = int(os.getenv('RECIPE_QUERY_MAX_CHUNKS', query_planner.DEFAULT_MAX_CHUNKS))
+# where suggestions come from: auto (local corpus, then the api), local or spoonacular, see recipes.py
+app.config['RECIPE_SOURCE'] = os.getenv('RECIPE_SOURCE', 'auto')
+# recipe details on the suggestions page, see recipe_details.py. seconds the page waits, seconds cached
+app.config['RECIPE_DETAIL_TIMEOUT'] = float(os.getenv('RECIPE_DETAIL_TIMEOUT', recipe_details.DEFAULT_TIMEOUT))
+app.config['RECIPE_DETAIL_TTL'] = int(os.getenv('RECIPE_DETAIL_TTL', recipe_details.DEFAULT_TTL))
+# bcrypt in a process pool, see passwords.py. no BCRYPT_LOG_ROUNDS = calibrate to the target at startup
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', 0)) or None
+app.config['PASSWORD_HASH_TARGET_MS'] = int(os.getenv('PASSWORD_HASH_TARGET_MS', passwords.DEFAULT_TARGET_MS))
+app.config['PASSWORD_POOL_ENABLED'] = os.getenv('PASSWORD_POOL_ENABLED', '1') == '1'
+app.config['PASSWORD_WORKERS'] = int(os.getenv('PASSWORD_WORKERS', 0)) or None
+# login attempts per window per ip / per login name, see throttle.py. sqlite = shared by all workers
+app.config['LOGIN_THROTTLE_ENABLED'] = os.getenv('LOGIN_THROTTLE_ENABLED', '1') == '1'
+app.config['LOGIN_THROTTLE_BACKEND'] = os.getenv('LOGIN_THROTTLE_BACKEND', 'memory')
+app.config['LOGIN_THROTTLE_WINDOW'] = int(os.getenv('LOGIN_THROTTLE_WINDOW', throttle.DEFAULT_WINDOW))
+app.config['LOGIN_THROTTLE_IP_LIMIT'] = int(os.getenv('LOGIN_THROTTLE_IP_LIMIT', throttle.DEFAULT_IP_LIMIT))
+app.config['LOGIN_THROTTLE_LOGIN_LIMIT'] = int(os.getenv('LOGIN_THROTTLE_LOGIN_LIMIT', throttle.DEFAULT_LOGIN_LIMIT))
+# memory for pre-rendered inventory / catalog table bodies, see fragments.py. 0 = off
+app.config['FRAGMENT_CACHE_BYTES'] = int(os.getenv('FRAGMENT_CACHE_BYTES', fragments.DEFAULT_MAX_BYTES))
+# background jobs, see jobs.py. off = jobs are queued but only run by `flask jobs run`
+app.config['JOBS_ENABLED'] = os.getenv('JOBS_ENABLED', '1') == '1'
+app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))
+# seconds after the last inventory change before its recipe search is warmed, negative = never
+app.config['RECIPE_PREFETCH_DELAY'] = float(os.getenv('RECIPE_PREFETCH_DELAY', recipes.DEFAULT_PREFETCH_DELAY))
+
+# pick the bcrypt work factor, see passwords.py
+passwords.init_app(app)
+
+# etags for the home and catalog pages, see etags.py
+etags.init_app(app)
+
+# pooled connections, see db.py. get_db() hands out one connection per request
+database.init_app(app)
+
+# flask --app flaskapp db upgrade|status|seed, see migrate.py
+migrate.init_app(app)
+# flask --app flaskapp import-data FILE, see importer.py
+importer.init_app(app)
+# flask --app flaskapp jobs status|run, and the runner itself, see jobs.py
+jobs.init_app(app)
+# flask --app flaskapp recipes import FILE|status, see local_recipes.py
+local_recipes.init_app(app)
+# json api under /api/v1/, see api.py
+api.init_app(app)
+
+# connection pool counters, handy when load testing
+@app.route('/stats/db')
+def db_stats():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    return jsonify(database.pool_stats())
 
-DATABASE = 'inventory.db'
+# recipe api client counters, circuit state and latency histogram
+@app.route('/stats/api')
+def api_stats():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    return jsonify(spoonacular.get_client().stats())
 
-# connect database
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row 
-    return db
+# password pool counters and the bcrypt work factor in use
+@app.route('/stats/passwords')
+def password_stats():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    pool = passwords.get_pool()
+    return jsonify(work_factor=passwords.work_factor(), pool=pool.stats() if pool else None)
+
+BUSY_MESSAGE = "Lots of people are signing in right now. Please try again in a moment."
+
+# fragment cache counters: table bodies served from memory vs rendered
+@app.route('/stats/fragments')
+def fragment_stats():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    cache = fragments.get_cache()
+    return jsonify(cache.stats() if cache else None)
 
-#close connection
-@app.teardown_appcontext
-def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+# login throttle counters: attempts let through and shed, per ip / per login name
+@app.route('/stats/login')
+def login_stats():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    limiter = throttle.get_throttle()
+    return jsonify(limiter.stats() if limiter else None)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
 
-    if form.validate_on_submit():
+    # too many attempts from this ip or at this account: turn it away before the
+    # user lookup and the password check
+    if request.method == 'POST':
+        retry_after = throttle.check_login(request.remote_addr, request.form.get('login_field', ''))
+        if retry_after is not None:
+            form.login_field.errors = [f"Too many login attempts. Please try again in {retry_after} seconds."]
+            return render_template('login.html', form=form), 429, {'Retry-After': str(retry_after)}
+
+    try:
+        valid = form.validate_on_submit()
+    except passwords.PasswordBusy:
+        form.password.errors = [BUSY_MESSAGE]
+        return render_template('login.html', form=form), 503
+
+    if valid:
         if form.user:
+            # stored with an older work factor: upgrade it while we have the password
+            stored = form.user["hashed_password"]
+            if passwords.needs_rehash(stored):
+                try:
+                    write(queries.rehash_password, form.user["id"], stored, passwords.hash_password(form.password.data))
+                except passwords.PasswordBusy:
+                    pass  # next login will do it
             session['user_id'] = form.user["id"]
             session['username'] = form.user["username"]
             return redirect(url_for('index'))
@@ -59,55 +186,114 @@ def register():
     if form.validate_on_submit():
         username = form.username.data
         email= form.email.data
-        password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        try:
+            password = passwords.hash_password(form.password.data)
+        except passwords.PasswordBusy:
+            form.password.errors.append(BUSY_MESSAGE)
+            return render_template('register.html', form=form), 503
 
-        db = get_db()
-        cur = db.cursor()
-
-        cur.execute("INSERT INTO user (username, email, hashed_password) VALUES (?,?,?)", (username, email, password))
-        db.commit()
+        # the UNIQUE constraints are the real check, the form validators can race
+        if write(queries.create_user, username, email, password) is None:
+            form.username.errors.append("Username or email already associated with an account.")
+            return render_template('register.html', form=form)
 
         return redirect(url_for('login'))
     return render_template('register.html', form=form)
 
 ##########################################################################################################
+# render the inventory home page. every view that shows the inventory table goes through here
+# so the table is always built from the same query. the rows come pre-rendered from
+# fragments.py, only the row being edited is rendered here
+def render_inventory(inventory_form=None, update_form=None, selected_inventory_id=None, **context):
+    db = get_read_db()
+    user_id = auth.current_user_id()
+    update_form = update_form or UpdateForm()
+    try:
+        args = pagination.request_args()
+        table = fragments.table(('inventory', user_id, fragments.args_key(args)), queries.page_versions(db, user_id),
+                                lambda: queries.user_inventory_page(db, user_id, args), 'inventory_rows.html')
+    except ValueError:
+        abort(400, "invalid page cursor or page size")
+    page = table.page
+    rows = fragments.body(table, selected_inventory_id, lambda item: render_template(
+        'inventory_row.html', item=item, page=page, update_form=update_form, selected_inventory_id=selected_inventory_id))
+    return render_template('index.html',
+                           user_inventory=page.rows,
+                           inventory_rows=rows,
+                           page=page,
+                           inventory_form=inventory_form or InventoryForm(),
+                           update_form=update_form,
+                           selected_inventory_id=selected_inventory_id,
+                           **context)
+
+# render the ingredient catalog page (or the add item page, which shows the same data).
+# the rows are the same for everyone and come from fragments.py like the inventory's
+def render_catalog(item_form, template='ingredient.html', update_form=None, selected_ingredient_id=None, **context):
+    db = get_read_db()
+    try:
+        args = pagination.request_args()
+        table = fragments.table(('catalog', fragments.args_key(args)), queries.page_versions(db),
+                                lambda: queries.catalog_page(db, args), 'catalog_rows.html')
+    except ValueError:
+        abort(400, "invalid page cursor or page size")
+    page = table.page
+    rows = fragments.body(table, selected_ingredient_id, lambda ingredient: render_template(
+        'catalog_row.html', ingredient=ingredient, page=page, update_form=update_form,
+        selected_ingredient_id=selected_ingredient_id))
+    return render_template(template, ingredientInventory=page.rows, catalog_rows=rows, page=page, item_form=item_form,
+                           update_form=update_form, selected_ingredient_id=selected_ingredient_id, **context)
+
+# ?after= / ?before= / ?per_page= of the page a form was posted from, so we can send the user back to it
+def page_args():
+    try:
+        return pagination.request_args()
+    except ValueError:
+        return {}
+
+# the edit / save / delete forms on the inventory table are sent with X-Fragment: row
+# by static/js/rows.js, which wants back just the one <tr> to swap in (or nothing)
+def wants_fragment():
+    return request.headers.get('X-Fragment') == 'row'
+
+# one inventory table row on its own, read back on the given connection. costs one row's query
+def render_inventory_row(db, inventory_id, update_form=None, selected=False, status=200):
+    item = queries.inventory_row(db, inventory_id, auth.current_user_id())
+    if item is None:
+        return '', 404
+    response = make_response(render_template('inventory_row.html', item=item, page=pagination.Page([], args=page_args()),
+                                             update_form=update_form or UpdateForm(),
+                                             selected_inventory_id=inventory_id if selected else None), status)
+    response.vary.add('X-Fragment')
+    return response
+
+# fill category dropdown + macro checkboxes on an ItemForm / InventoryItemForm
+def set_item_choices(item_form):
+    db = get_read_db()
+    item_form.category.choices = refdata.category_choices(db)
+    item_form.macros.choices = refdata.macro_choices(db)
+    return item_form
+
+# explain why an ingredient insert didn't happen, only looked up after it failed
+def add_ingredient_errors(item_form, item_name, category_name):
+    db = get_read_db()
+    if refdata.category_id(db, category_name) is None:
+        item_form.category.errors.append("You must choose a valid category.") 
+        return
+
+    existing = queries.ingredient_by_name(db, item_name)
+    if existing and existing.ingredient_name != item_name:
+        item_form.item.errors.append(f"'{item_name}' already exists in the database as '{existing.ingredient_name}'.")
+    else:
+        item_form.item.errors.append(f"'{item_name}' already exists in the database.") 
+
 ## home page is logged in user's ingredient inventory
 @app.route('/', methods=['GET'])
 def index():
     if 'username' not in session:
         return redirect(url_for('login'))
-    
-    db = get_db()
-    cur = db.cursor()
-
-    cur.execute("SELECT ingredient_name FROM ingredient ORDER BY ingredient_name;")
-    all_ingredients = [row["ingredient_name"] for row in cur.fetchall()]
-
-    inventory_form = InventoryForm()
 
-    cur.execute("SELECT id FROM user WHERE username = ?", (session['username'],))
-    user = cur.fetchone()
-    user_id = user["id"]
-
-    cur.execute("""
-        SELECT inventory.id, 
-                ingredient.ingredient_name AS ingredient,
-                category.category_name AS category,
-                inventory.quantity,
-                inventory.last_updated,
-                GROUP_CONCAT(macronutrient.macro_name, ', ') AS macros
-        FROM inventory
-        JOIN category ON inventory.category_id = category.id
-        JOIN ingredient ON inventory.ingredient_id = ingredient.id
-        LEFT JOIN ingredient_macronutrient ON ingredient.id = ingredient_macronutrient.ingredient_id
-        LEFT JOIN macronutrient ON ingredient_macronutrient.macronutrient_id = macronutrient.id
-        WHERE inventory.user_id = ?
-        GROUP BY inventory.id, ingredient.ingredient_name, category.category_name, inventory.quantity, inventory.last_updated
-        ORDER BY inventory.last_updated DESC;
-    """, (user_id,))
-    user_inventory = cur.fetchall()
-
-    return render_template('index.html', user_inventory = user_inventory, inventory_form=inventory_form, all_ingredients=all_ingredients, selected_inventory_id=None, update_form=UpdateForm())
+    # unchanged since the browser's copy: 304 without running the inventory query
+    return etags.conditional(etags.page_etag(get_read_db(), auth.current_user_id()), render_inventory)
 
 # ADD AN EXISTING INGREDIENT TO INVENTORY
 @app.route('/add_ingredient', methods=['POST'])
@@ -115,90 +301,54 @@ def add_ingredient():
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    db = get_db()
-    cur = db.cursor()
-
-    cur.execute("SELECT id FROM user WHERE username = ?", (session['username'],))
-    user = cur.fetchone()
-    user_id = user["id"]
+    user_id = auth.current_user_id()
 
     inventory_form = InventoryForm()
 
-    ## if form validation fails, fetch user inventory data to repopulate table on add_ingredient
+    ## if form validation fails, re-render inventory page with errors
     if not inventory_form.validate_on_submit():
-        cur.execute("""
-            SELECT inventory.id, 
-                    ingredient.ingredient_name AS ingredient,
-                    category.category_name AS category,
-                    inventory.quantity,
-                    inventory.last_updated,
-                    GROUP_CONCAT(macronutrient.macro_name, ', ') AS macros
-            FROM inventory
-            JOIN category ON inventory.category_id = category.id
-            JOIN ingredient ON inventory.ingredient_id = ingredient.id
-            LEFT JOIN ingredient_macronutrient ON ingredient.id = ingredient_macronutrient.ingredient_id
-            LEFT JOIN macronutrient ON ingredient_macronutrient.macronutrient_id = macronutrient.id
-            WHERE inventory.user_id = ?
-            GROUP BY inventory.id, ingredient.ingredient_name, category.category_name, inventory.quantity, inventory.last_updated
-            ORDER BY inventory.last_updated DESC;
-        """, (user_id,))
-        user_inventory = cur.fetchall()
-
-        return render_template('index.html', inventory_form=inventory_form, user_inventory=user_inventory, update_form=UpdateForm())
+        return render_inventory(inventory_form=inventory_form)
     
     # get input from form -- desired ingredient into inventory
     ingredient_name = inventory_form.ingredient.data.strip().lower()
     quantity = inventory_form.quantity.data.strip().lower()
 
-    # ingredient must exist in ingredient table already, so check if it does
-    cur.execute("SELECT id, category_id FROM ingredient WHERE ingredient_name = ?", (ingredient_name,))
-    ingredient = cur.fetchone()
+    # insert existing ingredient to user inventory. one statement, nothing comes back
+    # if the ingredient isn't in the catalog or is already in the inventory
+    if write(queries.add_inventory_by_name, user_id, ingredient_name, quantity):
+        recipes.schedule_prefetch(user_id)
+        # success, go back to inventory page
+        return redirect(url_for('index'))
+
+    db = get_read_db()
+    existing = queries.ingredient_by_name(db, ingredient_name)
 
-    # if it doesn't exist, send form responses to add_inventory_item route to add to ingredient table
-    if not ingredient:
+    if not existing:
+        # probably a typo of something in the catalog, offer that before creating a near duplicate
+        suggestion = queries.similar_ingredient(db, ingredient_name)
+        if suggestion:
+            return render_inventory(inventory_form=inventory_form, suggestion=suggestion)
+
+        # if it doesn't exist, send form responses to add_inventory_item route to add to ingredient table
         return redirect(url_for('add_inventory_item', ingredient_name=ingredient_name, quantity=quantity))
 
-    # get id's of the existing ingredient for future reference
-    ingredient_id = ingredient["id"]
-    category_id = ingredient["category_id"]
-
-    # check if ingredient is already in user inventory
-    cur.execute("SELECT id FROM inventory WHERE user_id = ? AND ingredient_id = ?", (user_id, ingredient_id))
-    existing_inventory = cur.fetchone()
-
-    # if it is, give error and fetch user invetory data to repopulate table on add_ingredient
-    if existing_inventory:
-        inventory_form.ingredient.errors.append(f"'{ingredient_name}' is already in your inventory. Edit to update information.")
-
-        cur.execute("""
-            SELECT inventory.id, 
-                    ingredient.ingredient_name AS ingredient,
-                    category.category_name AS category,
-                    inventory.quantity,
-                    inventory.last_updated,
-                    GROUP_CONCAT(macronutrient.macro_name, ', ') AS macros
-            FROM inventory
-            JOIN category ON inventory.category_id = category.id
-            JOIN ingredient ON inventory.ingredient_id = ingredient.id
-            LEFT JOIN ingredient_macronutrient ON ingredient.id = ingredient_macronutrient.ingredient_id
-            LEFT JOIN macronutrient ON ingredient_macronutrient.macronutrient_id = macronutrient.id
-            WHERE inventory.user_id = ?
-            GROUP BY inventory.id, ingredient.ingredient_name, category.category_name, inventory.quantity, inventory.last_updated
-            ORDER BY inventory.last_updated DESC;
-        """, (user_id,))
-        user_inventory = cur.fetchall()
-
-        return render_template('index.html', inventory_form=inventory_form, user_inventory=user_inventory, update_form=UpdateForm())
-
-    # After validation successful, insert existing ingredient to user inventory
-    cur.execute("""
-        INSERT INTO inventory (user_id, ingredient_id, category_id, quantity)
-        VALUES (?, ?, ?, ?)
-    """, (user_id, ingredient_id, category_id, quantity))
-    db.commit()
-
-    # success, go back to inventory page
-    return redirect(url_for('index'))
+    # otherwise it is already in user inventory, give error
+    inventory_form.ingredient.errors.append(f"'{existing.ingredient_name}' is already in your inventory. Edit to update information.")
+    return render_inventory(inventory_form=inventory_form)
+
+## autocomplete for the add ingredient box. ?q= typed text, ?limit= max names (default SUGGEST_LIMIT)
+@app.route('/api/ingredients/suggest')
+def suggest_ingredients():
+    if 'username' not in session:
+        return jsonify(error="login required"), 401
+
+    q = request.args.get('q', '')[:50]
+    limit = max(1, min(request.args.get('limit', app.config['SUGGEST_LIMIT'], type=int), 50))
+
+    response = jsonify(q=q, suggestions=queries.suggest_ingredients(get_read_db(), q, limit))
+    # the same few letters get typed over and over, let the browser keep answers for a minute
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response
 
 ### ingredient table page. users can see all ingredients in database across users
 @app.route('/ingredient')
@@ -206,37 +356,9 @@ def ingredientpage():
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    db = get_db()
-    cur = db.cursor()
-
-    # fetch all ingredient info, sorted by category
-    cur.execute("""
-        SELECT ingredient.id, category.category_name AS category, ingredient.ingredient_name AS ingredient
-        FROM ingredient
-        JOIN category ON ingredient.category_id = category.id
-        ORDER BY category.category_name;
-    """)
-    ingredientInventory = cur.fetchall()
-
-    # fetch categories for dropdown
-    cur.execute("""
-                SELECT category_name
-                FROM category
-                ORDER BY category_name;
-            """)
-    categories = [("", "Select a Category")] + [(row["category_name"], row["category_name"]) for row in cur.fetchall()]
-
-    # fetch macros for checkboxes
-    cur.execute("SELECT id, macro_name FROM macronutrient ORDER BY macro_name;")
-    macros = [(row["id"], row["macro_name"]) for row in cur.fetchall()]
-
-    # initialize form and populate selection choices
-    item_form = ItemForm()
-    item_form.category.choices = categories
-    item_form.macros.choices = macros 
-
-    # render ingredient page with fetched data
-    return render_template('ingredient.html', ingredientInventory = ingredientInventory, item_form = item_form)
+    # initialize form and populate selection choices, render with all ingredients sorted by category.
+    # unchanged catalog: 304 without running the catalog query
+    return etags.conditional(etags.page_etag(get_read_db()), lambda: render_catalog(set_item_choices(ItemForm())))
 
 ## handles adding item to ingredients when redirected from inventory page
 @app.route('/add_inventory_item', methods=['POST', 'GET'])
@@ -248,171 +370,57 @@ def add_inventory_item():
     ingredient_name = request.args.get('ingredient_name', '').strip().lower()
     quantity = request.args.get('quantity', '').strip().lower()
     
-    db = get_db()
-    cur = db.cursor()
-
-    # get user from session
-    cur.execute("SELECT id FROM user WHERE username = ?", (session['username'],))
-    user = cur.fetchone()
-    user_id = user["id"]
+    user_id = auth.current_user_id()
 
-    # initialize form for inventory
-    item_form = InventoryItemForm()
+    # initialize form for inventory, with category dropdown and macro checkboxes
+    item_form = set_item_choices(InventoryItemForm())
 
     # prefill form on redirect to this page
     if request.method == "GET":
         item_form.item.data = ingredient_name  
         item_form.quantity.data = quantity
 
-    # get categories for dropdown
-    cur.execute("""
-        SELECT category_name
-        FROM category
-        ORDER BY category_name;
-    """)
-    categories = [("", "Select a Category")] + [(row["category_name"], row["category_name"]) for row in cur.fetchall()]
-    item_form.category.choices = categories
-
-    # get macros for checkboxes
-    cur.execute("SELECT id, macro_name FROM macronutrient ORDER BY macro_name;")
-    macros = [(row["id"], row["macro_name"]) for row in cur.fetchall()]
-    item_form.macros.choices = macros
-
-    # fetch all ingredient info, sorted by category for display
-    cur.execute("""
-        SELECT ingredient.id, ingredient.ingredient_name AS ingredient, category.category_name AS category
-        FROM ingredient
-        JOIN category ON ingredient.category_id = category.id
-        ORDER BY category.category_name;
-    """)
-    ingredientInventory = cur.fetchall()
-
     # handle form submission
     if request.method == "POST" and item_form.validate_on_submit():
-        item_name = item_form.item.data.strip()
+        item_name = item_form.item.data.strip().lower()
         category_name = item_form.category.data  
         quantity = item_form.quantity.data.strip()
         selected_macros = item_form.macros.data
 
+        # add ingredient to table w/ macros, and to the user's inventory, in one transaction
+        if write(queries.create_inventory_ingredient, user_id, item_name, category_name, quantity, selected_macros):
+            recipes.schedule_prefetch(user_id)
+            #redirect to inventory page after submission
+            return redirect(url_for('index'))
 
-        # validate category
-        cur.execute("SELECT id FROM category WHERE category_name = ?", (category_name,))
-        category = cur.fetchone()
-        
-        if category is None:
-            item_form.category.errors.append("You must choose a valid category.") 
-            return render_template('add_inventory_item.html', ingredientInventory=ingredientInventory, item_form=item_form)
-
-        category_id = category[0] 
-
-        # check if ingredient exists in ingredient table
-        cur.execute("SELECT id FROM ingredient WHERE ingredient_name = ? AND category_id = ?", (item_name, category_id))
-        existing_ingredient = cur.fetchone()
-
-        # prevent duplicates
-        if existing_ingredient:
-            item_form.item.errors.append(f"'{item_name}' already exists in the database.") 
-            return render_template('add_inventory_item.html', ingredientInventory=ingredientInventory, item_form=item_form)
-        
-        # add ingredient to table w/ macros
-        else:
-            cur.execute('INSERT INTO ingredient (ingredient_name, category_id) VALUES (?,?)', (item_name, category_id))
-            ingredient_id = cur.lastrowid  
-            db.commit()
-
-            for macro_id in selected_macros:
-                cur.execute("INSERT INTO ingredient_macronutrient (ingredient_id, macronutrient_id) VALUES (?, ?)", (ingredient_id, macro_id))
-                db.commit()
-
-        # check if ingredient is in user inventory
-        cur.execute("SELECT id FROM inventory WHERE user_id = ? AND ingredient_id = ?", (user_id, ingredient_id))
-        existing_inventory = cur.fetchone()
-
-        if not existing_inventory:
-            # add to inventory
-            cur.execute("""
-                INSERT INTO inventory (user_id, ingredient_id, category_id, quantity)
-                VALUES (?, ?, ?, ?)
-            """, (user_id, ingredient_id, category_id, quantity))
-            db.commit()
-
-        #redirect to inventory page after submission
-        return redirect(url_for('index'))
+        # nothing inserted: unknown category or duplicate name
+        add_ingredient_errors(item_form, item_name, category_name)
+        return render_catalog(item_form, 'add_inventory_item.html')
     
     # render this page with prefilled form data
-    return render_template('add_inventory_item.html', ingredientInventory=ingredientInventory, item_form=item_form)
+    return render_catalog(item_form, 'add_inventory_item.html')
 
 # ADD INGREDIENT TO INGREDIENT TABLE FROM INGREDIENT PAGE
 @app.route('/add_item', methods=['POST'])
 def add_item():
 
-    #initialize form for add ingredient
-    item_form = ItemForm(request.form)
-
-    db = get_db()
-    cur = db.cursor()
-
-    #fetch categories for dropdown
-    cur.execute("""
-        SELECT category_name
-        FROM category
-        ORDER BY category_name;
-    """)
-    categories = [("", "Select a Category")] + [(row["category_name"], row["category_name"]) for row in cur.fetchall()]
-    item_form.category.choices = categories
-
-    #fetch macros for checkboxes
-    cur.execute("SELECT id, macro_name FROM macronutrient ORDER BY macro_name;")
-    macros = [(row["id"], row["macro_name"]) for row in cur.fetchall()]
-    item_form.macros.choices = macros
-
-    # fetch ingredient list with categories
-    cur.execute("""
-        SELECT ingredient.id, ingredient.ingredient_name AS ingredient, category.category_name AS category
-        FROM ingredient
-        JOIN category ON ingredient.category_id = category.id
-        ORDER BY category.category_name;
-    """)
-    ingredientInventory = cur.fetchall()
+    #initialize form for add ingredient, with category dropdown and macro checkboxes
+    item_form = set_item_choices(ItemForm(request.form))
 
     # allows for wtforms error messages on validation failure
     if not item_form.validate_on_submit():
-        return render_template('ingredient.html', ingredientInventory=ingredientInventory, item_form=item_form)
+        return render_catalog(item_form)
     
-    # retrieve form inputs
-    item_name = item_form.item.data.strip()
+    # retrieve form inputs, cleaned the same way as the other add paths
+    item_name = item_form.item.data.strip().lower()
     category_name = item_form.category.data 
     selected_macros = item_form.macros.data 
 
-    # fetch categories
-    cur.execute("SELECT id FROM category WHERE category_name = ?", (category_name,))
-    category = cur.fetchone()
-        
-    # if selected category doesn't exist in database, error message
-    if category is None:
-        item_form.category.errors.append("You must choose a valid category.") 
-        return render_template('ingredient.html', ingredientInventory=ingredientInventory, item_form=item_form)
-    
-    category_id = category[0] #get id
-
-    # fetch ingredients
-    cur.execute("SELECT id FROM ingredient WHERE ingredient_name = ? AND category_id = ?", (item_name, category_id))
-    existing_ingredient = cur.fetchone()
-
-    # if selected ingredient already exists in database, error message
-    if existing_ingredient:
-        item_form.item.errors.append(f"'{item_name}' already exists in the database.") 
-        return render_template('ingredient.html', ingredientInventory=ingredientInventory, item_form=item_form)
-    
-    # if all checks passed, insert ingredient into table
-    cur.execute('INSERT INTO ingredient (ingredient_name, category_id) VALUES (?,?)', (item_name, category_id))
-    ingredient_id = cur.lastrowid  # get id of new item
-    db.commit()
-
-    # if all checks passed, insert macros into junction table
-    for macro_id in selected_macros:
-        cur.execute("INSERT INTO ingredient_macronutrient (ingredient_id, macronutrient_id) VALUES (?, ?)", (ingredient_id, macro_id))
-        db.commit()
+    # insert ingredient into table and macros into junction table
+    if not write(queries.create_ingredient, item_name, category_name, selected_macros):
+        # nothing inserted: unknown category or duplicate name
+        add_ingredient_errors(item_form, item_name, category_name)
+        return render_catalog(item_form)
     
     # redirect to ingredient page after submission
     return redirect(url_for('ingredientpage'))
@@ -423,92 +431,29 @@ def edit_inventory(inventory_id):
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    db = get_db()
-    cur = db.cursor()
-    user_id = session.get('user_id')
+    db = get_read_db()
 
     # fetch inventory item details for current user
-    cur.execute("""
-        SELECT inventory.id, inventory.ingredient_id, ingredient.ingredient_name, 
-               category.category_name, inventory.quantity
-        FROM inventory
-        JOIN ingredient ON inventory.ingredient_id = ingredient.id
-        JOIN category ON ingredient.category_id = category.id
-        WHERE inventory.id = ? AND inventory.user_id = ?
-    """, (inventory_id, user_id))
-
-    inventory_item = cur.fetchone()
+    inventory_item = queries.inventory_item(db, inventory_id, auth.current_user_id())
     
     # if item doesn't exist, return to inventory page
     if not inventory_item:
-        return redirect(url_for('index'))
+        return ('', 404) if wants_fragment() else redirect(url_for('index'))
 
-    # dict for easy attribute reference
-    inventory_dict = {
-        "id": inventory_item["id"],
-        "ingredient_id": inventory_item["ingredient_id"],
-        "ingredient_name": inventory_item["ingredient_name"],
-        "category_name": inventory_item["category_name"],
-        "quantity": inventory_item["quantity"],
-    }
-
-   # fetch all macro from db for checkbox options
-    cur.execute("SELECT id, macro_name FROM macronutrient ORDER BY macro_name;")
-    all_macros = [(str(row["id"]), row["macro_name"]) for row in cur.fetchall()]
-
-    # fetch macros currently assigned to this ingredient
-    cur.execute("""
-        SELECT macronutrient.id
-        FROM ingredient_macronutrient
-        JOIN macronutrient ON ingredient_macronutrient.macronutrient_id = macronutrient.id
-        WHERE ingredient_macronutrient.ingredient_id = ?
-    """, (inventory_item["ingredient_id"],))
-    
-    selected_macros = [str(row["id"]) for row in cur.fetchall()] 
-
-    # fetch categories from db for dropdown
-    cur.execute("SELECT category_name FROM category ORDER BY category_name;")
-    categories = [("", "Select a Category")] + [(row["category_name"], row["category_name"]) for row in cur.fetchall()]
-
-    # fetch all inventory data for table while editing item
-    cur.execute("""
-        SELECT inventory.id, 
-               ingredient.ingredient_name AS ingredient,
-               category.category_name AS category, 
-               inventory.quantity, 
-               inventory.last_updated,
-               GROUP_CONCAT(macronutrient.macro_name, ', ') AS macros
-        FROM inventory
-        JOIN ingredient ON inventory.ingredient_id = ingredient.id
-        JOIN category ON ingredient.category_id = category.id
-        LEFT JOIN ingredient_macronutrient ON ingredient.id = ingredient_macronutrient.ingredient_id
-        LEFT JOIN macronutrient ON ingredient_macronutrient.macronutrient_id = macronutrient.id
-        WHERE inventory.user_id = ?
-        GROUP BY inventory.id, ingredient.ingredient_name, category.category_name, inventory.quantity, inventory.last_updated
-        ORDER BY inventory.last_updated DESC;
-    """, (user_id,))
-    full_inventory_list = cur.fetchall()
-        
     # initialize and prefill the update form
     update_form = UpdateForm()
-    update_form.new_name.data = inventory_dict['ingredient_name']
-    update_form.quantity.data = inventory_dict['quantity']
-    update_form.ingredient_id.data = inventory_dict["ingredient_id"]
-    update_form.macros.choices = all_macros  # set available macros
-    update_form.macros.data = selected_macros  # prefill
-    update_form.new_category.choices = categories
-    update_form.new_category.data = inventory_item['category_name']
-
-    # initialize blank inventory form for homepage to preserve ui
-    inventory_form = InventoryForm() 
-
-    # render inventory page on submission
-    return render_template('index.html', 
-                           update_form=update_form, 
-                           inventory_form=inventory_form, 
-                           inventory=inventory_dict, 
-                           user_inventory=full_inventory_list, 
-                           selected_inventory_id=inventory_id)
+    update_form.new_name.data = inventory_item.ingredient_name
+    update_form.quantity.data = inventory_item.quantity
+    update_form.ingredient_id.data = inventory_item.ingredient_id
+    update_form.macros.choices = refdata.macro_choices(db, as_str=True)  # set available macros
+    update_form.macros.data = [str(macro_id) for macro_id in queries.ingredient_macro_ids(db, inventory_item.ingredient_id)]  # prefill
+    update_form.new_category.choices = refdata.category_choices(db)
+    update_form.new_category.data = inventory_item.category_name
+
+    # just the row expanded into the edit form, or the inventory page with it
+    if wants_fragment():
+        return render_inventory_row(db, inventory_id, update_form, selected=True)
+    return render_inventory(update_form=update_form, selected_inventory_id=inventory_id)
 
 
 # update inventory item details
@@ -518,59 +463,29 @@ def update_inventory(inventory_id):
         return redirect(url_for('login'))
 
     db = get_db()
-    cur = db.cursor()
-    user_id = session.get('user_id')
+    user_id = auth.current_user_id()
 
     update_form = UpdateForm(request.form)
 
-    # fetch and set category choices
-    cur.execute("SELECT id, category_name FROM category ORDER BY category_name;")
-    categories = [(row["category_name"], row["category_name"]) for row in cur.fetchall()]
-    update_form.new_category.choices = [("", "Select a Category")] + categories
-
-    # fetch and set macro choices
-    cur.execute("SELECT id, macro_name FROM macronutrient ORDER BY macro_name;")
-    macros = [(str(row["id"]), row["macro_name"]) for row in cur.fetchall()]
-    update_form.macros.choices = macros
+    # set category and macro choices
+    update_form.new_category.choices = refdata.category_choices(db)
+    update_form.macros.choices = refdata.macro_choices(db, as_str=True)
 
     # fetch details for existing inventory item
-    cur.execute("""
-        SELECT inventory.ingredient_id, ingredient.ingredient_name, category.category_name, inventory.quantity
-        FROM inventory
-        JOIN ingredient ON inventory.ingredient_id = ingredient.id
-        JOIN category ON ingredient.category_id = category.id
-        WHERE inventory.id = ? AND inventory.user_id = ?
-    """, (inventory_id, user_id))
-
-    inventory_item = cur.fetchone()
+    inventory_item = queries.inventory_item(db, inventory_id, user_id)
 
     #if item doesn't exist, reload
     if not inventory_item:
-        return redirect(url_for('index'))
+        return ('', 404) if wants_fragment() else redirect(url_for('index'))
 
-    ingredient_id = inventory_item["ingredient_id"]  # get ingredient_id
+    # trust the row we just loaded over the hidden field, UpdateForm.validate_new_name uses it
+    update_form.ingredient_id.data = inventory_item.ingredient_id
 
-    # if form doesn't validate, render with errors
+    # if form doesn't validate (incl. new name already taken), render with errors
     if not update_form.validate_on_submit():
-        print("validation failed")
-        print(update_form.errors)
-
-        # fetch user's full inventory to display table on validation error render
-        cur.execute("""
-            SELECT inventory.id, ingredient.ingredient_name AS ingredient,
-                   category.category_name AS category, inventory.quantity, inventory.last_updated
-            FROM inventory
-            JOIN ingredient ON inventory.ingredient_id = ingredient.id
-            JOIN category ON ingredient.category_id = category.id
-            WHERE inventory.user_id = ?
-            ORDER BY inventory.last_updated DESC;
-        """, (user_id,))
-        full_inventory_list = cur.fetchall()
-
-        return render_template('index.html', update_form=update_form, 
-                               selected_inventory_id=inventory_id, 
-                               user_inventory=full_inventory_list,
-                               inventory_form=InventoryForm())
+        if wants_fragment():
+            return render_inventory_row(db, inventory_id, update_form, selected=True, status=422)
+        return render_inventory(update_form=update_form, selected_inventory_id=inventory_id)
 
     # get user input from form
     new_ingredient_name = update_form.new_name.data.strip().lower()
@@ -578,48 +493,23 @@ def update_inventory(inventory_id):
     new_category_name = update_form.new_category.data
     selected_macros = update_form.macros.data  
 
-    # fetch category id for updated category
-    cur.execute("SELECT id FROM category WHERE category_name = ?", (new_category_name,))
-    category = cur.fetchone()
-    new_category_id = category["id"]
-
-    # fetch existing ingredient names
-    cur.execute("SELECT id FROM ingredient WHERE ingredient_name = ? AND id != ?", (new_ingredient_name, ingredient_id))
-    existing_ingredient = cur.fetchone()
-
-    # if new ingredient name already exists, render error message
-    if existing_ingredient:
-        update_form.new_name.errors.append(f"Ingredient '{new_ingredient_name}' already exists. Choose a different name.")
-        return render_template('index.html', update_form=update_form, selected_inventory_id=inventory_id)
-
-    # once all checks pass, update ingredient name & category in ingredient table
-    cur.execute("""
-        UPDATE ingredient 
-        SET ingredient_name = ?, category_id = ? 
-        WHERE id = ?
-    """, (new_ingredient_name, new_category_id, ingredient_id))
-
-    # AND update ingredient category and quantity in inventory
-    cur.execute("""
-        UPDATE inventory 
-        SET quantity = ?, category_id = ?, last_updated = CURRENT_TIMESTAMP 
-        WHERE id = ? AND user_id = ?
-    """, (new_quantity, new_category_id, inventory_id, user_id))
-
-    # remove old macros for an item
+    # once all checks pass, update ingredient name & category in ingredient table,
+    # category and quantity in inventory, and replace the item's macros, all in one transaction
     ##(edit form prefills previous macros, so if user doesn't explicitly change them, they will be added back)
-    # because check boxes this is best method to update
-    cur.execute("DELETE FROM ingredient_macronutrient WHERE ingredient_id = ?", (ingredient_id,))
-
-    # isert new macros
-    if selected_macros:
-        cur.executemany(
-            "INSERT INTO ingredient_macronutrient (ingredient_id, macronutrient_id) VALUES (?, ?)",
-            [(ingredient_id, macro_id) for macro_id in selected_macros]
-        )
-
-    db.commit()
-
+    try:
+        write(queries.update_inventory, inventory_id, user_id,
+              new_ingredient_name, new_category_name, new_quantity, selected_macros)
+    except sqlite3.IntegrityError:
+        # someone else took the name after the form validated
+        update_form.new_name.errors.append(f"Ingredient '{new_ingredient_name}' already exists. Choose a different name.")
+        if wants_fragment():
+            return render_inventory_row(db, inventory_id, update_form, selected=True, status=422)
+        return render_inventory(update_form=update_form, selected_inventory_id=inventory_id)
+
+    recipes.schedule_prefetch(user_id)
+    # the saved row in place of the form, instead of the whole page again
+    if wants_fragment():
+        return render_inventory_row(db, inventory_id)
     return redirect(url_for('index'))
 
 ## delete inventory entry
@@ -628,70 +518,37 @@ def delete_inventory(inventory_id):
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    db = get_db()
-    cur = db.cursor()
-
-    # find inventory item associated with user
-    cur.execute("SELECT id FROM inventory WHERE id = ? AND user_id = ?", (inventory_id, session['user_id']))
-    inventory_item = cur.fetchone()
-
-    if not inventory_item:
-        return redirect(url_for('index'))
+    # delete the item if it belongs to this user
+    user_id = auth.current_user_id()
+    if write(queries.delete_inventory, inventory_id, user_id):
+        recipes.schedule_prefetch(user_id)
 
-    # delete it
-    cur.execute("DELETE FROM inventory WHERE id = ? AND user_id = ?", (inventory_id, session['user_id']))
-    db.commit()
-
-    return redirect(url_for('index'))
+    # the row is gone, nothing to swap in
+    if wants_fragment():
+        return ''
+    return redirect(url_for('index', **page_args()))
 
 #fetch ingredient table data and set up form for editing ingredient
 @app.route('/update/<int:ingredient_id>', methods=['GET'])
 def edit_ingredient(ingredient_id):
-    db = get_db()
-    cur = db.cursor()
-
-    # get ingredient info for table
-    cur.execute("""
-        SELECT ingredient.id, ingredient.ingredient_name AS ingredient, category.category_name AS category
-        FROM ingredient
-        JOIN category ON ingredient.category_id = category.id
-        ORDER BY category.category_name;
-    """)
-    ingredientInventory = cur.fetchall()
-    
-    #fetch macros from db for checkboxes
-    cur.execute("SELECT id, macro_name FROM macronutrient ORDER BY macro_name;")
-    macros = [(row["id"], row["macro_name"]) for row in cur.fetchall()]
-
-    #get categories from db for dropdown
-    cur.execute("SELECT category_name FROM category ORDER BY category_name;")
-    categories = [("", "Select a Category")] + [(row["category_name"], row["category_name"]) for row in cur.fetchall()]
+    db = get_read_db()
 
     #initialize form for ingredient input
-    item_form = ItemForm()
-    item_form.category.choices = categories
-    item_form.macros.choices = macros
+    item_form = set_item_choices(ItemForm())
 
     #initilize form for updating ingredients
     update_form = UpdateForm()
-    cur.execute("""
-        SELECT ingredient.ingredient_name, category.category_name 
-        FROM ingredient
-        JOIN category ON ingredient.category_id = category.id
-        WHERE ingredient.id = ?
-    """, (ingredient_id,))
-
-    ingredient = cur.fetchone()
+    ingredient = queries.ingredient_by_id(db, ingredient_id)
 
     #prefill form
     if ingredient:
         update_form.ingredient_id.data = ingredient_id
-        update_form.new_name.data = ingredient["ingredient_name"]
-        update_form.new_category.choices = categories
-        update_form.new_category.data = ingredient["category_name"] 
+        update_form.new_name.data = ingredient.ingredient_name
+        update_form.new_category.choices = item_form.category.choices
+        update_form.new_category.data = ingredient.category_name
 
     #render ingredient page with prefilled update form
-    return render_template('ingredient.html', ingredientInventory=ingredientInventory, item_form=item_form, update_form=update_form, selected_ingredient_id=ingredient_id)
+    return render_catalog(item_form, update_form=update_form, selected_ingredient_id=ingredient_id)
 
 #update ingredients via updateform
 @app.route('/update/<int:ingredient_id>', methods=['POST'])
@@ -701,59 +558,83 @@ def update_ingredient(ingredient_id):
     update_form = UpdateForm(request.form)
     
     db = get_db()
-    cur = db.cursor()
 
     # get categories from db for dropdown
-    cur.execute("""
-        SELECT category_name
-        FROM category
-        ORDER BY category_name;
-    """)
-    categories = [("", "Select a Category")] + [(row["category_name"], row["category_name"]) for row in cur.fetchall()]
-    update_form.new_category.choices = categories
+    update_form.new_category.choices = refdata.category_choices(db)
 
     # if form fails validation, redirect to edit page
     if not update_form.validate_on_submit():
-        return redirect(url_for('edit_ingredient', ingredient_id=ingredient_id))
+        return redirect(url_for('edit_ingredient', ingredient_id=ingredient_id, **page_args()))
     
     # ensure new ingredient is cleaned for database to avoid duplicates in future
     new_name = update_form.new_name.data.strip().lower()
     new_category_name = update_form.new_category.data
-    
-    #validate category
-    cur.execute("SELECT id FROM category WHERE category_name = ?", (new_category_name,))
-    category = cur.fetchone()
-    
-    if category is None:
-        return redirect(url_for('ingredientpage'))  
 
-    new_category_id = category[0] #get id
+    #if all condition met, update name/cat. constraints catch a name taken in the meantime
+    try:
+        write(queries.update_ingredient, ingredient_id, new_name, new_category_name)
+    except sqlite3.IntegrityError:
+        return redirect(url_for('edit_ingredient', ingredient_id=ingredient_id, **page_args()))
 
-    #check if new name already exists in db
-    cur.execute("SELECT ingredient_name, category_id FROM ingredient WHERE id = ?", (ingredient_id,))
-    current_ingredient = cur.fetchone()
-    
-    if not current_ingredient:
-        return redirect(url_for('ingredientpage'))
-    
-    current_name, current_category_id = current_ingredient
-    
-    #if all condition met, update name/cat
-    cur.execute("UPDATE ingredient SET ingredient_name = ?, category_id = ? WHERE id = ?", (new_name, new_category_id, ingredient_id))
-    db.commit()
-
-    return redirect(url_for('ingredientpage')) 
+    return redirect(url_for('ingredientpage', **page_args()))
 
 @app.route('/delete/<int:ingredient_id>', methods=['POST'])
 def delete_ingredient(ingredient_id):
-    db = get_db()
-    cur = db.cursor()
-    
     #delete from db using primary key
-    cur.execute("DELETE FROM ingredient WHERE id = ?", (ingredient_id,))
-    db.commit()
+    write(queries.delete_ingredient, ingredient_id)
+
+    return redirect(url_for('ingredientpage', **page_args()))
 
-    return redirect(url_for('ingredientpage')) 
+## bulk import ingredients (and inventory) from a csv / ndjson upload
+@app.route('/import', methods=['GET', 'POST'])
+def import_data():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+
+    form = ImportForm()
+    result = None
+
+    if form.validate_on_submit():
+        user_id = auth.current_user_id() if form.target.data == "inventory" else None
+        result = importer.import_upload(form.file.data, user_id=user_id)
+
+    return render_template('import.html', form=form, result=result)
+
+# shared by the export routes. ?format=csv|ndjson, ?gzip=1 compresses on the fly
+def export_response(rows, columns, filename):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporter.FORMATS:
+        abort(400, f"format must be one of {', '.join(exporter.FORMATS)}")
+    compress = request.args.get('gzip') == '1'
+
+    body = stream_with_context(exporter.stream_rows(rows, columns, fmt, compress))
+    response = Response(body, mimetype=exporter.MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+## download the user's inventory. ?since= only rows updated at or after that time
+@app.route('/export/inventory')
+def export_inventory():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+
+    try:
+        since = exporter.parse_since(request.args.get('since'))
+    except ValueError:
+        abort(400, "since must be a date or timestamp like 2025-01-31 or 2025-01-31 08:00:00")
+
+    rows = exporter.inventory_rows(get_read_db(), auth.current_user_id(), since)
+    return export_response(rows, exporter.INVENTORY_COLUMNS, 'inventory')
+
+## download the whole ingredient catalog
+@app.route('/export/ingredients')
+def export_ingredients():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+
+    return export_response(exporter.ingredient_rows(get_read_db()), exporter.INGREDIENT_COLUMNS, 'ingredients')
 
 ## api integration to get recipes for inventory items
 @app.route('/get_recipes')
@@ -761,28 +642,28 @@ def get_recipes():
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    db = get_db()
-    cur = db.cursor()
-
-    # fetch all items in user inventory
-    cur.execute("SELECT ingredient.ingredient_name FROM inventory JOIN ingredient ON inventory.ingredient_id = ingredient.id WHERE inventory.user_id = ?", (session['user_id'],))
-    ingredients = [row["ingredient_name"] for row in cur.fetchall()]
+    # fetch all items in user inventory, perishable and recently added first
+    ingredients = recipes.pantry(get_read_db(), auth.current_user_id())
 
     if not ingredients:
         return render_template('recipes.html', error="Your inventory is empty. Add ingredients first!")
 
-    # ingredients must be a comma separated list for search
-    ingredient_list = ",".join(ingredients)
+    # same ingredient set = same search, served from recipe_cache when we have it
+    try:
+        result = recipes.find_recipes(ingredients)
+    except recipe_cache.QuotaExceeded:
+        return render_template('recipes.html', error="We've hit today's recipe search limit. Please try again tomorrow.")
+    except requests.RequestException:
+        return render_template('recipes.html', error="Failed to fetch recipes. Please try again later.")
+
+    if not result.recipes:
+        return render_template('recipes.html', error="No recipes found for your ingredients.")
 
-    # API request -- get recipes by ingredients
-    api_url = f"https://api.spoonacular.com/recipes/findByIngredients?ingredients={ingredient_list}&number=5&apiKey={SPOONACULAR_API_KEY}"
-    response = requests.get(api_url)
+    # ready time, servings and links, as many as arrive within the timeout
+    details = recipes.details(result, timeout=app.config['RECIPE_DETAIL_TIMEOUT'])
 
-    if response.status_code == 200:
-        recipes = response.json()
-        return render_template('recipes.html', recipes=recipes)
-    else:
-        return render_template('recipes.html', error="Failed to fetch recipes. Please try again later.")
+    return render_template('recipes.html', recipes=result.recipes, result=result, details=details,
+                           recipe_url=recipe_details.recipe_url)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -1,13 +1,11 @@
 from flask_wtf import FlaskForm
-from flask_bcrypt import check_password_hash
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, SubmitField, SelectField, HiddenField, PasswordField, SelectMultipleField, widgets
 from wtforms.validators import DataRequired, Email, Length, Regexp, EqualTo, ValidationError, Optional
-import sqlite3
-
-def get_db():
-    db = sqlite3.connect("inventory.db")
-    db.row_factory = sqlite3.Row
-    return db
+# validators share the request's pooled connection (and the app's DATABASE setting)
+from db import get_db
+import queries
+import passwords
 
 class ItemForm(FlaskForm):
     item = StringField("Add Item", validators=[DataRequired(message="There is nothing to add!"), Length(min=2, max=50, message="Hmm, not sure if that's an item.")])
@@ -24,19 +22,8 @@ class UpdateForm(FlaskForm):
     submit = SubmitField("Update")
 
     def validate_new_name(self, field):
-        db = get_db()
-        cur = db.cursor()
-
-        ingredient_id = self.ingredient_id.data 
-
         # does name already exist in db
-        cur.execute("""
-            SELECT id FROM ingredient WHERE ingredient_name = ? AND id != ?
-        """, (field.data.strip().lower(), ingredient_id))
-
-        existing_ingredient = cur.fetchone()
-
-        if existing_ingredient:
+        if queries.ingredient_name_taken(get_db(), field.data.strip().lower(), self.ingredient_id.data):
             raise ValidationError(f"Ingredient '{field.data}' already exists.")
 
 
@@ -50,22 +37,20 @@ class CreateUserForm(FlaskForm):
     confirm = PasswordField("Confirm Password")
     submit = SubmitField("Create Account")
 
+    _taken = None
+
+    # username and email are checked together in one query, the result is reused by both validators
+    def taken(self):
+        if self._taken is None:
+            self._taken = queries.username_email_taken(get_db(), self.username.data, self.email.data)
+        return self._taken
+
     def validate_username(self, username):
-        db =get_db()
-        cur = db.cursor()
-        cur.execute("SELECT id FROM user WHERE username =?", (username.data,))
-        user = cur.fetchone()
-        db.close()
-        if user:
+        if self.taken()[0]:
             raise ValidationError("Username already associated with an account.")
         
     def validate_email(self, email):
-        db =get_db()
-        cur = db.cursor()
-        cur.execute("SELECT id FROM user WHERE email =?", (email.data,))
-        user = cur.fetchone()
-        db.close()
-        if user:
+        if self.taken()[1]:
             raise ValidationError("Email already associated with an account.")
         
 class LoginForm(FlaskForm):
@@ -77,12 +62,8 @@ class LoginForm(FlaskForm):
 
     def validate_login_field(self, login_field):
 
-        db = get_db()
-        cur = db.cursor()
-        
         # get username and password from db
-        cur.execute("SELECT * FROM user WHERE username = ? OR email = ?", (login_field.data, login_field.data))
-        user = cur.fetchone()
+        user = queries.user_by_login(get_db(), login_field.data)
 
         if not user:
             raise ValidationError("Invalid username or email.") 
@@ -95,7 +76,8 @@ class LoginForm(FlaskForm):
         if self.user is None:
             return
 
-        if not check_password_hash(self.user["hashed_password"], password.data):
+        # runs in the password process pool, raises passwords.PasswordBusy when it's saturated
+        if not passwords.check_password(password.data, self.user["hashed_password"]):
             raise ValidationError("Incorrect password.") 
 
 class InventoryForm(FlaskForm):
@@ -108,4 +90,9 @@ class InventoryItemForm(FlaskForm):
     category = SelectField("Category", choices=[("", "Select a Category")], validators=[DataRequired(message="Please select a category!")])
     macros = SelectMultipleField("Macronutrients", coerce=int, option_widget=widgets.CheckboxInput(), widget=widgets.ListWidget(prefix_label=False))
     quantity = StringField("Quantity", validators=[DataRequired(message="Enter a quantity.")])
-    submit = SubmitField("Add")
\ No newline at end of file
+    submit = SubmitField("Add")
+
+class ImportForm(FlaskForm):
+    file = FileField("File", validators=[FileRequired(message="Choose a file to import."), FileAllowed(["csv", "ndjson", "jsonl"], message="Upload a .csv or .ndjson file.")])
+    target = SelectField("Import into", choices=[("inventory", "My inventory"), ("catalog", "Ingredient database only")], default="inventory")
+    submit = SubmitField("Import")
\ No newline at end of file
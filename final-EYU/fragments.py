@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from flask import current_app, render_template
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+
+# rendered table bodies for the home (inventory) and catalog pages.
+#
+# a page of rows is a Jinja loop with an edit form and a delete form per row,
+# and the catalog table is the same for every user. so the <tr>s of a page are
+# rendered once and kept, with the page of rows they came from, under
+#   ("inventory", user id, page args)   valid for that user's inventory version
+#   ("catalog", page args)              valid for the catalog version
+# (queries.page_versions, the same counters the etags use). a later view of the
+# same page at the same version skips both the query and the loop.
+#
+# the cached html can't hold anything per request: the csrf token is rendered
+# as CSRF_PLACEHOLDER and swapped for the session's on the way out, and the row
+# being edited is rendered fresh in place of its cached version.
+#
+# entries are evicted least recently used first once their html passes
+# FRAGMENT_CACHE_BYTES. one slot per user and page, a new version replaces the old.
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+CSRF_PLACEHOLDER = "__fragment_csrf_token__"
+ROW_END = Markup("<!--/row-->")
+# rough size of a cached row's data, next to its html
+ROW_OVERHEAD = 200
+
+_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Table:
+    version: tuple
+    page: object        # pagination.Page the rows came from
+    rows: tuple         # one rendered <tr> per page row
+    size: int
+
+
+class FragmentCache:
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._tables = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key, version):
+        with self._lock:
+            table = self._tables.get(key)
+            if table is None or table.version != version:
+                self._stats["misses"] += 1
+                return None
+            self._tables.move_to_end(key)
+            self._stats["hits"] += 1
+            return table
+
+    def put(self, key, table):
+        if table.size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._tables.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            self._tables[key] = table
+            self.size += table.size
+            while self.size > self.max_bytes:
+                _, evicted = self._tables.popitem(last=False)
+                self.size -= evicted.size
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, tables=len(self._tables), bytes=self.size, max_bytes=self.max_bytes)
+
+
+# the app's cache, None when FRAGMENT_CACHE_BYTES is 0 (then every view renders its rows)
+def get_cache(app=None):
+    app = app or current_app._get_current_object()
+    max_bytes = app.config.get("FRAGMENT_CACHE_BYTES", DEFAULT_MAX_BYTES)
+    if max_bytes <= 0:
+        return None
+    with _cache_lock:
+        cache = app.extensions.get("fragment_cache")
+        if cache is None:
+            cache = app.extensions["fragment_cache"] = FragmentCache(max_bytes)
+    return cache
+
+
+def args_key(args):
+    return tuple(sorted(args.items()))
+
+
+# the rows for key at version, from the cache or load()ed (a pagination.Page) and
+# rendered through template (which puts ROW_END after every row)
+def table(key, version, load, template):
+    # a deploy with new templates must not serve rows rendered by the old ones
+    version = (version, current_app.extensions.get("template_hash"))
+    cache = get_cache()
+    cached = cache.get(key, version) if cache else None
+    if cached is not None:
+        return cached
+
+    page = load()
+    html = render_template(template, page=page, row_end=ROW_END, csrf_token=lambda: CSRF_PLACEHOLDER)
+    rows = tuple(html.split(ROW_END)[:len(page.rows)])
+    rendered = Table(version, page, rows, sum(map(len, rows)) + ROW_OVERHEAD * len(rows))
+    if cache:
+        cache.put(key, rendered)
+    return rendered
+
+
+# the table body for this request: the session's csrf token in, and the row with
+# id selected (if it's on this page) rendered by render(row) instead of the cached one
+def body(table, selected=None, render=None):
+    html = "".join(render(row) if render and row.id == selected else cached
+                   for row, cached in zip(table.page.rows, table.rows))
+    return Markup(html.replace(CSRF_PLACEHOLDER, generate_csrf()))
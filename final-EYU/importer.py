@@ -0,0 +1,233 @@
+import csv
+import io
+import json
+import sqlite3
+from dataclasses import dataclass, field
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+import names
+import queries
+import refdata
+from db import get_read_db
+from writer import write
+
+# streaming bulk import of ingredients (and optionally a user's inventory) from
+# CSV or NDJSON. rows are read one at a time, checked against category / macro
+# lookups loaded once per import, and written in chunks with executemany, so
+# memory stays flat no matter how big the file is. bad rows are reported by line
+# number and skipped, they don't stop the rest of the file.
+#
+# columns / keys:
+#   ingredient  required, stored stripped + lowercased like the forms do
+#   category    required, category name (case insensitive)
+#   macros      optional. CSV: names separated by ";"  NDJSON: list or ";" string
+#   quantity    optional, only used for inventory imports (default '1')
+
+FORMATS = ("csv", "ndjson")
+
+# keep the first few errors for display, count the rest
+MAX_REPORTED_ERRORS = 100
+
+# files are decoded with errors="replace", so bytes that aren't utf-8 (a latin-1
+# export, say) arrive as this character and only their rows are rejected
+REPLACEMENT = "\ufffd"
+NOT_UTF8 = "not valid UTF-8, save the file as UTF-8"
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    imported: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+@dataclass(frozen=True)
+class ImportRow:
+    line: int
+    ingredient: str
+    normalized: str
+    category_id: int
+    macro_ids: tuple
+    quantity: str
+
+
+def detect_format(filename, default="csv"):
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".csv"):
+        return "csv"
+    return default
+
+
+# (line number, dict) pairs, or (line number, error message) for lines that can't be parsed
+def read_records(stream, fmt):
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            if any(REPLACEMENT in str(value) for value in record.values()):
+                yield reader.line_num, NOT_UTF8
+                continue
+            # line_num is where the record ended, which is what people see in an editor
+            yield reader.line_num, record
+    elif fmt == "ndjson":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            if REPLACEMENT in line:
+                yield line_number, NOT_UTF8
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, "expected a JSON object"
+                continue
+            yield line_number, record
+    else:
+        raise ValueError(f"unknown import format {fmt!r}, expected one of {FORMATS}")
+
+
+class Lookups:
+
+    def __init__(self, db):
+        data = refdata.get(db)
+        self.categories = {name.lower(): category_id for name, category_id in data.category_ids.items()}
+        self.macros = {name.lower(): macro_id for name, macro_id in data.macro_ids.items()}
+
+    def parse(self, line, record):
+        name = record.get("ingredient") or ""
+        if not isinstance(name, str):
+            raise ValueError("ingredient must be a string")
+        name = name.strip().lower()
+        if not 2 <= len(name) <= 50:
+            raise ValueError("ingredient name must be 2-50 characters")
+
+        category = str(record.get("category") or "").strip().lower()
+        category_id = self.categories.get(category)
+        if category_id is None:
+            raise ValueError(f"unknown category {record.get('category')!r}")
+
+        macros = record.get("macros") or []
+        if isinstance(macros, str):
+            macros = macros.split(";")
+        if not isinstance(macros, list):
+            raise ValueError("macros must be a list or ';' separated names")
+        macro_ids = []
+        for macro in macros:
+            macro = str(macro).strip().lower()
+            if not macro:
+                continue
+            if macro not in self.macros:
+                raise ValueError(f"unknown macronutrient {macro!r}")
+            macro_ids.append(self.macros[macro])
+
+        quantity = str(record.get("quantity") or "1").strip().lower()
+        return ImportRow(line, name, names.canonical_name(name), category_id, tuple(macro_ids), quantity)
+
+
+# write one chunk. runs inside write(), so the whole chunk is one transaction
+def import_chunk(db, rows, user_id=None):
+    db.executemany(queries.IMPORT_INGREDIENT, [
+        {"name": row.ingredient, "normalized": row.normalized, "category_id": row.category_id} for row in rows
+    ])
+    db.executemany(queries.IMPORT_INGREDIENT_MACRO, [
+        {"name": row.ingredient, "normalized": row.normalized, "macro_id": macro_id}
+        for row in rows for macro_id in row.macro_ids
+    ])
+    if user_id is not None:
+        db.executemany(queries.IMPORT_INVENTORY, [
+            {"name": row.ingredient, "normalized": row.normalized, "user_id": user_id, "quantity": row.quantity}
+            for row in rows
+        ])
+    return len(rows)
+
+
+def _flush(chunk, user_id, result):
+    try:
+        result.imported += write(import_chunk, chunk, user_id)
+    except sqlite3.DatabaseError:
+        # something in the chunk broke it, redo it row by row to find out what
+        for row in chunk:
+            try:
+                result.imported += write(import_chunk, [row], user_id)
+            except sqlite3.DatabaseError as e:
+                result.error(row.line, str(e))
+
+
+# import everything from a text stream. user_id given = also add/update the
+# rows in that user's inventory, otherwise only the shared catalog is touched
+def import_stream(stream, fmt="csv", user_id=None, chunk_size=None):
+    chunk_size = chunk_size or current_app.config.get("IMPORT_CHUNK_SIZE", 500)
+    lookups = Lookups(get_read_db())
+    result = ImportResult()
+    chunk = []
+
+    for line, record in read_records(stream, fmt):
+        result.rows += 1
+        if isinstance(record, str):
+            result.error(line, record)
+            continue
+        try:
+            chunk.append(lookups.parse(line, record))
+        except ValueError as e:
+            result.error(line, str(e))
+            continue
+
+        if len(chunk) >= chunk_size:
+            _flush(chunk, user_id, result)
+            chunk = []
+
+    if chunk:
+        _flush(chunk, user_id, result)
+    return result
+
+
+# uploaded file (werkzeug FileStorage) -> text stream without reading it all into memory
+def import_upload(upload, fmt=None, user_id=None):
+    fmt = fmt or detect_format(upload.filename)
+    stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        return import_stream(stream, fmt, user_id=user_id)
+    finally:
+        stream.detach()
+
+
+###################################################################################
+## flask cli: flask --app flaskapp import-data FILE [--user NAME]
+
+@click.command("import-data")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default=None, help="Defaults to the file extension.")
+@click.option("--user", "username", default=None, help="Also add the rows to this user's inventory.")
+@click.option("--chunk-size", type=int, default=None)
+@with_appcontext
+def import_command(path, fmt, username, chunk_size):
+    user_id = None
+    if username:
+        user = queries.user_by_login(get_read_db(), username)
+        if user is None:
+            raise click.ClickException(f"no user {username!r}")
+        user_id = user["id"]
+
+    with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+        result = import_stream(f, fmt or detect_format(path), user_id=user_id, chunk_size=chunk_size)
+
+    for line, message in result.errors:
+        click.echo(f"line {line}: {message}", err=True)
+    click.echo(f"{result.imported} of {result.rows} rows imported, {result.error_count} errors")
+
+
+def init_app(app):
+    app.cli.add_command(import_command)
@@ -1,61 +1,47 @@
-from flask import Flask, g
-from flask_bcrypt import Bcrypt
+from flaskapp import app
+import passwords
+from db import get_db
+import migrate
 
-import sqlite3
-
-app = Flask(__name__)
-bcrypt = Bcrypt(app)
-
-DATABASE = 'inventory.db'
-
-# connect database
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row 
-    return db
-
-#initialize db
+# bring the database up to the latest schema version, load reference data
+# and create the demo user. safe to run more than once
 def init_db():
     with app.app_context():
         db = get_db()
         cur = db.cursor()
 
-    try:
-        print("Initializing database...")  # Debug message
+        try:
+            print("Initializing database...")  # Debug message
 
-        # Run schema.sql
-        with app.open_resource('schema.sql', 'r') as schema:
-            schema_sql = schema.read()
-            print("Executing schema.sql...")
-            cur.executescript(schema_sql)
+            applied = migrate.upgrade(db, echo=print)
+            print(f"Applied {len(applied)} migration(s).")
 
-        # Run data.sql
-        with open("data.sql", "r") as data:
-            data_sql = data.read()
-            print("Executing data.sql...")
-            cur.executescript(data_sql)
+            print("Loading data.sql...")
+            migrate.seed(db)
+            print("Database initialized successfully.")
 
-        db.commit()
-        print("Database initialized successfully.")
+            # insert initial user with hashed password, unless already there
+            username = "ella"
+            email = "ella@ella.com"
+            plaintext_password = "P@ssw0rd!example"
 
-        # insert initial user with hashed password
-        username = "ella"
-        email = "ella@ella.com"
-        plaintext_password = "P@ssw0rd!example"
+            cur.execute("SELECT id FROM user WHERE username = ?", (username,))
+            if cur.fetchone():
+                print(f"Initial user {username} already exists.")
+                return
 
-        hashed_password = bcrypt.generate_password_hash(plaintext_password).decode('utf-8')
+            hashed_password = passwords.hash_password(plaintext_password)
 
-        cur.execute("""
-            INSERT INTO user (username, email, hashed_password) 
-            VALUES (?, ?, ?)
-        """, (username, email, hashed_password))
+            cur.execute("""
+                INSERT INTO user (username, email, hashed_password) 
+                VALUES (?, ?, ?)
+            """, (username, email, hashed_password))
 
-        db.commit()
-        print(f"Inserted initial user: {username}")
+            db.commit()
+            print(f"Inserted initial user: {username}")
 
-    except Exception as e:
-        print(f"Error initializing database: {e}")
+        except Exception as e:
+            print(f"Error initializing database: {e}")
 
-init_db()
\ No newline at end of file
+if __name__ == '__main__':
+    init_db()
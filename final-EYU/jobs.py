@@ -0,0 +1,211 @@
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+import queries
+from db import get_read_db
+from writer import write
+
+# small in-process background job runner.
+#
+# jobs are rows in the job table, so they survive restarts and several worker
+# processes can share one queue: a job is claimed with a conditional UPDATE, so
+# exactly one runner gets it. each runner has a dispatcher thread that claims due
+# jobs while it has free workers and hands them to a bounded thread pool. a job
+# that raises is retried with backoff up to max_attempts, then left as 'failed'.
+#
+# a job is a kind + a json payload. handlers are registered with
+#   @jobs.handler("kind")
+#   def run(payload): ...
+# and run inside an app context. enqueue() with a dedupe_key debounces: while
+# a job with that key is waiting, enqueueing again only pushes it back.
+#
+# JOBS_ENABLED off (tests, one-off scripts) stores jobs without running them;
+# run_pending() / `flask jobs run` runs whatever is due in the calling thread.
+
+log = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+
+def handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+# run one claimed job row. returns True if it succeeded
+def run_job(job, now=None):
+    try:
+        HANDLERS[job["kind"]](json.loads(job["payload"]))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if job["attempts"] >= job["max_attempts"]:
+            log.error("job %s (%s) failed for good: %s", job["id"], job["kind"], error)
+            write(queries.fail_job, job["id"], error)
+        else:
+            delay = current_app.config.get("JOB_RETRY_DELAY", 5.0) * 2 ** (job["attempts"] - 1)
+            run_at = (time.time() if now is None else now) + random.uniform(delay / 2, delay)
+            log.warning("job %s (%s) failed, retrying: %s", job["id"], job["kind"], error)
+            write(queries.retry_job, job["id"], run_at, error)
+        return False
+
+    write(queries.finish_job, job["id"])
+    return True
+
+
+def _claim_due(now, limit):
+    lease_until = now + current_app.config.get("JOB_LEASE", 300)
+    write(queries.requeue_expired_jobs, now)
+    claimed = []
+    for row in get_read_db().execute(queries.DUE_JOBS, (now, limit)).fetchall():
+        job = write(queries.claim_job, row["id"], lease_until)
+        if job is not None:
+            claimed.append(job)
+    return claimed
+
+
+# run every due job in this thread. returns (succeeded, failed)
+def run_pending(now=None, limit=100):
+    now = time.time() if now is None else now
+    results = [run_job(job, now) for job in _claim_due(now, limit)]
+    return results.count(True), results.count(False)
+
+
+class JobRunner:
+
+    def __init__(self, app, workers=2, poll_interval=1.0):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._wake = threading.Event()
+        self._stopping = False
+        self._stats = {"succeeded": 0, "failed": 0}
+
+        self._thread = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+        self._pool.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, busy=self._busy, workers=self.workers)
+
+    def _dispatch_loop(self):
+        while not self._stopping:
+            timeout = self.poll_interval
+            try:
+                with self.app.app_context():
+                    self._dispatch()
+                    next_run_at = get_read_db().execute(queries.NEXT_JOB_RUN_AT).fetchone()[0]
+                if next_run_at is not None:
+                    timeout = min(timeout, max(0.0, next_run_at - time.time()))
+            except Exception:
+                log.exception("job dispatcher error")
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _dispatch(self):
+        with self._lock:
+            free = self.workers - self._busy
+        if free <= 0:
+            return
+        for job in _claim_due(time.time(), free):
+            with self._lock:
+                self._busy += 1
+            self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            with self.app.app_context():
+                ok = run_job(job)
+        except Exception:
+            log.exception("job %s crashed the runner", job["id"])
+            ok = False
+        with self._lock:
+            self._busy -= 1
+            self._stats["succeeded" if ok else "failed"] += 1
+        # a worker is free again, look for more
+        self._wake.set()
+
+
+_runner_lock = threading.Lock()
+
+
+def get_runner(app=None):
+    app = app or current_app._get_current_object()
+    if not app.config.get("JOBS_ENABLED"):
+        return None
+    with _runner_lock:
+        runner = app.extensions.get("job_runner")
+        if runner is None:
+            runner = app.extensions["job_runner"] = JobRunner(
+                app,
+                workers=app.config.get("JOB_WORKERS", 2),
+                poll_interval=app.config.get("JOB_POLL_INTERVAL", 1.0),
+            )
+    return runner
+
+
+def stop_runner(app):
+    runner = app.extensions.pop("job_runner", None)
+    if runner is not None:
+        runner.stop()
+
+
+# queue a job to run after delay seconds. returns the job id
+def enqueue(kind, payload=None, delay=0.0, dedupe_key=None, max_attempts=3):
+    if kind not in HANDLERS:
+        raise ValueError(f"no handler for job kind {kind!r}")
+    job_id = write(queries.enqueue_job, kind, payload or {}, time.time() + delay, dedupe_key, max_attempts)
+    runner = get_runner()
+    if runner is not None:
+        runner.wake()
+    return job_id
+
+
+###################################################################################
+## flask cli: flask --app flaskapp jobs status|run
+
+jobs_cli = AppGroup("jobs", help="Background jobs.")
+
+
+@jobs_cli.command("status")
+def status_command():
+    for row in get_read_db().execute(queries.JOB_COUNTS):
+        click.echo(f"{row['status']}: {row['jobs']}")
+
+
+@jobs_cli.command("run")
+def run_command():
+    succeeded, failed = run_pending()
+    click.echo(f"{succeeded} jobs done, {failed} failed")
+
+
+def init_app(app):
+    app.cli.add_command(jobs_cli)
+
+    # start the runner with the first request, so queued jobs left over from a
+    # restart get picked up without waiting for something new to be enqueued
+    @app.before_request
+    def start_job_runner():
+        get_runner(app)
@@ -0,0 +1,343 @@
+import json
+import logging
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+import importer
+import names
+import queries
+import recipe_cache
+from db import get_read_db
+from writer import write
+
+# offline recipe suggestions from a local corpus, no api involved.
+#
+# recipes live in the local_recipe table (import with `flask recipes import FILE`)
+# and are matched by an in-memory index built once per corpus version:
+#   vocabulary      every canonical ingredient name, most common first
+#   recipe bits     per recipe, an int with one bit per vocabulary entry it needs
+#   postings        per ingredient, an int with one bit per recipe that needs it
+#                   (rare ingredients keep a plain array of positions instead)
+# python ints are arbitrary length bitsets, and & | ^ on them run in C over the
+# whole int, so they do what numpy would do with bool arrays.
+#
+# scoring adds up the postings of the user's ingredients into a bit-sliced
+# counter: slice j holds bit j of every recipe's used-ingredient count, so each
+# ingredient is one ripple-carry add across all recipes at once, about
+# log2(inventory size) big-int operations. the top k come out by walking the
+# slices from the top bit, ties broken by fewest missing ingredients.
+#
+# results have the same shape as spoonacular's findByIngredients, see recipes.py.
+
+log = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson", "json")
+
+LOAD_BATCH = 5000
+IMPORT_CHUNK_SIZE = 1000
+
+# an ingredient in fewer than 1/DENSE_RATIO of the recipes keeps an array of
+# positions (4 bytes each) instead of a bitset (1 bit per recipe). at most
+# DENSE_RATIO * (average ingredients per recipe) postings can be bitsets, which
+# bounds their memory at about 3 MB per 10k recipes with 10 ingredients each
+DENSE_RATIO = 256
+
+_index_lock = threading.Lock()
+
+
+# bitset with the given bit positions set
+def to_bits(positions, size):
+    buf = bytearray((size + 7) // 8)
+    for position in positions:
+        buf[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buf, "little")
+
+
+# positions of the set bits, lowest first
+def iter_bits(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+# add 2**level to the bit-sliced counter of every recipe in bits (ripple carry)
+def add_bits(slices, bits, level=0):
+    while len(slices) < level:
+        slices.append(0)
+    for j in range(level, len(slices)):
+        slices[j], bits = slices[j] ^ bits, slices[j] & bits
+        if not bits:
+            return
+    slices.append(bits)
+
+
+class RecipeIndex:
+
+    # rows of (id, title, image, source url, canonical ingredient names)
+    def __init__(self, rows=(), version=None):
+        self.version = version
+        self.recipes = []
+        ingredient_lists = []
+        frequency = Counter()
+        for recipe_id, title, image, source_url, ingredients in rows:
+            ingredients = tuple(dict.fromkeys(ingredients))
+            self.recipes.append((recipe_id, title, image, source_url))
+            ingredient_lists.append(ingredients)
+            frequency.update(ingredients)
+
+        # common ingredients get the low bits, so most recipe bitsets stay a few words long
+        self.vocab = [name for name, _ in frequency.most_common()]
+        self.vocab_ids = {name: vocab_id for vocab_id, name in enumerate(self.vocab)}
+
+        size = len(self.recipes)
+        positions = [array("I") for _ in self.vocab]
+        by_size = defaultdict(list)
+        self.recipe_bits = []
+        for position, ingredients in enumerate(ingredient_lists):
+            bits = 0
+            for name in ingredients:
+                vocab_id = self.vocab_ids[name]
+                bits |= 1 << vocab_id
+                positions[vocab_id].append(position)
+            self.recipe_bits.append(bits)
+            by_size[len(ingredients)].append(position)
+
+        dense = size // DENSE_RATIO
+        self.postings = [to_bits(found, size) if len(found) > dense else found for found in positions]
+        # (number of ingredients, recipes with that many), smallest first
+        self.size_masks = [(count, to_bits(found, size)) for count, found in sorted(by_size.items())]
+
+    def __len__(self):
+        return len(self.recipes)
+
+    # bit-sliced used-ingredient counts for every recipe at once
+    def _counts(self, vocab_ids):
+        slices = []
+        sparse = Counter()
+        for vocab_id in vocab_ids:
+            posting = self.postings[vocab_id]
+            if isinstance(posting, int):
+                add_bits(slices, posting)
+            else:
+                sparse.update(posting)
+
+        # rare ingredients: count them per recipe first, then add all the recipes
+        # with the same count in one go, instead of one bitset per ingredient
+        groups = {}
+        size = (len(self.recipes) + 7) // 8
+        for position, count in sparse.items():
+            buf = groups.get(count)
+            if buf is None:
+                buf = groups[count] = bytearray(size)
+            buf[position >> 3] |= 1 << (position & 7)
+        for count, buf in groups.items():
+            bits = int.from_bytes(buf, "little")
+            for level in range(count.bit_length()):
+                if count >> level & 1:
+                    add_bits(slices, bits, level)
+        return slices
+
+    # recipe positions, most used ingredients first, then fewest missed
+    def _top(self, slices, limit):
+        remaining = 0
+        for bits in slices:
+            remaining |= bits
+        found = []
+        while remaining and len(found) < limit:
+            # recipes with the highest count left: keep the ones with each bit set, top bit down
+            best = remaining
+            for bits in reversed(slices):
+                if best & bits:
+                    best &= bits
+            remaining &= ~best
+            # same used count, so the smaller recipes are the ones missing less
+            for _, mask in self.size_masks:
+                for position in iter_bits(best & mask):
+                    found.append(position)
+                    if len(found) == limit:
+                        return found
+        return found
+
+    def _result(self, position, have):
+        recipe_id, title, image, source_url = self.recipes[position]
+        bits = self.recipe_bits[position]
+        used = [self.vocab[vocab_id] for vocab_id in iter_bits(bits & have)]
+        missed = [self.vocab[vocab_id] for vocab_id in iter_bits(bits & ~have)]
+        return {
+            "id": recipe_id,
+            "title": title,
+            "image": image,
+            "sourceUrl": source_url,
+            "usedIngredientCount": len(used),
+            "missedIngredientCount": len(missed),
+            "usedIngredients": [{"name": name} for name in used],
+            "missedIngredients": [{"name": name} for name in missed],
+        }
+
+    # best limit recipes for a list of ingredient names, findByIngredients style dicts
+    def match(self, ingredients, limit=5):
+        vocab_ids = {self.vocab_ids[name] for name in map(names.canonical_name, ingredients) if name in self.vocab_ids}
+        if not vocab_ids or limit <= 0:
+            return []
+        have = 0
+        for vocab_id in vocab_ids:
+            have |= 1 << vocab_id
+        return [self._result(position, have) for position in self._top(self._counts(vocab_ids), limit)]
+
+
+def load(db, version=None):
+    def rows():
+        after = 0
+        while True:
+            batch = db.execute(queries.LOCAL_RECIPES_AFTER, (after, LOAD_BATCH)).fetchall()
+            for row in batch:
+                yield row["id"], row["title"], row["image"], row["source_url"], json.loads(row["ingredients"])
+            if len(batch) < LOAD_BATCH:
+                return
+            after = batch[-1]["id"]
+
+    return RecipeIndex(rows(), version)
+
+
+# the index for the current corpus, built on first use and after every change
+def get_index(db):
+    key = (current_app.config["DATABASE"], queries.table_version(db, "local_recipe"))
+    index = current_app.extensions.get("local_recipe_index")
+    if index is None or index.version != key:
+        with _index_lock:
+            index = current_app.extensions.get("local_recipe_index")
+            if index is None or index.version != key:
+                started = time.perf_counter()
+                index = current_app.extensions["local_recipe_index"] = load(db, key)
+                log.info("local recipe index: %d recipes, %d ingredients in %.0f ms",
+                         len(index), len(index.vocab), (time.perf_counter() - started) * 1000)
+    return index
+
+
+# RecipeResult from the local corpus, recipes is empty when nothing matches (or there's no corpus)
+def find_recipes(ingredients, limit=5):
+    _, canonical = recipe_cache.cache_key(ingredients)
+    recipes = get_index(get_read_db()).match(canonical, limit)
+    return recipe_cache.RecipeResult(recipes, canonical, time.time(), "local")
+
+
+###################################################################################
+## importing a corpus
+##
+## columns / keys: title (required), ingredients (required; CSV: names separated
+## by ";", JSON: list or ";" string), id, image, url (all optional). a known id
+## replaces that recipe
+
+def parse(record):
+    title = str(record.get("title") or "").strip()
+    if not 1 <= len(title) <= 200:
+        raise ValueError("title must be 1-200 characters")
+
+    ingredients = record.get("ingredients") or []
+    if isinstance(ingredients, str):
+        ingredients = ingredients.split(";")
+    if not isinstance(ingredients, list):
+        raise ValueError("ingredients must be a list or ';' separated names")
+    # ingredient entries may be spoonacular style objects
+    ingredients = [item.get("name", "") if isinstance(item, dict) else item for item in ingredients]
+    canonical = sorted({names.canonical_name(str(name)) for name in ingredients} - {""})
+    if not canonical:
+        raise ValueError("recipe has no ingredients")
+
+    recipe_id = record.get("id")
+    if recipe_id in ("", None):
+        recipe_id = None
+    else:
+        try:
+            recipe_id = int(recipe_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"id must be a number, not {recipe_id!r}") from None
+
+    return {
+        "id": recipe_id,
+        "title": title,
+        "image": record.get("image") or None,
+        "source_url": record.get("url") or record.get("sourceUrl") or None,
+        "ingredients": json.dumps(canonical),
+    }
+
+
+# (record number, dict or error message), like importer.read_records plus a plain json array
+def read_records(stream, fmt):
+    if fmt != "json":
+        yield from importer.read_records(stream, fmt)
+        return
+    try:
+        records = json.load(stream)
+    except ValueError as e:
+        yield 1, f"invalid JSON: {e}"
+        return
+    if not isinstance(records, list):
+        yield 1, "expected a JSON array of recipes"
+        return
+    for number, record in enumerate(records, start=1):
+        yield number, record if isinstance(record, dict) else "expected a JSON object"
+
+
+def detect_format(filename):
+    return "json" if (filename or "").lower().endswith(".json") else importer.detect_format(filename)
+
+
+def import_stream(stream, fmt="json", chunk_size=IMPORT_CHUNK_SIZE, replace=False):
+    result = importer.ImportResult()
+    if replace:
+        write(queries.clear_local_recipes)
+    chunk = []
+    for line, record in read_records(stream, fmt):
+        result.rows += 1
+        if isinstance(record, str):
+            result.error(line, record)
+            continue
+        try:
+            chunk.append(parse(record))
+        except ValueError as e:
+            result.error(line, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            result.imported += write(queries.store_local_recipes, chunk)
+            chunk = []
+    if chunk:
+        result.imported += write(queries.store_local_recipes, chunk)
+    return result
+
+
+###################################################################################
+## flask cli: flask --app flaskapp recipes import FILE [--replace] | status
+
+recipes_cli = AppGroup("recipes", help="Local recipe corpus.")
+
+
+@recipes_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default=None, help="Defaults to the file extension.")
+@click.option("--replace", is_flag=True, help="Delete the current corpus first.")
+def import_command(path, fmt, replace):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        result = import_stream(f, fmt or detect_format(path), replace=replace)
+    for line, message in result.errors:
+        click.echo(f"record {line}: {message}", err=True)
+    click.echo(f"{result.imported} of {result.rows} recipes imported, {result.error_count} errors")
+
+
+@recipes_cli.command("status")
+def status_command():
+    started = time.perf_counter()
+    index = get_index(get_read_db())
+    click.echo(f"{len(index)} recipes, {len(index.vocab)} ingredients, "
+               f"index ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def init_app(app):
+    app.cli.add_command(recipes_cli)
@@ -0,0 +1,211 @@
+import importlib.util
+import os
+import re
+import time
+from dataclasses import dataclass
+
+import click
+from flask.cli import AppGroup
+
+import names
+from db import get_db
+
+# versioned schema migrations.
+#
+# migrations/ holds ordered files named NNNN_description.sql or NNNN_description.py.
+# .sql files run in a single transaction together with their schema_version row.
+# .py files define upgrade(db) and manage their own transactions, so a large
+# backfill can commit in small batches (see backfill()) instead of holding the
+# write lock for the whole rewrite. if one dies halfway it is simply run again:
+# backfill() remembers how far it got and upgrade() should use IF NOT EXISTS.
+#
+# schema.sql is kept as the full current schema for reference, and
+# tests/test_migrations.py checks the two stay in sync.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.(sql|py)$")
+
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data.sql")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: str
+
+    def apply(self, db):
+        if self.path.endswith(".sql"):
+            with open(self.path, "r") as f:
+                sql = f.read()
+            # executescript commits whatever is open first, then runs the script as is,
+            # so wrap it ourselves to make the migration + version row atomic
+            db.executescript(
+                "BEGIN;\n" + sql + "\n;"
+                f"INSERT INTO schema_version (version, name) VALUES ({self.version}, '{self.name}');\n"
+                "COMMIT;"
+            )
+        else:
+            spec = importlib.util.spec_from_file_location(f"migration_{self.version}", self.path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            module.upgrade(db)
+            db.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (self.version, self.name))
+            db.commit()
+
+
+def ensure_version_table(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    # progress of batched backfills, so an interrupted migration can resume
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_backfill (
+            name TEXT PRIMARY KEY,
+            last_rowid INTEGER NOT NULL,
+            done INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    db.commit()
+
+
+def discover(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort(key=lambda m: m.version)
+
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"duplicate migration version in {directory}")
+    return migrations
+
+
+def current_version(db):
+    ensure_version_table(db)
+    row = db.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def pending(db, directory=MIGRATIONS_DIR):
+    version = current_version(db)
+    return [m for m in discover(directory) if m.version > version]
+
+
+# apply every migration newer than the database, up to target if given.
+# returns the migrations that ran
+def upgrade(db, target=None, directory=MIGRATIONS_DIR, echo=None):
+    applied = []
+    for migration in pending(db, directory):
+        if target is not None and migration.version > target:
+            break
+        if echo:
+            echo(f"applying {migration.version:04d}_{migration.name}")
+        migration.apply(db)
+        applied.append(migration)
+    return applied
+
+
+# reference data (categories, macros, starter ingredients). data.sql only uses
+# INSERT OR IGNORE so this is safe to run more than once
+def seed(db, path=SEED_FILE):
+    with open(path, "r") as f:
+        db.executescript(f.read())
+    # data.sql is plain sql, fill in the canonical names it can't compute
+    if has_column(db, "ingredient", "normalized_name"):
+        names.register(db)
+        db.execute("UPDATE ingredient SET normalized_name = canonical_name(ingredient_name) WHERE normalized_name IS NULL")
+    db.commit()
+
+
+###################################################################################
+## helpers for .py migrations
+
+def has_column(db, table, column):
+    return any(row[1] == column for row in db.execute(f"PRAGMA table_info({table})"))
+
+
+# run a statement over table in rowid ranges, committing after each batch so
+# writers only ever wait for one batch. sql gets :lo and :hi bound to the rowid
+# range, e.g.
+#   UPDATE inventory SET x = ... WHERE rowid > :lo AND rowid <= :hi
+# progress is stored in schema_backfill under name, so calling this again after
+# a crash picks up where it stopped. returns the number of batches run
+def backfill(db, name, table, sql, batch_size=1000, pause=0.0):
+    ensure_version_table(db)
+    row = db.execute("SELECT last_rowid, done FROM schema_backfill WHERE name = ?", (name,)).fetchone()
+    if row and row[1]:
+        return 0
+    lo = row[0] if row else 0
+
+    batches = 0
+    while True:
+        hi = db.execute(
+            f"SELECT MAX(rowid) FROM (SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?)",
+            (lo, batch_size),
+        ).fetchone()[0]
+        if hi is None:
+            break
+
+        db.execute(sql, {"lo": lo, "hi": hi})
+        db.execute("""
+            INSERT INTO schema_backfill (name, last_rowid) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET last_rowid = excluded.last_rowid
+        """, (name, hi))
+        db.commit()
+
+        lo = hi
+        batches += 1
+        if pause:
+            # give waiting writers a turn
+            time.sleep(pause)
+
+    db.execute("""
+        INSERT INTO schema_backfill (name, last_rowid, done) VALUES (?, ?, 1)
+        ON CONFLICT (name) DO UPDATE SET done = 1
+    """, (name, lo))
+    db.commit()
+    return batches
+
+
+###################################################################################
+## flask cli: flask --app flaskapp db upgrade|status|seed
+
+db_cli = AppGroup("db", help="Database migrations.")
+
+
+@db_cli.command("upgrade")
+@click.option("--target", type=int, default=None, help="Stop after this version.")
+def upgrade_command(target):
+    applied = upgrade(get_db(), target=target, echo=click.echo)
+    if not applied:
+        click.echo("database is up to date")
+    else:
+        click.echo(f"now at version {applied[-1].version}")
+
+
+@db_cli.command("status")
+def status_command():
+    db = get_db()
+    version = current_version(db)
+    click.echo(f"current version: {version}")
+    for migration in discover():
+        state = "applied" if migration.version <= version else "pending"
+        click.echo(f"  {migration.version:04d}_{migration.name} {state}")
+
+
+@db_cli.command("seed")
+def seed_command():
+    seed(get_db())
+    click.echo("seed data loaded")
+
+
+def init_app(app):
+    app.cli.add_command(db_cli)
@@ -0,0 +1,40 @@
+from migrate import backfill
+
+# indexes for the hot inventory / catalog queries (see schema.sql).
+# the unique (user_id, ingredient_id) index can't be built while a user has the
+# same ingredient twice, so first drop the older duplicates in batches, keeping
+# the most recently added row
+
+DEDUPE = """
+    DELETE FROM inventory
+    WHERE EXISTS (SELECT 1 FROM inventory AS newer
+                  WHERE newer.user_id = inventory.user_id
+                    AND newer.ingredient_id = inventory.ingredient_id
+                    AND newer.id > inventory.id)
+"""
+
+
+def upgrade(db):
+    # plain (user_id, ...) index first, it makes the duplicate check below a lookup
+    db.execute("CREATE INDEX IF NOT EXISTS idx_inventory_user_updated ON inventory (user_id, last_updated)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_inventory_ingredient ON inventory (ingredient_id)")
+    db.commit()
+
+    backfill(db, "0002_dedupe_inventory", "inventory", DEDUPE + " AND rowid > :lo AND rowid <= :hi")
+
+    # the app keeps writing while the batches run, so a duplicate can land behind
+    # the batch cursor or after the last batch. one last pass and the unique index
+    # in the same write transaction, so nothing can sneak in between (and a rerun
+    # gets here again even though the backfill is marked done)
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.execute(DEDUPE)
+        db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_user_ingredient ON inventory (user_id, ingredient_id)")
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+
+    db.execute("CREATE INDEX IF NOT EXISTS idx_ingredient_category_name ON ingredient (category_id, ingredient_name)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_ingredient_macronutrient_macro ON ingredient_macronutrient (macronutrient_id)")
+    db.commit()
@@ -0,0 +1,22 @@
+-- trigram full text index over ingredient names for /api/ingredients/suggest.
+-- external content table: the names live only in ingredient, the triggers keep
+-- the index in step with every insert / rename / delete
+CREATE VIRTUAL TABLE IF NOT EXISTS ingredient_search USING fts5(
+    ingredient_name, content='ingredient', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS ingredient_search_insert AFTER INSERT ON ingredient BEGIN
+    INSERT INTO ingredient_search (rowid, ingredient_name) VALUES (new.id, new.ingredient_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingredient_search_delete AFTER DELETE ON ingredient BEGIN
+    INSERT INTO ingredient_search (ingredient_search, rowid, ingredient_name) VALUES ('delete', old.id, old.ingredient_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingredient_search_update AFTER UPDATE OF ingredient_name ON ingredient BEGIN
+    INSERT INTO ingredient_search (ingredient_search, rowid, ingredient_name) VALUES ('delete', old.id, old.ingredient_name);
+    INSERT INTO ingredient_search (rowid, ingredient_name) VALUES (new.id, new.ingredient_name);
+END;
+
+-- index what is already there
+INSERT INTO ingredient_search (ingredient_search) VALUES ('rebuild');
@@ -0,0 +1,37 @@
+import names
+from migrate import backfill, has_column
+
+# ingredient.normalized_name (names.canonical_name of ingredient_name) so
+# "apples" / "Apple" / "apple's" resolve to one catalog row, plus table_version,
+# a per-table change counter bumped by triggers that in-process caches of
+# catalog data (the fuzzy name index) check to know when to reload.
+# existing near-duplicates are left alone, the index on normalized_name is not unique
+
+
+def upgrade(db):
+    names.register(db)
+
+    if not has_column(db, "ingredient", "normalized_name"):
+        db.execute("ALTER TABLE ingredient ADD COLUMN normalized_name TEXT")
+        db.commit()
+
+    backfill(db, "0004_normalized_names", "ingredient", """
+        UPDATE ingredient SET normalized_name = canonical_name(ingredient_name)
+        WHERE rowid > :lo AND rowid <= :hi
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_ingredient_normalized_name ON ingredient (normalized_name)")
+
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS table_version (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    db.execute("INSERT OR IGNORE INTO table_version (name) VALUES ('ingredient')")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS ingredient_version_{event.lower()} AFTER {event} ON ingredient BEGIN
+                UPDATE table_version SET version = version + 1 WHERE name = 'ingredient';
+            END
+        """)
+    db.commit()
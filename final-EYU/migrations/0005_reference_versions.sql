@@ -0,0 +1,27 @@
+-- version counters for the reference tables, so the in-process choice list
+-- cache (refdata.py) in every worker notices when categories or macros change
+INSERT OR IGNORE INTO table_version (name) VALUES ('category'), ('macronutrient');
+
+CREATE TRIGGER IF NOT EXISTS category_version_insert AFTER INSERT ON category BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'category';
+END;
+
+CREATE TRIGGER IF NOT EXISTS category_version_update AFTER UPDATE ON category BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'category';
+END;
+
+CREATE TRIGGER IF NOT EXISTS category_version_delete AFTER DELETE ON category BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'category';
+END;
+
+CREATE TRIGGER IF NOT EXISTS macronutrient_version_insert AFTER INSERT ON macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'macronutrient';
+END;
+
+CREATE TRIGGER IF NOT EXISTS macronutrient_version_update AFTER UPDATE ON macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'macronutrient';
+END;
+
+CREATE TRIGGER IF NOT EXISTS macronutrient_version_delete AFTER DELETE ON macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'macronutrient';
+END;
@@ -0,0 +1,17 @@
+-- recipe search results by ingredient set (recipe_cache.py), kept across restarts,
+-- and the number of upstream api calls made per day
+CREATE TABLE IF NOT EXISTS recipe_cache (
+    key TEXT PRIMARY KEY,
+    ingredients TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    fresh_until REAL NOT NULL,
+    stale_until REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_recipe_cache_stale_until ON recipe_cache (stale_until);
+
+CREATE TABLE IF NOT EXISTS api_quota (
+    day TEXT PRIMARY KEY,
+    calls INTEGER NOT NULL DEFAULT 0
+);
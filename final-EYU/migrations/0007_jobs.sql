@@ -0,0 +1,19 @@
+-- persistent queue for the in-process job runner (jobs.py)
+CREATE TABLE IF NOT EXISTS job (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}',
+    dedupe_key TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    run_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    lease_until REAL,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_status_run_at ON job (status, run_at);
+
+-- at most one waiting job per dedupe key, enqueueing again just moves it (debounce)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_job_queued_dedupe ON job (dedupe_key) WHERE status = 'queued';
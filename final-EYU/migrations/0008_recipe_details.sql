@@ -0,0 +1,10 @@
+-- per-recipe details (ready time, servings, source url) fetched in bulk for the
+-- recipe suggestions page (recipe_details.py)
+CREATE TABLE IF NOT EXISTS recipe_detail (
+    id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    fresh_until REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_recipe_detail_fresh_until ON recipe_detail (fresh_until);
@@ -0,0 +1,24 @@
+-- local recipe corpus for offline suggestions (local_recipes.py). ingredients is
+-- a json array of canonical ingredient names; the matching index is built in
+-- memory from this table and rebuilt when table_version says it changed
+CREATE TABLE IF NOT EXISTS local_recipe (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    image TEXT,
+    source_url TEXT,
+    ingredients TEXT NOT NULL
+);
+
+INSERT OR IGNORE INTO table_version (name) VALUES ('local_recipe');
+
+CREATE TRIGGER IF NOT EXISTS local_recipe_version_insert AFTER INSERT ON local_recipe BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'local_recipe';
+END;
+
+CREATE TRIGGER IF NOT EXISTS local_recipe_version_update AFTER UPDATE ON local_recipe BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'local_recipe';
+END;
+
+CREATE TRIGGER IF NOT EXISTS local_recipe_version_delete AFTER DELETE ON local_recipe BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'local_recipe';
+END;
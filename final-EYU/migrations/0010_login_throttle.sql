@@ -0,0 +1,10 @@
+-- login attempt counters per key and time window, shared by every worker
+-- process when LOGIN_THROTTLE_BACKEND=sqlite (throttle.py)
+CREATE TABLE IF NOT EXISTS login_throttle (
+    key TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (key, window)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_login_throttle_window ON login_throttle (window);
@@ -0,0 +1,38 @@
+-- version counters behind the home and catalog page etags (etags.py): one per
+-- user for their inventory rows, and ingredient_macronutrient joins the catalog
+-- tables in table_version, so an unchanged page costs one lookup instead of its joins
+CREATE TABLE IF NOT EXISTS inventory_version (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO inventory_version (user_id) SELECT DISTINCT user_id FROM inventory;
+
+CREATE TRIGGER IF NOT EXISTS inventory_version_insert AFTER INSERT ON inventory BEGIN
+    INSERT INTO inventory_version (user_id, version) VALUES (NEW.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS inventory_version_update AFTER UPDATE ON inventory BEGIN
+    INSERT INTO inventory_version (user_id, version) VALUES (NEW.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+    UPDATE inventory_version SET version = version + 1 WHERE user_id = OLD.user_id AND OLD.user_id <> NEW.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS inventory_version_delete AFTER DELETE ON inventory BEGIN
+    UPDATE inventory_version SET version = version + 1 WHERE user_id = OLD.user_id;
+END;
+
+INSERT OR IGNORE INTO table_version (name) VALUES ('ingredient_macronutrient');
+
+CREATE TRIGGER IF NOT EXISTS ingredient_macronutrient_version_insert AFTER INSERT ON ingredient_macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'ingredient_macronutrient';
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingredient_macronutrient_version_update AFTER UPDATE ON ingredient_macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'ingredient_macronutrient';
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingredient_macronutrient_version_delete AFTER DELETE ON ingredient_macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'ingredient_macronutrient';
+END;
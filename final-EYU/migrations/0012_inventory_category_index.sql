@@ -0,0 +1,3 @@
+-- deleting or adding a category checks inventory.category_id for the foreign key,
+-- a full scan of inventory without this (categories are editable through api.py)
+CREATE INDEX IF NOT EXISTS idx_inventory_category ON inventory (category_id);
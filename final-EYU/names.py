@@ -0,0 +1,77 @@
+import re
+from collections import Counter, defaultdict
+
+# ingredient name matching.
+#
+# canonical_name() is what ingredient.normalized_name holds: lowercase, no
+# punctuation, single spaces, each word made singular with a few plain english
+# rules. "Olive-Oil", "olive  oil" and "olive oils" all come out "olive oil", so
+# the add paths find the existing catalog row instead of creating a near copy.
+#
+# NameIndex is the fuzzy fallback for typos ("olive oyl"): an in-memory trigram
+# index over the canonical names, scored with the dice coefficient.
+
+_APOSTROPHES = re.compile(r"['’]")
+_PUNCTUATION = re.compile(r"[\W_]+")
+
+# words that end in s but aren't plurals
+_KEEP_ENDINGS = ("ss", "us", "is")
+
+
+def singular(word):
+    if len(word) <= 3 or word.endswith(_KEEP_ENDINGS):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"          # berries -> berry
+    if word.endswith(("oes", "ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]                # tomatoes -> tomato, peaches -> peach
+    if word.endswith("s"):
+        return word[:-1]                # apples -> apple
+    return word
+
+
+def canonical_name(name):
+    words = _PUNCTUATION.sub(" ", _APOSTROPHES.sub("", (name or "").lower())).split()
+    return " ".join(singular(word) for word in words)
+
+
+# make canonical_name() callable from sql on this connection (migrations, seed fixups)
+def register(db):
+    db.create_function("canonical_name", 1, canonical_name, deterministic=True)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+
+    def __init__(self, rows=()):
+        # id -> (name, number of trigrams), trigram -> ids that have it
+        self.names = {}
+        self.postings = defaultdict(set)
+        for ingredient_id, name, normalized in rows:
+            grams = trigrams(normalized or canonical_name(name))
+            self.names[ingredient_id] = (name, len(grams))
+            for gram in grams:
+                self.postings[gram].add(ingredient_id)
+
+    def __len__(self):
+        return len(self.names)
+
+    # [(name, score)] best first, only scores >= threshold (0..1)
+    def closest(self, name, limit=1, threshold=0.5):
+        grams = trigrams(canonical_name(name))
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+
+        scored = []
+        for ingredient_id, count in shared.items():
+            ingredient_name, size = self.names[ingredient_id]
+            score = 2 * count / (len(grams) + size)
+            if score >= threshold:
+                scored.append((score, ingredient_name))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(ingredient_name, score) for score, ingredient_name in scored[:limit]]
@@ -0,0 +1,93 @@
+import base64
+import json
+from dataclasses import dataclass, field
+
+from flask import current_app, request
+
+# keyset (cursor) pagination for the inventory and catalog pages.
+#
+# instead of OFFSET, a page is "the next N rows after this sort key", so every
+# page is one index range read no matter how deep it is, and rows inserted or
+# deleted elsewhere don't shift what the next / prev links point at.
+#
+# a cursor is the sort key of the first or last row on a page, e.g.
+# [last_updated, id], as url-safe base64 json. ?after=cursor reads forwards,
+# ?before=cursor reads backwards (in reverse order, then flipped back).
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+@dataclass
+class Page:
+    rows: list
+    next_cursor: str = None
+    prev_cursor: str = None
+    # the query args that produced this page, so links on it (edit, delete) can come back to it
+    args: dict = field(default_factory=dict)
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key), separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+# raises ValueError for anything that isn't a cursor with `length` parts
+def decode_cursor(cursor, length):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"bad cursor: {e}") from None
+    if not isinstance(key, list) or len(key) != length:
+        raise ValueError("bad cursor")
+    # the parts become query params, anything nested would blow up in sqlite
+    if not all(part is None or isinstance(part, (str, int, float)) for part in key):
+        raise ValueError("bad cursor")
+    return key
+
+
+def page_size(requested=None):
+    size = current_app.config.get("PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    if requested:
+        size = int(requested)
+    return max(1, min(size, current_app.config.get("MAX_PAGE_SIZE", MAX_PAGE_SIZE)))
+
+
+# ?after= / ?before= / ?per_page= from the current request. raises ValueError on junk
+def request_args():
+    args = {name: request.args[name] for name in ("after", "before", "per_page") if request.args.get(name)}
+    page_size(args.get("per_page"))
+    return args
+
+
+# run one keyset query set. first/after/before are sql taking :limit, the latter two
+# also the sort key as named params (key_names). key(row) gives a row's sort key.
+# one extra row is fetched to know whether there is another page in that direction
+def fetch_page(db, first, after, before, params, key_names, key, args):
+    size = page_size(args.get("per_page"))
+    params = dict(params, limit=size + 1)
+
+    if args.get("before"):
+        cursor = decode_cursor(args["before"], len(key_names))
+        rows = db.execute(before, dict(params, **dict(zip(key_names, cursor)))).fetchall()
+        if len(rows) <= size:
+            # ran into the start, show a full first page instead of a short one
+            return fetch_page(db, first, after, before, params, key_names, key,
+                              {k: v for k, v in args.items() if k == "per_page"})
+        rows = rows[:size][::-1]
+        has_prev, has_next = True, True
+    elif args.get("after"):
+        cursor = decode_cursor(args["after"], len(key_names))
+        rows = db.execute(after, dict(params, **dict(zip(key_names, cursor)))).fetchall()
+        has_prev, has_next = True, len(rows) > size
+        rows = rows[:size]
+    else:
+        rows = db.execute(first, params).fetchall()
+        has_prev, has_next = False, len(rows) > size
+        rows = rows[:size]
+
+    return Page(
+        rows=rows,
+        next_cursor=encode_cursor(key(rows[-1])) if rows and has_next else None,
+        prev_cursor=encode_cursor(key(rows[0])) if rows and has_prev else None,
+        args=args,
+    )
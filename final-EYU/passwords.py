@@ -0,0 +1,161 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from flask import current_app
+
+# password hashing off the request threads.
+#
+# a bcrypt hash or check is 100-300 ms of pure cpu. run inline it holds the
+# request thread and, with the gil, slows every other request in the process
+# during a burst of logins. so hashes and checks run in a small process pool
+# (PASSWORD_WORKERS processes); the request thread just waits on the result.
+# at most PASSWORD_QUEUE_DEPTH calls per worker can be waiting, past that
+# callers get PasswordBusy instead of queueing behind everyone else.
+#
+# the work factor is BCRYPT_LOG_ROUNDS if set, otherwise calibrated when the app
+# starts so one hash takes about PASSWORD_HASH_TARGET_MS on this machine. a user
+# whose stored hash has fewer rounds is rehashed on their next successful login.
+
+log = logging.getLogger(__name__)
+
+# 12 is what flask_bcrypt hashed with before, calibration only ever raises it
+MIN_ROUNDS = 12
+MAX_ROUNDS = 16
+DEFAULT_TARGET_MS = 250
+DEFAULT_QUEUE_DEPTH = 4
+
+# measured at a cheap cost and scaled up, each extra round doubles the work
+CALIBRATION_ROUNDS = 8
+
+_pool_lock = threading.Lock()
+
+
+class PasswordBusy(Exception):
+    pass
+
+
+# the work functions run in the pool's processes, so they stay plain module level functions
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check(password, hashed):
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+    except ValueError:
+        # malformed stored hash, or a password over bcrypt's 72 byte limit
+        return False
+
+
+# log rounds that make one hash take about target_ms here
+def calibrate(target_ms=DEFAULT_TARGET_MS, samples=3):
+    password = "calibration password"
+    best = math.inf
+    for _ in range(samples):
+        started = time.perf_counter()
+        _hash(password, CALIBRATION_ROUNDS)
+        best = min(best, (time.perf_counter() - started) * 1000)
+    rounds = CALIBRATION_ROUNDS + int(math.log2(max(target_ms / best, 1)))
+    return max(MIN_ROUNDS, min(MAX_ROUNDS, rounds))
+
+
+def rounds_of(hashed):
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+
+def work_factor():
+    return current_app.config["BCRYPT_LOG_ROUNDS"]
+
+
+class PasswordPool:
+
+    def __init__(self, workers, queue_depth=DEFAULT_QUEUE_DEPTH):
+        # spawn, not fork: forking a process that already runs threads (writer,
+        # job runner, connection pools) can copy a lock in a held state. spawned
+        # workers import the main module, so scripts using the app need a
+        # if __name__ == '__main__' guard (init_db.py has one)
+        self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers * queue_depth)
+        self._lock = threading.Lock()
+        self._stats = {"hashes": 0, "checks": 0, "busy": 0, "seconds": 0.0}
+
+    def run(self, fn, *args, wait=5.0):
+        if not self._slots.acquire(timeout=wait):
+            with self._lock:
+                self._stats["busy"] += 1
+            raise PasswordBusy("too many password checks in progress")
+        started = time.perf_counter()
+        try:
+            return self.executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._stats["hashes" if fn is _hash else "checks"] += 1
+                self._stats["seconds"] += time.perf_counter() - started
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, workers=self.workers)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# the app's pool, None when PASSWORD_POOL_ENABLED is off (then the work runs inline)
+def get_pool(app=None):
+    app = app or current_app._get_current_object()
+    if not app.config.get("PASSWORD_POOL_ENABLED", True):
+        return None
+    with _pool_lock:
+        pool = app.extensions.get("password_pool")
+        if pool is None:
+            pool = app.extensions["password_pool"] = PasswordPool(
+                app.config.get("PASSWORD_WORKERS") or min(4, os.cpu_count() or 1),
+                app.config.get("PASSWORD_QUEUE_DEPTH", DEFAULT_QUEUE_DEPTH))
+    return pool
+
+
+def _run(fn, *args):
+    pool = get_pool()
+    if pool is None:
+        return fn(*args)
+    return pool.run(fn, *args, wait=current_app.config.get("PASSWORD_QUEUE_TIMEOUT", 5.0))
+
+
+# raises PasswordBusy when the pool is saturated
+def hash_password(password):
+    return _run(_hash, password, work_factor())
+
+
+def check_password(password, hashed):
+    return _run(_check, password, hashed)
+
+
+# stored with fewer rounds than we use now. only upgrades: a calibration that
+# comes out one lower after a restart shouldn't rehash everyone
+def needs_rehash(hashed):
+    return rounds_of(hashed) < work_factor()
+
+
+def close_pool(app):
+    pool = app.extensions.pop("password_pool", None)
+    if pool is not None:
+        pool.close()
+
+
+def init_app(app):
+    if not app.config.get("BCRYPT_LOG_ROUNDS"):
+        started = time.perf_counter()
+        app.config["BCRYPT_LOG_ROUNDS"] = calibrate(app.config.get("PASSWORD_HASH_TARGET_MS", DEFAULT_TARGET_MS))
+        log.info("bcrypt work factor %d, calibrated in %.0f ms",
+                 app.config["BCRYPT_LOG_ROUNDS"], (time.perf_counter() - started) * 1000)
@@ -0,0 +1,789 @@
+import json
+import sqlite3
+from dataclasses import dataclass
+from typing import Optional
+
+from flask import current_app
+
+import names
+import pagination
+
+# every query the app runs lives here, so each one has a single place to be tuned.
+# results come back as small frozen dataclasses; templates can still use
+# item['field'] since jinja falls back to attribute lookup
+
+
+@dataclass(frozen=True)
+class InventoryRow:
+    id: int
+    ingredient: str
+    category: str
+    quantity: str
+    last_updated: str
+    macros: Optional[str]
+
+
+@dataclass(frozen=True)
+class InventoryItem:
+    id: int
+    ingredient_id: int
+    ingredient_name: str
+    category_name: str
+    quantity: str
+
+
+@dataclass(frozen=True)
+class CatalogRow:
+    id: int
+    category: str
+    ingredient: str
+
+
+@dataclass(frozen=True)
+class PantryItem:
+    name: str
+    category: str
+    last_updated: str
+
+
+@dataclass(frozen=True)
+class Ingredient:
+    id: int
+    ingredient_name: str
+    category_id: int
+    category_name: str
+
+
+# inventory category is inventory.category_id (what the user filed it under),
+# not the catalog category of the ingredient.
+# macros come from a correlated subquery instead of LEFT JOIN + GROUP BY so the
+# rows stream straight off idx_inventory_user_updated with no temp b-tree sort.
+# order=None leaves out the ORDER BY, for single row lookups
+def _user_inventory_sql(keyset="", order="DESC", limit=""):
+    order_by = f"ORDER BY inventory.last_updated {order}, inventory.id {order}" if order else ""
+    return f"""
+    SELECT inventory.id,
+           ingredient.ingredient_name AS ingredient,
+           category.category_name AS category,
+           inventory.quantity,
+           inventory.last_updated,
+           (SELECT GROUP_CONCAT(macronutrient.macro_name, ', ')
+            FROM ingredient_macronutrient
+            JOIN macronutrient ON ingredient_macronutrient.macronutrient_id = macronutrient.id
+            WHERE ingredient_macronutrient.ingredient_id = inventory.ingredient_id) AS macros
+    FROM inventory
+    JOIN category ON inventory.category_id = category.id
+    JOIN ingredient ON inventory.ingredient_id = ingredient.id
+    WHERE inventory.user_id = :user_id {keyset}
+    {order_by}
+    {limit}
+"""
+
+
+# home page, keyset paginated on (last_updated, id), newest first (see pagination.py).
+# the row value comparison is a range on idx_inventory_user_updated, so any page is
+# one index seek. _BEFORE walks backwards for the prev link
+USER_INVENTORY_PAGE = _user_inventory_sql(limit="LIMIT :limit")
+USER_INVENTORY_AFTER = _user_inventory_sql(
+    "AND (inventory.last_updated, inventory.id) < (:last_updated, :id)", limit="LIMIT :limit")
+USER_INVENTORY_BEFORE = _user_inventory_sql(
+    "AND (inventory.last_updated, inventory.id) > (:last_updated, :id)", "ASC", "LIMIT :limit")
+
+# one row in the home page's shape, for the json api (api.py)
+INVENTORY_ROW = _user_inventory_sql("AND inventory.id = :id", order=None)
+
+INVENTORY_ITEM = """
+    SELECT inventory.id, inventory.ingredient_id, ingredient.ingredient_name,
+           category.category_name, inventory.quantity
+    FROM inventory
+    JOIN ingredient ON inventory.ingredient_id = ingredient.id
+    JOIN category ON inventory.category_id = category.id
+    WHERE inventory.id = ? AND inventory.user_id = ?
+"""
+
+# what the recipe search works from (query_planner.py), most recently touched first
+PANTRY_ITEMS = """
+    SELECT ingredient.ingredient_name AS name, category.category_name AS category, inventory.last_updated
+    FROM inventory
+    JOIN ingredient ON inventory.ingredient_id = ingredient.id
+    JOIN category ON inventory.category_id = category.id
+    WHERE inventory.user_id = ?
+    ORDER BY inventory.last_updated DESC
+"""
+
+# autocomplete (/api/ingredients/suggest). prefix matches come off the unique
+# name index as a range, substring matches from the trigram index in
+# ingredient_search (migrations/0003), best bm25 rank first
+SUGGEST_PREFIX = """
+    SELECT ingredient_name FROM ingredient
+    WHERE ingredient_name >= :prefix AND ingredient_name < :prefix_end
+    ORDER BY ingredient_name
+    LIMIT :limit
+"""
+
+SUGGEST_SUBSTRING = """
+    SELECT ingredient_name FROM ingredient_search
+    WHERE ingredient_search MATCH :match
+    ORDER BY rank
+    LIMIT :limit
+"""
+
+def _catalog_sql(keyset="", order="", limit=""):
+    return f"""
+    SELECT ingredient.id, category.category_name AS category, ingredient.ingredient_name AS ingredient
+    FROM ingredient
+    JOIN category ON ingredient.category_id = category.id
+    {keyset}
+    ORDER BY category.category_name {order}, ingredient.ingredient_name {order}, ingredient.id {order}
+    {limit}
+"""
+
+
+# ingredient page, keyset paginated on (category_name, ingredient_name, id)
+CATALOG_PAGE = _catalog_sql(limit="LIMIT :limit")
+CATALOG_AFTER = _catalog_sql(
+    "WHERE (category.category_name, ingredient.ingredient_name, ingredient.id) > (:category, :ingredient, :id)",
+    limit="LIMIT :limit")
+CATALOG_BEFORE = _catalog_sql(
+    "WHERE (category.category_name, ingredient.ingredient_name, ingredient.id) < (:category, :ingredient, :id)",
+    "DESC", "LIMIT :limit")
+
+# exports (exporter.py). macros are ';' separated, the format importer.py reads.
+# since is compared as text against last_updated, '' exports everything
+EXPORT_INVENTORY = """
+    SELECT ingredient.ingredient_name AS ingredient,
+           category.category_name AS category,
+           inventory.quantity,
+           (SELECT GROUP_CONCAT(macronutrient.macro_name, ';')
+            FROM ingredient_macronutrient
+            JOIN macronutrient ON ingredient_macronutrient.macronutrient_id = macronutrient.id
+            WHERE ingredient_macronutrient.ingredient_id = inventory.ingredient_id) AS macros,
+           inventory.last_updated
+    FROM inventory
+    JOIN category ON inventory.category_id = category.id
+    JOIN ingredient ON inventory.ingredient_id = ingredient.id
+    WHERE inventory.user_id = :user_id AND inventory.last_updated >= :since
+    ORDER BY inventory.last_updated, inventory.id
+"""
+
+EXPORT_INGREDIENTS = """
+    SELECT ingredient.ingredient_name AS ingredient,
+           category.category_name AS category,
+           (SELECT GROUP_CONCAT(macronutrient.macro_name, ';')
+            FROM ingredient_macronutrient
+            JOIN macronutrient ON ingredient_macronutrient.macronutrient_id = macronutrient.id
+            WHERE ingredient_macronutrient.ingredient_id = ingredient.id) AS macros
+    FROM ingredient
+    JOIN category ON ingredient.category_id = category.id
+    ORDER BY category.category_name, ingredient.ingredient_name
+"""
+
+# a typed name resolves to the ingredient with exactly that name, or else the
+# oldest one with the same canonical name (names.canonical_name), so "Apples"
+# finds "apple". used inline by the statements that look ingredients up by name
+RESOLVE_INGREDIENT_ID = """(
+    COALESCE((SELECT id FROM ingredient WHERE ingredient_name = :name),
+             (SELECT MIN(id) FROM ingredient WHERE normalized_name = :normalized))
+)"""
+
+INGREDIENT_BY_NAME = f"""
+    SELECT ingredient.id, ingredient.ingredient_name, ingredient.category_id, category.category_name
+    FROM ingredient
+    JOIN category ON ingredient.category_id = category.id
+    WHERE ingredient.id = {RESOLVE_INGREDIENT_ID}
+"""
+
+INGREDIENT_BY_ID = """
+    SELECT ingredient.id, ingredient.ingredient_name, ingredient.category_id, category.category_name
+    FROM ingredient
+    JOIN category ON ingredient.category_id = category.id
+    WHERE ingredient.id = ?
+"""
+
+# renaming :id to :name. taken if another ingredient has the name, or the same
+# canonical name unless that is the canonical name :id already has (an existing
+# near-duplicate pair stays editable)
+INGREDIENT_NAME_TAKEN = """
+    SELECT 1 FROM ingredient
+    WHERE (ingredient_name = :name
+           OR (normalized_name = :normalized
+               AND :normalized IS NOT (SELECT normalized_name FROM ingredient WHERE id = :id)))
+      AND id != :id
+"""
+
+# everything the fuzzy name index (names.NameIndex) needs
+INGREDIENT_NORMALIZED_NAMES = """
+    SELECT id, ingredient_name, normalized_name FROM ingredient ORDER BY normalized_name
+"""
+
+TABLE_VERSION = "SELECT version FROM table_version WHERE name = ?"
+
+REFERENCE_VERSIONS = """
+    SELECT name, version FROM table_version WHERE name IN ('category', 'macronutrient') ORDER BY name
+"""
+
+# what the home / catalog pages are built from, for their etags (etags.py). two primary
+# key lookups: the user's inventory version (NULL = never had any) and the catalog tables'
+PAGE_VERSIONS = """
+    SELECT (SELECT version FROM inventory_version WHERE user_id = :user_id) AS inventory,
+           (SELECT GROUP_CONCAT(name || '=' || version, ',') FROM table_version
+            WHERE name IN ('category', 'ingredient', 'ingredient_macronutrient', 'macronutrient')) AS catalog
+"""
+
+INGREDIENT_MACRO_IDS = "SELECT macronutrient_id FROM ingredient_macronutrient WHERE ingredient_id = ?"
+
+# reference data, loaded once per process by refdata.py
+CATEGORY_IDS = "SELECT id, category_name FROM category ORDER BY category_name"
+
+MACROS = "SELECT id, macro_name FROM macronutrient ORDER BY macro_name"
+
+# reference data by id / name for the json api, which also edits it (api.py)
+CATEGORY_BY_ID = "SELECT id, category_name FROM category WHERE id = ?"
+CATEGORY_ID_BY_NAME = "SELECT id FROM category WHERE category_name = ?"
+MACRO_BY_ID = "SELECT id, macro_name FROM macronutrient WHERE id = ?"
+MACRO_IDS_BY_NAME = """
+    SELECT id, macro_name FROM macronutrient WHERE macro_name IN (SELECT value FROM json_each(?))
+"""
+INGREDIENT_MACRO_NAMES = """
+    SELECT macronutrient.macro_name
+    FROM ingredient_macronutrient
+    JOIN macronutrient ON ingredient_macronutrient.macronutrient_id = macronutrient.id
+    WHERE ingredient_macronutrient.ingredient_id = ?
+"""
+
+# recipe search cache (recipe_cache.py)
+RECIPE_CACHE_GET = """
+    SELECT key, ingredients, payload, fetched_at, fresh_until, stale_until
+    FROM recipe_cache WHERE key = ?
+"""
+
+# recipe details still fresh, for a json array of recipe ids (recipe_details.py)
+RECIPE_DETAILS_GET = """
+    SELECT id, payload FROM recipe_detail
+    WHERE id IN (SELECT value FROM json_each(:ids)) AND fresh_until > :now
+"""
+
+# local recipe corpus in id order, a batch at a time (local_recipes.py)
+LOCAL_RECIPES_AFTER = """
+    SELECT id, title, image, source_url, ingredients FROM local_recipe
+    WHERE id > ? ORDER BY id LIMIT ?
+"""
+
+# background jobs (jobs.py)
+DUE_JOBS = "SELECT id FROM job WHERE status = 'queued' AND run_at <= ? ORDER BY run_at LIMIT ?"
+
+NEXT_JOB_RUN_AT = "SELECT MIN(run_at) FROM job WHERE status = 'queued'"
+
+JOB_COUNTS = "SELECT status, COUNT(*) AS jobs FROM job GROUP BY status"
+
+USER_BY_LOGIN = "SELECT id, username, email, hashed_password FROM user WHERE username = ? OR email = ?"
+
+# count one login attempt in this window, hits so far come back
+THROTTLE_HIT = """
+    INSERT INTO login_throttle (key, window, hits) VALUES (:key, :window, 1)
+    ON CONFLICT (key, window) DO UPDATE SET hits = hits + 1
+    RETURNING hits
+"""
+
+THROTTLE_PREVIOUS = "SELECT hits FROM login_throttle WHERE key = :key AND window = :window"
+
+DELETE_OLD_THROTTLE = "DELETE FROM login_throttle WHERE window < ?"
+
+# only if the hash is still the one that was checked, a password change in between wins
+UPDATE_PASSWORD_HASH = "UPDATE user SET hashed_password = :new WHERE id = :id AND hashed_password = :old"
+
+# one round trip for both register uniqueness checks
+USERNAME_EMAIL_TAKEN = """
+    SELECT MAX(username = :username) AS username_taken, MAX(email = :email) AS email_taken
+    FROM user
+    WHERE username = :username OR email = :email
+"""
+
+# writes lean on the constraints (UNIQUE username/email, ingredient_name,
+# (user_id, ingredient_id)) instead of SELECT-then-INSERT checks, which race.
+# ON CONFLICT DO NOTHING + RETURNING tells us whether the row went in
+INSERT_USER = """
+    INSERT INTO user (username, email, hashed_password) VALUES (?, ?, ?)
+    ON CONFLICT DO NOTHING
+    RETURNING id
+"""
+
+# nothing is inserted if the canonical name is already in the catalog either
+INSERT_INGREDIENT = """
+    INSERT INTO ingredient (ingredient_name, normalized_name, category_id)
+    SELECT :name, :normalized, id FROM category
+    WHERE category_name = :category
+      AND NOT EXISTS (SELECT 1 FROM ingredient WHERE normalized_name = :normalized)
+    ON CONFLICT (ingredient_name) DO NOTHING
+    RETURNING id, category_id
+"""
+
+UPDATE_INGREDIENT = """
+    UPDATE ingredient
+    SET ingredient_name = :name, normalized_name = :normalized,
+        category_id = (SELECT id FROM category WHERE category_name = :category)
+    WHERE id = :id
+"""
+
+DELETE_INGREDIENT = "DELETE FROM ingredient WHERE id = ?"
+
+INSERT_CATEGORY = "INSERT INTO category (category_name) VALUES (?) ON CONFLICT DO NOTHING RETURNING id"
+UPDATE_CATEGORY = "UPDATE category SET category_name = ? WHERE id = ?"
+# ingredients in the category block it (ON DELETE RESTRICT), sqlite3.IntegrityError
+DELETE_CATEGORY = "DELETE FROM category WHERE id = ?"
+INSERT_MACRO = "INSERT INTO macronutrient (macro_name) VALUES (?) ON CONFLICT DO NOTHING RETURNING id"
+UPDATE_MACRO = "UPDATE macronutrient SET macro_name = ? WHERE id = ?"
+DELETE_MACRO = "DELETE FROM macronutrient WHERE id = ?"
+
+# macro ids are passed as one json array so each is a single set-based statement
+INSERT_INGREDIENT_MACROS = """
+    INSERT INTO ingredient_macronutrient (ingredient_id, macronutrient_id)
+    SELECT ?, macronutrient.id
+    FROM macronutrient
+    WHERE macronutrient.id IN (SELECT value FROM json_each(?))
+    ON CONFLICT DO NOTHING
+"""
+
+DELETE_OTHER_INGREDIENT_MACROS = """
+    DELETE FROM ingredient_macronutrient
+    WHERE ingredient_id = ? AND macronutrient_id NOT IN (SELECT value FROM json_each(?))
+"""
+
+# add an existing catalog ingredient (by name) to a user's inventory. no row back
+# means either the name isn't in the catalog or it is already in the inventory
+INSERT_INVENTORY_BY_NAME = f"""
+    INSERT INTO inventory (user_id, ingredient_id, category_id, quantity)
+    SELECT :user_id, ingredient.id, ingredient.category_id, :quantity
+    FROM ingredient
+    WHERE ingredient.id = {RESOLVE_INGREDIENT_ID}
+    ON CONFLICT (user_id, ingredient_id) DO NOTHING
+    RETURNING id
+"""
+
+# re-adding something already in the inventory just updates the quantity
+UPSERT_INVENTORY = """
+    INSERT INTO inventory (user_id, ingredient_id, category_id, quantity)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id, ingredient_id) DO UPDATE
+    SET quantity = excluded.quantity, last_updated = datetime('now', 'localtime')
+    RETURNING id
+"""
+
+UPDATE_INVENTORY = """
+    UPDATE inventory
+    SET quantity = ?, category_id = (SELECT id FROM category WHERE category_name = ?), last_updated = datetime('now', 'localtime')
+    WHERE id = ? AND user_id = ?
+    RETURNING ingredient_id
+"""
+
+DELETE_INVENTORY = "DELETE FROM inventory WHERE id = ? AND user_id = ?"
+
+# bulk import (importer.py), run with executemany. rows are matched by ingredient
+# name so no ids have to come back between statements. a near-duplicate of an
+# existing name isn't added, its macros / inventory row go to the existing one
+IMPORT_INGREDIENT = """
+    INSERT INTO ingredient (ingredient_name, normalized_name, category_id)
+    SELECT :name, :normalized, :category_id
+    WHERE NOT EXISTS (SELECT 1 FROM ingredient WHERE normalized_name = :normalized)
+    ON CONFLICT (ingredient_name) DO NOTHING
+"""
+
+IMPORT_INGREDIENT_MACRO = f"""
+    INSERT INTO ingredient_macronutrient (ingredient_id, macronutrient_id)
+    SELECT ingredient.id, :macro_id FROM ingredient WHERE ingredient.id = {RESOLVE_INGREDIENT_ID}
+    ON CONFLICT DO NOTHING
+"""
+
+IMPORT_INVENTORY = f"""
+    INSERT INTO inventory (user_id, ingredient_id, category_id, quantity)
+    SELECT :user_id, ingredient.id, ingredient.category_id, :quantity
+    FROM ingredient
+    WHERE ingredient.id = {RESOLVE_INGREDIENT_ID}
+    ON CONFLICT (user_id, ingredient_id) DO UPDATE
+    SET quantity = excluded.quantity, last_updated = datetime('now', 'localtime')
+"""
+
+UPSERT_RECIPE_CACHE = """
+    INSERT INTO recipe_cache (key, ingredients, payload, fetched_at, fresh_until, stale_until)
+    VALUES (:key, :ingredients, :payload, :fetched_at, :fresh_until, :stale_until)
+    ON CONFLICT (key) DO UPDATE
+    SET ingredients = excluded.ingredients, payload = excluded.payload, fetched_at = excluded.fetched_at,
+        fresh_until = excluded.fresh_until, stale_until = excluded.stale_until
+"""
+
+DELETE_EXPIRED_RECIPE_CACHE = "DELETE FROM recipe_cache WHERE stale_until < ?"
+
+# id NULL = new recipe, a known id replaces that recipe
+UPSERT_LOCAL_RECIPE = """
+    INSERT INTO local_recipe (id, title, image, source_url, ingredients)
+    VALUES (:id, :title, :image, :source_url, :ingredients)
+    ON CONFLICT (id) DO UPDATE
+    SET title = excluded.title, image = excluded.image, source_url = excluded.source_url,
+        ingredients = excluded.ingredients
+"""
+
+# every recipe after this id, 0 = the whole corpus
+DELETE_LOCAL_RECIPES = "DELETE FROM local_recipe WHERE id > ?"
+
+UPSERT_RECIPE_DETAIL = """
+    INSERT INTO recipe_detail (id, payload, fetched_at, fresh_until)
+    VALUES (:id, :payload, :fetched_at, :fresh_until)
+    ON CONFLICT (id) DO UPDATE
+    SET payload = excluded.payload, fetched_at = excluded.fetched_at, fresh_until = excluded.fresh_until
+"""
+
+DELETE_EXPIRED_RECIPE_DETAILS = "DELETE FROM recipe_detail WHERE fresh_until < ?"
+
+# count one api call against today's budget. nothing comes back once the limit is reached
+TAKE_API_CALL = """
+    INSERT INTO api_quota (day, calls) VALUES (:day, 1)
+    ON CONFLICT (day) DO UPDATE SET calls = calls + 1 WHERE calls < :limit
+    RETURNING calls
+"""
+
+# a second enqueue with the same dedupe_key while the first is still waiting
+# replaces its payload and pushes run_at back (debounce)
+INSERT_JOB = """
+    INSERT INTO job (kind, payload, dedupe_key, run_at, max_attempts)
+    VALUES (:kind, :payload, :dedupe_key, :run_at, :max_attempts)
+    ON CONFLICT (dedupe_key) WHERE status = 'queued' DO UPDATE
+    SET payload = excluded.payload, run_at = excluded.run_at, max_attempts = excluded.max_attempts
+    RETURNING id
+"""
+
+# only one runner (thread or process) gets a row back
+CLAIM_JOB = """
+    UPDATE job SET status = 'running', attempts = attempts + 1, lease_until = :lease_until
+    WHERE id = :id AND status = 'queued'
+    RETURNING id, kind, payload, attempts, max_attempts
+"""
+
+DELETE_JOB = "DELETE FROM job WHERE id = ?"
+
+RETRY_JOB = "UPDATE job SET status = 'queued', run_at = ?, lease_until = NULL, last_error = ? WHERE id = ?"
+
+FAIL_JOB = "UPDATE job SET status = 'failed', lease_until = NULL, last_error = ? WHERE id = ?"
+
+# jobs whose runner died mid-run go back in the queue
+EXPIRED_JOB_LEASES = "SELECT id FROM job WHERE status = 'running' AND lease_until < ?"
+
+def user_by_login(db, login):
+    return db.execute(USER_BY_LOGIN, (login, login)).fetchone()
+
+
+# (username_taken, email_taken)
+def username_email_taken(db, username, email):
+    row = db.execute(USERNAME_EMAIL_TAKEN, {"username": username, "email": email}).fetchone()
+    return bool(row["username_taken"]), bool(row["email_taken"])
+
+
+# one page of the home page table. args are ?after= / ?before= / ?per_page=
+def user_inventory_page(db, user_id, args=None):
+    page = pagination.fetch_page(
+        db, USER_INVENTORY_PAGE, USER_INVENTORY_AFTER, USER_INVENTORY_BEFORE, {"user_id": user_id},
+        ("last_updated", "id"), lambda row: (row["last_updated"], row["id"]), args or {})
+    page.rows = [InventoryRow(**row) for row in page.rows]
+    return page
+
+
+def inventory_row(db, inventory_id, user_id):
+    row = db.execute(INVENTORY_ROW, {"id": inventory_id, "user_id": user_id}).fetchone()
+    return InventoryRow(**row) if row else None
+
+
+def inventory_item(db, inventory_id, user_id):
+    row = db.execute(INVENTORY_ITEM, (inventory_id, user_id)).fetchone()
+    return InventoryItem(**row) if row else None
+
+
+def pantry_items(db, user_id):
+    return [PantryItem(**row) for row in db.execute(PANTRY_ITEMS, (user_id,))]
+
+
+# up to limit names starting with q, then names containing it. the trigram
+# index needs at least 3 characters, shorter input only gets prefix matches
+def suggest_ingredients(db, q, limit=10):
+    q = " ".join(q.lower().split())
+    if not q:
+        return []
+
+    names = [row["ingredient_name"] for row in db.execute(
+        SUGGEST_PREFIX, {"prefix": q, "prefix_end": q + "\U0010ffff", "limit": limit})]
+
+    if len(names) < limit and len(q) >= 3:
+        # quoted so the input is one phrase, not fts5 query syntax
+        match = '"' + q.replace('"', '""') + '"'
+        for row in db.execute(SUGGEST_SUBSTRING, {"match": match, "limit": limit + len(names)}):
+            if row["ingredient_name"] not in names:
+                names.append(row["ingredient_name"])
+    return names[:limit]
+
+
+def catalog_page(db, args=None):
+    page = pagination.fetch_page(
+        db, CATALOG_PAGE, CATALOG_AFTER, CATALOG_BEFORE, {},
+        ("category", "ingredient", "id"), lambda row: (row["category"], row["ingredient"], row["id"]), args or {})
+    page.rows = [CatalogRow(**row) for row in page.rows]
+    return page
+
+
+def _name_params(name):
+    return {"name": name, "normalized": names.canonical_name(name)}
+
+
+# exact name, or failing that the catalog's spelling of the same canonical name
+def ingredient_by_name(db, name):
+    row = db.execute(INGREDIENT_BY_NAME, _name_params(name)).fetchone()
+    return Ingredient(**row) if row else None
+
+
+def ingredient_by_id(db, ingredient_id):
+    row = db.execute(INGREDIENT_BY_ID, (ingredient_id,)).fetchone()
+    return Ingredient(**row) if row else None
+
+
+def ingredient_name_taken(db, name, exclude_id=None):
+    return db.execute(INGREDIENT_NAME_TAKEN, dict(_name_params(name), id=exclude_id or 0)).fetchone() is not None
+
+
+def table_version(db, table):
+    row = db.execute(TABLE_VERSION, (table,)).fetchone()
+    return row["version"] if row else 0
+
+
+def category_by_id(db, category_id):
+    return db.execute(CATEGORY_BY_ID, (category_id,)).fetchone()
+
+
+def category_id_by_name(db, category_name):
+    row = db.execute(CATEGORY_ID_BY_NAME, (category_name,)).fetchone()
+    return row["id"] if row else None
+
+
+def macro_by_id(db, macro_id):
+    return db.execute(MACRO_BY_ID, (macro_id,)).fetchone()
+
+
+# macro name -> id for the names that exist
+def macro_ids_by_name(db, macro_names):
+    return {row["macro_name"]: row["id"] for row in db.execute(MACRO_IDS_BY_NAME, (json.dumps(list(macro_names)),))}
+
+
+def ingredient_macro_names(db, ingredient_id):
+    return [row["macro_name"] for row in db.execute(INGREDIENT_MACRO_NAMES, (ingredient_id,))]
+
+
+# (inventory version, catalog versions) for a user, inventory is 0 without a user
+def page_versions(db, user_id=None):
+    row = db.execute(PAGE_VERSIONS, {"user_id": user_id}).fetchone()
+    return (row["inventory"] or 0, row["catalog"])
+
+
+# ((name, version), ...) for category and macronutrient
+def reference_versions(db):
+    return tuple(tuple(row) for row in db.execute(REFERENCE_VERSIONS))
+
+
+# closest catalog name to a typo, or None. the trigram index is built once per
+# catalog version and shared by every request in the process
+def similar_ingredient(db, name, threshold=0.5):
+    key = (current_app.config["DATABASE"], table_version(db, "ingredient"))
+    cached = current_app.extensions.get("ingredient_name_index")
+    if cached is None or cached[0] != key:
+        index = names.NameIndex(tuple(row) for row in db.execute(INGREDIENT_NORMALIZED_NAMES))
+        cached = current_app.extensions["ingredient_name_index"] = (key, index)
+
+    matches = cached[1].closest(name, limit=1, threshold=threshold)
+    return matches[0][0] if matches else None
+
+
+def ingredient_macro_ids(db, ingredient_id):
+    return [row["macronutrient_id"] for row in db.execute(INGREDIENT_MACRO_IDS, (ingredient_id,))]
+
+
+###################################################################################
+## mutations. each takes the connection as its first argument, runs its statements
+## and returns what the route needs. they never commit: run them through
+## writer.write(), which wraps them in a transaction (or the group commit queue)
+
+# first row of an INSERT/UPDATE ... RETURNING. fetchall() so the statement runs to
+# completion before the transaction commits
+def _returning(db, sql, params):
+    rows = db.execute(sql, params).fetchall()
+    return rows[0] if rows else None
+
+
+def _json_ids(ids):
+    return json.dumps([int(i) for i in ids])
+
+
+def create_user(db, username, email, hashed_password):
+    row = _returning(db, INSERT_USER, (username, email, hashed_password))
+    return row["id"] if row else None
+
+
+# (hits in this window including this one, hits in the previous window)
+def throttle_hit(db, key, window):
+    current = _returning(db, THROTTLE_HIT, {"key": key, "window": window})["hits"]
+    previous = db.execute(THROTTLE_PREVIOUS, {"key": key, "window": window - 1}).fetchone()
+    return current, previous["hits"] if previous else 0
+
+
+def prune_throttle(db, before_window):
+    return db.execute(DELETE_OLD_THROTTLE, (before_window,)).rowcount
+
+
+# store a hash with the current work factor. False if the password changed meanwhile
+def rehash_password(db, user_id, old_hash, new_hash):
+    return db.execute(UPDATE_PASSWORD_HASH, {"id": user_id, "old": old_hash, "new": new_hash}).rowcount == 1
+
+
+def add_inventory_by_name(db, user_id, ingredient_name, quantity):
+    row = _returning(db, INSERT_INVENTORY_BY_NAME, dict(_name_params(ingredient_name), user_id=user_id, quantity=quantity))
+    return row["id"] if row else None
+
+
+def set_ingredient_macros(db, ingredient_id, macro_ids):
+    macro_ids = _json_ids(macro_ids)
+    db.execute(DELETE_OTHER_INGREDIENT_MACROS, (ingredient_id, macro_ids))
+    db.execute(INSERT_INGREDIENT_MACROS, (ingredient_id, macro_ids))
+
+
+# row with the new ingredient's id and category_id, or None if the name (or a
+# near-duplicate of it) is taken / category unknown
+def _insert_ingredient(db, name, category_name, macro_ids):
+    row = _returning(db, INSERT_INGREDIENT, dict(_name_params(name), category=category_name))
+    if row is not None and macro_ids:
+        db.execute(INSERT_INGREDIENT_MACROS, (row["id"], _json_ids(macro_ids)))
+    return row
+
+
+def create_ingredient(db, name, category_name, macro_ids=()):
+    row = _insert_ingredient(db, name, category_name, macro_ids)
+    return row["id"] if row else None
+
+
+# new catalog ingredient that goes straight into the user's inventory
+def create_inventory_ingredient(db, user_id, name, category_name, quantity, macro_ids=()):
+    row = _insert_ingredient(db, name, category_name, macro_ids)
+    if row is None:
+        return None
+    db.execute(UPSERT_INVENTORY, (user_id, row["id"], row["category_id"], quantity)).fetchall()
+    return row["id"]
+
+
+# raises sqlite3.IntegrityError if the new name belongs to another ingredient
+def update_ingredient(db, ingredient_id, name, category_name):
+    return db.execute(UPDATE_INGREDIENT, dict(_name_params(name), category=category_name, id=ingredient_id)).rowcount
+
+
+# edit from the inventory page: sets quantity and category, renames the catalog
+# ingredient and replaces its macros. returns False if the row isn't this user's.
+# raises sqlite3.IntegrityError if the new name belongs to another ingredient
+def update_inventory(db, inventory_id, user_id, name, category_name, quantity, macro_ids=()):
+    row = _returning(db, UPDATE_INVENTORY, (quantity, category_name, inventory_id, user_id))
+    if row is None:
+        return False
+    update_ingredient(db, row["ingredient_id"], name, category_name)
+    set_ingredient_macros(db, row["ingredient_id"], macro_ids)
+    return True
+
+
+# save one recipe search result and drop entries too old to serve even as stale
+def store_recipe_result(db, entry):
+    db.execute(UPSERT_RECIPE_CACHE, entry)
+    db.execute(DELETE_EXPIRED_RECIPE_CACHE, (entry["fetched_at"],))
+
+
+# save a batch of recipe details and drop expired ones
+def store_recipe_details(db, entries, now):
+    db.executemany(UPSERT_RECIPE_DETAIL, entries)
+    db.execute(DELETE_EXPIRED_RECIPE_DETAILS, (now,))
+
+
+def store_local_recipes(db, recipes):
+    db.executemany(UPSERT_LOCAL_RECIPE, recipes)
+    return len(recipes)
+
+
+def clear_local_recipes(db):
+    return db.execute(DELETE_LOCAL_RECIPES, (0,)).rowcount
+
+
+# True if the call fits in today's quota (and is now counted), False if the budget is spent
+def take_api_call(db, day, limit):
+    return _returning(db, TAKE_API_CALL, {"day": day, "limit": limit}) is not None
+
+
+def enqueue_job(db, kind, payload, run_at, dedupe_key=None, max_attempts=3):
+    row = _returning(db, INSERT_JOB, {"kind": kind, "payload": json.dumps(payload), "dedupe_key": dedupe_key,
+                                      "run_at": run_at, "max_attempts": max_attempts})
+    return row["id"]
+
+
+# the job row if this caller got it, None if someone else did
+def claim_job(db, job_id, lease_until):
+    return _returning(db, CLAIM_JOB, {"id": job_id, "lease_until": lease_until})
+
+
+def finish_job(db, job_id):
+    db.execute(DELETE_JOB, (job_id,))
+
+
+# back in the queue at run_at. if a newer job with the same dedupe key is already
+# waiting, that one covers it and this one is dropped
+def retry_job(db, job_id, run_at, error):
+    try:
+        db.execute(RETRY_JOB, (run_at, error, job_id))
+    except sqlite3.IntegrityError:
+        db.execute(DELETE_JOB, (job_id,))
+
+
+def fail_job(db, job_id, error):
+    db.execute(FAIL_JOB, (error, job_id))
+
+
+def requeue_expired_jobs(db, now):
+    expired = [row["id"] for row in db.execute(EXPIRED_JOB_LEASES, (now,)).fetchall()]
+    for job_id in expired:
+        retry_job(db, job_id, now, "lease expired")
+    return len(expired)
+
+
+def delete_inventory(db, inventory_id, user_id):
+    return db.execute(DELETE_INVENTORY, (inventory_id, user_id)).rowcount
+
+
+# ON DELETE CASCADE takes care of inventory rows and macros
+def delete_ingredient(db, ingredient_id):
+    return db.execute(DELETE_INGREDIENT, (ingredient_id,)).rowcount
+
+
+# new category's id, None if the name is taken
+def create_category(db, name):
+    row = _returning(db, INSERT_CATEGORY, (name,))
+    return row["id"] if row else None
+
+
+# raises sqlite3.IntegrityError if the name is taken
+def update_category(db, category_id, name):
+    return db.execute(UPDATE_CATEGORY, (name, category_id)).rowcount
+
+
+# raises sqlite3.IntegrityError while ingredients are filed under it
+def delete_category(db, category_id):
+    return db.execute(DELETE_CATEGORY, (category_id,)).rowcount
+
+
+def create_macro(db, name):
+    row = _returning(db, INSERT_MACRO, (name,))
+    return row["id"] if row else None
+
+
+def update_macro(db, macro_id, name):
+    return db.execute(UPDATE_MACRO, (name, macro_id)).rowcount
+
+
+# ON DELETE CASCADE drops it from every ingredient
+def delete_macro(db, macro_id):
+    return db.execute(DELETE_MACRO, (macro_id,)).rowcount
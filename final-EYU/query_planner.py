@@ -0,0 +1,128 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+import names
+import recipe_cache
+
+# recipe searches for big pantries.
+#
+# findByIngredients takes the ingredients as one comma separated query string
+# parameter. past a few dozen names the url gets too long for the api, and the
+# matches get worse anyway: every recipe "uses" something. so a large pantry is
+#   ranked     perishable categories first (use them before they go off), then
+#              the most recently added / changed
+#   chunked    into searches of at most CHUNK_SIZE names and MAX_QUERY_CHARS
+#              characters, only the first MAX_CHUNKS of them are searched
+#   searched   concurrently, each chunk through recipe_cache like any search,
+#              so chunks are cached and share the daily quota
+#   merged     deduplicated by recipe id and re-ranked against the whole pantry,
+#              a recipe found through one chunk may use ingredients from another
+
+DEFAULT_CHUNK_SIZE = 10
+DEFAULT_MAX_CHUNKS = 4
+MAX_QUERY_CHARS = 300
+
+# lower = searched first. anything not listed sits in the middle
+PERISHABILITY = {
+    "Produce": 0, "Seafood": 0, "Meat": 0, "Dairy": 0,
+    "Bakery": 1, "Plant Protein": 1,
+    "Frozen Food": 3, "Canned Goods": 3, "Pantry": 3,
+}
+DEFAULT_PERISHABILITY = 2
+
+_pool_lock = threading.Lock()
+
+
+# ingredient names, most urgent first. items are queries.PantryItem, newest first
+def rank(items):
+    items = sorted(items, key=lambda item: item.last_updated or "", reverse=True)
+    ranked = sorted(items, key=lambda item: PERISHABILITY.get(item.category, DEFAULT_PERISHABILITY))
+    return list(dict.fromkeys(item.name for item in ranked))
+
+
+# ranked names -> the searches to run, in order
+def chunk(ingredients, size=DEFAULT_CHUNK_SIZE, max_chunks=DEFAULT_MAX_CHUNKS, max_chars=MAX_QUERY_CHARS):
+    chunks = []
+    current, length = [], 0
+    for name in ingredients:
+        if current and (len(current) >= size or length + 1 + len(name) > max_chars):
+            chunks.append(current)
+            if len(chunks) == max_chunks:
+                return chunks
+            current, length = [], 0
+        current.append(name)
+        length += len(name) + (1 if length else 0)
+    if current:
+        chunks.append(current)
+    return chunks[:max_chunks]
+
+
+# the recipe with used / missed recounted against everything the user has
+def _rescore(recipe, have):
+    recipe = dict(recipe)
+    used = list(recipe.get("usedIngredients") or [])
+    missed = []
+    for ingredient in recipe.get("missedIngredients") or []:
+        (used if names.canonical_name(ingredient.get("name", "")) in have else missed).append(ingredient)
+    recipe.update(usedIngredients=used, missedIngredients=missed,
+                  usedIngredientCount=len(used), missedIngredientCount=len(missed))
+    return recipe
+
+
+# chunk results -> one list: deduplicated, most pantry items used first, then fewest missed
+def merge(results, ingredients, limit):
+    have = {names.canonical_name(name) for name in ingredients}
+    merged = {}
+    for recipes in results:
+        for recipe in recipes:
+            if recipe.get("id") not in merged:
+                merged[recipe.get("id")] = _rescore(recipe, have)
+    ranked = sorted(merged.values(), key=lambda recipe: (-recipe["usedIngredientCount"],
+                                                         recipe["missedIngredientCount"],
+                                                         -(recipe.get("likes") or 0)))
+    return ranked[:limit]
+
+
+def get_pool(app=None):
+    app = app or current_app._get_current_object()
+    with _pool_lock:
+        pool = app.extensions.get("recipe_query_pool")
+        if pool is None:
+            pool = app.extensions["recipe_query_pool"] = ThreadPoolExecutor(
+                app.config.get("RECIPE_QUERY_MAX_CHUNKS", DEFAULT_MAX_CHUNKS), thread_name_prefix="recipe-query")
+    return pool
+
+
+def _search(app, group, fetch):
+    with app.app_context():
+        return recipe_cache.find_recipes(group, fetch)
+
+
+# RecipeResult for a ranked list of names, through recipe_cache. small pantries
+# are one search as before; big ones are chunked, searched side by side and merged.
+# raises only if every chunk failed
+def find_recipes(ingredients, fetch, limit):
+    config = current_app.config
+    chunks = chunk(ingredients, config.get("RECIPE_QUERY_CHUNK_SIZE", DEFAULT_CHUNK_SIZE),
+                   config.get("RECIPE_QUERY_MAX_CHUNKS", DEFAULT_MAX_CHUNKS))
+    if len(chunks) <= 1:
+        return recipe_cache.find_recipes(chunks[0] if chunks else ingredients, fetch)
+
+    app = current_app._get_current_object()
+    futures = [get_pool(app).submit(_search, app, group, fetch) for group in chunks]
+    results, errors = [], []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    if not results:
+        raise errors[0]
+
+    sources = {result.source for result in results}
+    source = "stale" if "stale" in sources else "upstream" if "upstream" in sources else "fresh"
+    _, canonical = recipe_cache.cache_key(ingredients)
+    return recipe_cache.RecipeResult(merge([result.recipes for result in results], ingredients, limit),
+                                     canonical, min(result.fetched_at for result in results), source)
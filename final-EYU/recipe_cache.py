@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+from flask import current_app
+
+import names
+import queries
+from db import get_read_db
+from writer import write
+
+# persistent cache in front of the recipe api.
+#
+# results are stored in the recipe_cache table keyed on the user's ingredient
+# set (canonical names, sorted, deduplicated), so the same pantry never pays for
+# the same search twice and the cache survives restarts. an entry is
+#   fresh  until fresh_until: served as is
+#   stale  until stale_until: served immediately, refreshed in the background
+#   gone   after that: the request waits for the upstream call
+# identical searches in flight at the same time share one upstream call
+# (single flight). every upstream request, retries included, is counted against
+# a daily quota (take_quota, the client's quota hook); once it is spent, whatever
+# is cached is served no matter how old, instead of an error.
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TTL = 6 * 60 * 60               # seconds an entry is fresh
+DEFAULT_STALE = 7 * 24 * 60 * 60        # seconds after that it can still be served
+DEFAULT_DAILY_QUOTA = 150               # spoonacular free plan
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class RecipeResult:
+    recipes: list
+    ingredients: tuple
+    fetched_at: float
+    # "fresh", "stale" (served while refreshing, or the upstream is unavailable) or "upstream"
+    source: str
+
+    @property
+    def stale(self):
+        return self.source == "stale"
+
+
+# (key, canonical names) for a list of ingredient names
+def cache_key(ingredients):
+    canonical = tuple(sorted({names.canonical_name(name) for name in ingredients} - {""}))
+    return hashlib.sha1(",".join(canonical).encode("utf-8")).hexdigest(), canonical
+
+
+def today(now=None):
+    return time.strftime("%Y-%m-%d", time.gmtime(now))
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    # run fn() unless a call for key is already running, in which case wait for its result
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+_flight = SingleFlight()
+
+
+def lookup(db, key):
+    return db.execute(queries.RECIPE_CACHE_GET, (key,)).fetchone()
+
+
+# count one upstream request against today's quota, QuotaExceeded once it is spent.
+# recipes.py hands this to the client, which calls it before every attempt
+def take_quota(now=None):
+    limit = current_app.config.get("RECIPE_API_DAILY_QUOTA", DEFAULT_DAILY_QUOTA)
+    if limit <= 0 or not write(queries.take_api_call, today(now), limit):
+        raise QuotaExceeded(f"daily recipe api quota of {limit} calls used up")
+
+
+# one upstream call: fetch, store. fetch(canonical names) -> list of recipes
+# (the client spends the quota per request it makes)
+def _refresh(key, canonical, fetch, now):
+    config = current_app.config
+    recipes = fetch(list(canonical))
+    fetched_at = time.time() if now is None else now
+    fresh_until = fetched_at + config.get("RECIPE_CACHE_TTL", DEFAULT_TTL)
+    write(queries.store_recipe_result, {
+        "key": key,
+        "ingredients": json.dumps(canonical),
+        "payload": json.dumps(recipes),
+        "fetched_at": fetched_at,
+        "fresh_until": fresh_until,
+        "stale_until": fresh_until + config.get("RECIPE_CACHE_STALE", DEFAULT_STALE),
+    })
+    return RecipeResult(recipes, canonical, fetched_at, "upstream")
+
+
+def _refresh_in_background(key, canonical, fetch):
+    if _flight.in_flight(key):
+        return
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                _flight.do(key, lambda: _refresh(key, canonical, fetch, None))
+            except Exception:
+                log.warning("background recipe refresh failed", exc_info=True)
+
+    threading.Thread(target=run, name="recipe-refresh", daemon=True).start()
+
+
+def _cached(row, source):
+    return RecipeResult(json.loads(row["payload"]), tuple(json.loads(row["ingredients"])), row["fetched_at"], source)
+
+
+# recipes for a list of ingredient names, from the cache when possible.
+# raises QuotaExceeded or whatever fetch raises only when nothing is cached at all
+def find_recipes(ingredients, fetch, now=None):
+    key, canonical = cache_key(ingredients)
+    row = lookup(get_read_db(), key)
+    current = time.time() if now is None else now
+
+    if row is not None and current < row["fresh_until"]:
+        return _cached(row, "fresh")
+
+    if row is not None and current < row["stale_until"]:
+        _refresh_in_background(key, canonical, fetch)
+        return _cached(row, "stale")
+
+    try:
+        return _flight.do(key, lambda: _refresh(key, canonical, fetch, now))
+    except Exception:
+        if row is None:
+            raise
+        # quota spent or upstream down: old results beat no results
+        log.warning("recipe api unavailable, serving expired cache entry", exc_info=True)
+        return _cached(row, "stale")
@@ -0,0 +1,115 @@
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from flask import current_app
+
+import queries
+import recipe_cache
+from db import get_read_db
+from writer import write
+
+# details for the recipes on the suggestions page: ready time, servings and the
+# real recipe url, which findByIngredients doesn't return.
+#
+# fetching them one recipe at a time would add a round trip per recipe to the
+# page. instead the ids that aren't cached yet go out in informationBulk calls of
+# up to BULK_SIZE ids, run on a small thread pool, and the page waits for them
+# at most RECIPE_DETAIL_TIMEOUT seconds in total. whatever has arrived by then
+# is rendered; calls still running finish in the background and store their
+# results, so the next view has them. details are cached per recipe id in the
+# recipe_detail table, so a recipe that shows up in several searches is fetched once.
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TTL = 30 * 24 * 60 * 60     # seconds, recipe details barely change
+DEFAULT_TIMEOUT = 1.5               # seconds the page waits for missing details
+BULK_SIZE = 25
+
+# all the page uses, the full response is several kB per recipe
+FIELDS = ("readyInMinutes", "servings", "healthScore", "sourceUrl", "spoonacularSourceUrl")
+
+_flight = recipe_cache.SingleFlight()
+_pool_lock = threading.Lock()
+
+
+def trim(info):
+    return {field: info[field] for field in FIELDS if info.get(field) is not None}
+
+
+# link for a recipe: the url spoonacular gave us, else its page built from the title.
+# local recipes (local_recipes.py) bring their own sourceUrl, None if the corpus had none
+def recipe_url(recipe, detail=None):
+    detail = detail or {}
+    if detail.get("spoonacularSourceUrl") or detail.get("sourceUrl"):
+        return detail.get("spoonacularSourceUrl") or detail["sourceUrl"]
+    if "sourceUrl" in recipe:
+        return recipe["sourceUrl"]
+    slug = re.sub(r"[^a-z0-9]+", "-", str(recipe.get("title", "")).lower()).strip("-")
+    return f"https://spoonacular.com/recipes/{slug}-{recipe['id']}"
+
+
+def cached(db, recipe_ids, now=None):
+    rows = db.execute(queries.RECIPE_DETAILS_GET, {"ids": json.dumps(list(recipe_ids)),
+                                                   "now": time.time() if now is None else now})
+    return {row["id"]: json.loads(row["payload"]) for row in rows}
+
+
+def get_pool(app=None):
+    app = app or current_app._get_current_object()
+    with _pool_lock:
+        pool = app.extensions.get("recipe_detail_pool")
+        if pool is None:
+            pool = app.extensions["recipe_detail_pool"] = ThreadPoolExecutor(
+                app.config.get("RECIPE_DETAIL_WORKERS", 4), thread_name_prefix="recipe-detail")
+    return pool
+
+
+# one bulk call: fetch, store. fetch(ids) -> list of recipe information dicts
+# (the client spends the quota per request it makes, see recipe_cache.take_quota)
+def _fetch_chunk(app, recipe_ids, fetch):
+    with app.app_context():
+        config = app.config
+        now = time.time()
+        details = {info["id"]: trim(info) for info in fetch(list(recipe_ids)) if "id" in info}
+        fresh_until = now + config.get("RECIPE_DETAIL_TTL", DEFAULT_TTL)
+        write(queries.store_recipe_details, [
+            {"id": recipe_id, "payload": json.dumps(detail), "fetched_at": now, "fresh_until": fresh_until}
+            for recipe_id, detail in details.items()
+        ], now)
+        return details
+
+
+# recipe id -> detail dict for the recipes we could get within timeout seconds
+# (None = wait for all of them). never raises, recipes without details just render without
+def enrich(recipes, fetch, timeout=None, now=None):
+    recipe_ids = list(dict.fromkeys(recipe["id"] for recipe in recipes if "id" in recipe))
+    if not recipe_ids:
+        return {}
+
+    details = cached(get_read_db(), recipe_ids, now)
+    missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in details]
+    if not missing:
+        return details
+
+    app = current_app._get_current_object()
+    pool = get_pool(app)
+    futures = []
+    for start in range(0, len(missing), BULK_SIZE):
+        chunk = tuple(missing[start:start + BULK_SIZE])
+        # two page views of the same search share the call
+        futures.append(pool.submit(_flight.do, chunk, lambda chunk=chunk: _fetch_chunk(app, chunk, fetch)))
+
+    # one deadline for all of them, not one per call
+    done, pending = wait(futures, timeout=timeout)
+    for future in done:
+        try:
+            details.update(future.result())
+        except Exception:
+            log.warning("recipe details unavailable", exc_info=True)
+    if pending:
+        log.info("rendering recipes without details for %d bulk calls still running", len(pending))
+    return details
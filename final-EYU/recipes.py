@@ -0,0 +1,87 @@
+import logging
+
+from flask import current_app
+
+import jobs
+import local_recipes
+import queries
+import query_planner
+import recipe_cache
+import recipe_details
+import spoonacular
+from db import get_read_db
+
+# recipe suggestions for a user's inventory: from the local corpus
+# (local_recipes.py) and/or spoonacular behind recipe_cache, per RECIPE_SOURCE:
+#   local        local corpus only, works offline
+#   spoonacular  the api only
+#   auto         local corpus first, the api when it has nothing to offer
+#
+# every inventory change moves the user's ingredient set to a new cache key, so
+# the next /get_recipes would wait on the api. instead, each change schedules a
+# recipe_prefetch job a few seconds out; a burst of edits only pushes that one
+# job back (dedupe key per user) and the search runs once, after the user stops.
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PREFETCH_DELAY = 5.0
+RESULT_COUNT = 5
+SOURCES = ("auto", "local", "spoonacular")
+
+
+# one findByIngredients call, every attempt charged to the daily quota.
+# raises requests.RequestException or recipe_cache.QuotaExceeded on failure
+def fetch_recipes(ingredients):
+    return spoonacular.get_client().find_by_ingredients(ingredients, number=RESULT_COUNT, quota=recipe_cache.take_quota)
+
+
+# recipe information for a list of recipe ids, one call charged like fetch_recipes
+def fetch_details(recipe_ids):
+    return spoonacular.get_client().information_bulk(recipe_ids, quota=recipe_cache.take_quota)
+
+
+# the user's ingredient names, most urgent first (query_planner.rank)
+def pantry(db, user_id):
+    return query_planner.rank(queries.pantry_items(db, user_id))
+
+
+# RecipeResult for these ingredient names. raises like recipe_cache.find_recipes
+# when the api is asked and nothing is cached
+def find_recipes(ingredients):
+    source = current_app.config.get("RECIPE_SOURCE", "auto")
+    if source != "spoonacular":
+        result = local_recipes.find_recipes(ingredients, RESULT_COUNT)
+        if result.recipes or source == "local":
+            return result
+    # looked up at call time, so tests can swap fetch_recipes out. big pantries
+    # become several smaller searches, see query_planner.py
+    return query_planner.find_recipes(ingredients, lambda names: fetch_recipes(names), RESULT_COUNT)
+
+
+# recipe id -> details for what can be fetched within timeout seconds, see recipe_details.enrich.
+# local recipes carry what the page needs already
+def details(result, timeout=None):
+    if result.source == "local":
+        return {}
+    return recipe_details.enrich(result.recipes, lambda recipe_ids: fetch_details(recipe_ids), timeout)
+
+
+def schedule_prefetch(user_id):
+    delay = current_app.config.get("RECIPE_PREFETCH_DELAY", DEFAULT_PREFETCH_DELAY)
+    if delay < 0:
+        return None
+    return jobs.enqueue("recipe_prefetch", {"user_id": user_id}, delay=delay,
+                        dedupe_key=f"recipe_prefetch:{user_id}")
+
+
+@jobs.handler("recipe_prefetch")
+def prefetch(payload):
+    ingredients = pantry(get_read_db(), payload["user_id"])
+    if not ingredients:
+        return
+    try:
+        # no deadline here, nobody is waiting on the job
+        details(find_recipes(ingredients))
+    except recipe_cache.QuotaExceeded:
+        # nothing to retry until tomorrow
+        log.info("recipe prefetch skipped, daily quota used up")
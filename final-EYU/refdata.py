@@ -0,0 +1,72 @@
+import threading
+from dataclasses import dataclass
+
+from flask import current_app, g
+
+import queries
+
+# categories and macronutrients, the reference data behind every category
+# dropdown and macro checkbox list. they almost never change, so they're loaded
+# once per process and the prebuilt choice lists are handed out from memory.
+#
+# staleness is checked against table_version (bumped by triggers on both
+# tables, see migrations/0005), once per request: one primary key read instead of
+# two sorted queries per form. PRAGMA data_version isn't enough on its own, it
+# moves on every commit to any table and only counts other connections' writes.
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    version: tuple
+    category_ids: dict          # category name -> id
+    category_choices: tuple     # dropdown, blank prompt first
+    macro_ids: dict             # macro name -> id
+    macro_choices: tuple        # (id, name)
+    macro_choices_str: tuple    # (str id, name) for UpdateForm, which has no coerce
+
+
+_lock = threading.Lock()
+
+
+def load(db, version=None):
+    categories = db.execute(queries.CATEGORY_IDS).fetchall()
+    macros = db.execute(queries.MACROS).fetchall()
+    return ReferenceData(
+        version=version,
+        category_ids={row["category_name"]: row["id"] for row in categories},
+        category_choices=(("", "Select a Category"),) + tuple((row["category_name"], row["category_name"]) for row in categories),
+        macro_ids={row["macro_name"]: row["id"] for row in macros},
+        macro_choices=tuple((row["id"], row["macro_name"]) for row in macros),
+        macro_choices_str=tuple((str(row["id"]), row["macro_name"]) for row in macros),
+    )
+
+
+def get(db):
+    if "_reference_data" in g:
+        return g._reference_data
+
+    key = (current_app.config["DATABASE"], queries.reference_versions(db))
+    cached = current_app.extensions.get("reference_data")
+    if cached is None or cached.version != key:
+        with _lock:
+            cached = current_app.extensions.get("reference_data")
+            if cached is None or cached.version != key:
+                cached = current_app.extensions["reference_data"] = load(db, key)
+
+    g._reference_data = cached
+    return cached
+
+
+# (value, label) pairs for the category dropdown, blank prompt first
+def category_choices(db):
+    return list(get(db).category_choices)
+
+
+# (id, name) pairs for macro checkboxes. UpdateForm.macros has no coerce so it wants str ids
+def macro_choices(db, as_str=False):
+    data = get(db)
+    return list(data.macro_choices_str if as_str else data.macro_choices)
+
+
+def category_id(db, category_name):
+    return get(db).category_ids.get(category_name)
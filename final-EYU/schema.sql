@@ -21,6 +21,8 @@ CREATE TABLE IF NOT EXISTS ingredient (
     id INTEGER PRIMARY KEY,
     ingredient_name TEXT UNIQUE NOT NULL,
     category_id INTEGER NOT NULL,
+    -- names.canonical_name(ingredient_name), set by the app. catches near-duplicates
+    normalized_name TEXT,
     FOREIGN KEY (category_id) REFERENCES category(id) ON DELETE RESTRICT
 );
 
@@ -43,4 +45,203 @@ CREATE TABLE IF NOT EXISTS ingredient_macronutrient (
     PRIMARY KEY (ingredient_id, macronutrient_id),
     FOREIGN KEY (ingredient_id) REFERENCES ingredient(id) ON DELETE CASCADE,
     FOREIGN KEY (macronutrient_id) REFERENCES macronutrient(id) ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+-- indexes for the hot queries in queries.py (tests/test_query_plans.py checks they get used)
+-- one inventory row per user per ingredient. also serves every user_id lookup
+CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_user_ingredient ON inventory (user_id, ingredient_id);
+-- home page: WHERE user_id = ? ORDER BY last_updated DESC, id DESC without a sort
+CREATE INDEX IF NOT EXISTS idx_inventory_user_updated ON inventory (user_id, last_updated);
+-- ON DELETE CASCADE from ingredient would otherwise scan all of inventory
+CREATE INDEX IF NOT EXISTS idx_inventory_ingredient ON inventory (ingredient_id);
+-- covering index for the catalog page, walked in category_name order through category
+CREATE INDEX IF NOT EXISTS idx_ingredient_category_name ON ingredient (category_id, ingredient_name);
+-- exact / near-duplicate name lookups (queries.py resolves names through it)
+CREATE INDEX IF NOT EXISTS idx_ingredient_normalized_name ON ingredient (normalized_name);
+-- reverse lookup / cascade for the junction table (PK only covers ingredient_id first)
+CREATE INDEX IF NOT EXISTS idx_ingredient_macronutrient_macro ON ingredient_macronutrient (macronutrient_id);
+
+-- trigram full text index over ingredient names (autocomplete), kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS ingredient_search USING fts5(
+    ingredient_name, content='ingredient', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS ingredient_search_insert AFTER INSERT ON ingredient BEGIN
+    INSERT INTO ingredient_search (rowid, ingredient_name) VALUES (new.id, new.ingredient_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingredient_search_delete AFTER DELETE ON ingredient BEGIN
+    INSERT INTO ingredient_search (ingredient_search, rowid, ingredient_name) VALUES ('delete', old.id, old.ingredient_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingredient_search_update AFTER UPDATE OF ingredient_name ON ingredient BEGIN
+    INSERT INTO ingredient_search (ingredient_search, rowid, ingredient_name) VALUES ('delete', old.id, old.ingredient_name);
+    INSERT INTO ingredient_search (rowid, ingredient_name) VALUES (new.id, new.ingredient_name);
+END;
+
+-- change counter per table, bumped by triggers. in-process caches compare it to know when to reload
+CREATE TABLE IF NOT EXISTS table_version (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO table_version (name) VALUES ('ingredient'), ('category'), ('macronutrient');
+
+CREATE TRIGGER IF NOT EXISTS ingredient_version_insert AFTER INSERT ON ingredient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'ingredient';
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingredient_version_update AFTER UPDATE ON ingredient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'ingredient';
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingredient_version_delete AFTER DELETE ON ingredient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'ingredient';
+END;
+
+CREATE TRIGGER IF NOT EXISTS category_version_insert AFTER INSERT ON category BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'category';
+END;
+
+CREATE TRIGGER IF NOT EXISTS category_version_update AFTER UPDATE ON category BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'category';
+END;
+
+CREATE TRIGGER IF NOT EXISTS category_version_delete AFTER DELETE ON category BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'category';
+END;
+
+CREATE TRIGGER IF NOT EXISTS macronutrient_version_insert AFTER INSERT ON macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'macronutrient';
+END;
+
+CREATE TRIGGER IF NOT EXISTS macronutrient_version_update AFTER UPDATE ON macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'macronutrient';
+END;
+
+CREATE TRIGGER IF NOT EXISTS macronutrient_version_delete AFTER DELETE ON macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'macronutrient';
+END;
+
+-- cached recipe search results, keyed on the canonical sorted ingredient set (recipe_cache.py)
+CREATE TABLE IF NOT EXISTS recipe_cache (
+    key TEXT PRIMARY KEY,
+    ingredients TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    fresh_until REAL NOT NULL,
+    stale_until REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_recipe_cache_stale_until ON recipe_cache (stale_until);
+
+-- upstream recipe api calls per (UTC) day, checked against the daily quota
+CREATE TABLE IF NOT EXISTS api_quota (
+    day TEXT PRIMARY KEY,
+    calls INTEGER NOT NULL DEFAULT 0
+);
+
+-- background jobs (jobs.py). queued -> running -> deleted when done, or failed after max_attempts
+CREATE TABLE IF NOT EXISTS job (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}',
+    dedupe_key TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    run_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    lease_until REAL,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_status_run_at ON job (status, run_at);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_job_queued_dedupe ON job (dedupe_key) WHERE status = 'queued';
+
+-- recipe details by spoonacular recipe id, enriches the suggestions page (recipe_details.py)
+CREATE TABLE IF NOT EXISTS recipe_detail (
+    id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    fresh_until REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_recipe_detail_fresh_until ON recipe_detail (fresh_until);
+
+-- local recipe corpus for offline suggestions (local_recipes.py), ingredients as a json array of canonical names
+CREATE TABLE IF NOT EXISTS local_recipe (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    image TEXT,
+    source_url TEXT,
+    ingredients TEXT NOT NULL
+);
+
+INSERT OR IGNORE INTO table_version (name) VALUES ('local_recipe');
+
+CREATE TRIGGER IF NOT EXISTS local_recipe_version_insert AFTER INSERT ON local_recipe BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'local_recipe';
+END;
+
+CREATE TRIGGER IF NOT EXISTS local_recipe_version_update AFTER UPDATE ON local_recipe BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'local_recipe';
+END;
+
+CREATE TRIGGER IF NOT EXISTS local_recipe_version_delete AFTER DELETE ON local_recipe BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'local_recipe';
+END;
+
+-- login attempts per key (ip:..., login:...) and time window, for LOGIN_THROTTLE_BACKEND=sqlite (throttle.py)
+CREATE TABLE IF NOT EXISTS login_throttle (
+    key TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (key, window)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_login_throttle_window ON login_throttle (window);
+
+-- version counters behind the home and catalog page etags (etags.py): one per
+-- user for their inventory rows, and ingredient_macronutrient joins the catalog
+-- tables in table_version, so an unchanged page costs one lookup instead of its joins
+CREATE TABLE IF NOT EXISTS inventory_version (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO inventory_version (user_id) SELECT DISTINCT user_id FROM inventory;
+
+CREATE TRIGGER IF NOT EXISTS inventory_version_insert AFTER INSERT ON inventory BEGIN
+    INSERT INTO inventory_version (user_id, version) VALUES (NEW.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS inventory_version_update AFTER UPDATE ON inventory BEGIN
+    INSERT INTO inventory_version (user_id, version) VALUES (NEW.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+    UPDATE inventory_version SET version = version + 1 WHERE user_id = OLD.user_id AND OLD.user_id <> NEW.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS inventory_version_delete AFTER DELETE ON inventory BEGIN
+    UPDATE inventory_version SET version = version + 1 WHERE user_id = OLD.user_id;
+END;
+
+INSERT OR IGNORE INTO table_version (name) VALUES ('ingredient_macronutrient');
+
+CREATE TRIGGER IF NOT EXISTS ingredient_macronutrient_version_insert AFTER INSERT ON ingredient_macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'ingredient_macronutrient';
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingredient_macronutrient_version_update AFTER UPDATE ON ingredient_macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'ingredient_macronutrient';
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingredient_macronutrient_version_delete AFTER DELETE ON ingredient_macronutrient BEGIN
+    UPDATE table_version SET version = version + 1 WHERE name = 'ingredient_macronutrient';
+END;
+
+-- deleting or adding a category checks inventory.category_id for the foreign key,
+-- a full scan of inventory without this (categories are editable through api.py)
+CREATE INDEX IF NOT EXISTS idx_inventory_category ON inventory (category_id);
@@ -0,0 +1,270 @@
+import bisect
+import random
+import threading
+import time
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+# client for the spoonacular recipe api.
+#
+# one pooled keep-alive session per process, connect / read timeouts on every
+# call, a couple of retries with jittered exponential backoff for errors that
+# are worth retrying (connection problems, timeouts, 429, 5xx), and a circuit
+# breaker: after BREAKER_THRESHOLD failed calls in a row it stops calling the
+# api for BREAKER_RESET seconds and fails immediately, then lets one trial
+# call through. latency of every attempt goes into a histogram (see stats()).
+# every attempt, retries included, first goes through the caller's quota hook
+# if there is one, since each one is a request spoonacular bills (recipes.py
+# charges the daily quota with it).
+#
+# SPOONACULAR_BASE_URL can point at spoonacular_stub.py for offline load tests.
+
+DEFAULT_BASE_URL = "https://api.spoonacular.com"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+
+class CircuitBreaker:
+
+    def __init__(self, threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if self.clock() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    # raises CircuitOpenError unless a call may go out now
+    def before_call(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return
+            if state == "half-open" and not self._trial:
+                # exactly one trial call, everyone else keeps failing fast until it reports back
+                self._trial = True
+                return
+        raise CircuitOpenError("recipe api circuit is open, not calling upstream")
+
+    # the call before_call() let through never went out, so it says nothing about the upstream
+    def cancel(self):
+        with self._lock:
+            self._trial = False
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                if self._opened_at is None or self._trial:
+                    self.opened += 1
+                self._opened_at = self.clock()
+                self._trial = False
+
+
+class LatencyHistogram:
+
+    # upper bounds in ms, the last bucket catches everything slower
+    BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.BUCKETS) + 1)
+        self._count = 0
+        self._total = 0.0
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        with self._lock:
+            self._counts[bisect.bisect_left(self.BUCKETS, ms)] += 1
+            self._count += 1
+            self._total += ms
+
+    # upper bound of the bucket holding the q-th quantile, None past the last bucket
+    def quantile(self, q):
+        with self._lock:
+            counts, count = list(self._counts), self._count
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            seen += n
+            if seen >= rank:
+                return self.BUCKETS[i] if i < len(self.BUCKETS) else None
+        return None
+
+    def stats(self):
+        with self._lock:
+            buckets = {f"le_{bound}ms": n for bound, n in zip(self.BUCKETS, self._counts)}
+            buckets["slower"] = self._counts[-1]
+            count, total = self._count, self._total
+        return {
+            "count": count,
+            "mean_ms": round(total / count, 1) if count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class SpoonacularClient:
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, connect_timeout=3.05, read_timeout=10.0,
+                 retries=2, backoff=0.25, breaker=None, pool_size=10, quota=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyHistogram()
+        # default quota hook: called before every attempt, raises to stop
+        self.quota = quota
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0, "short_circuited": 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _take_quota(self, quota, attempt):
+        if quota is None:
+            return
+        try:
+            quota()
+        except Exception:
+            # out of quota before a retry: the attempts so far failed.
+            # before the first one nothing went out, the breaker learns nothing
+            if attempt:
+                self.breaker.failure()
+                self._count("failures")
+            else:
+                self.breaker.cancel()
+            raise
+
+    # GET path with params, json back. raises requests.RequestException (or CircuitOpenError),
+    # or whatever quota (default self.quota) raises before an attempt
+    def get(self, path, params, quota=None):
+        quota = quota or self.quota
+        self._count("calls")
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count("short_circuited")
+            raise
+
+        params = dict(params, apiKey=self.api_key)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count("retries")
+                # full jitter, so a burst of failing requests doesn't retry in lockstep
+                time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+
+            self._take_quota(quota, attempt)
+            self._count("attempts")
+            started = time.perf_counter()
+            try:
+                response = self.session.get(self.base_url + path, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.RequestException:
+                # too many redirects, a bad url and the like, a retry won't fix those.
+                # the breaker still has to hear about it or a half-open trial never ends
+                self.latency.observe(time.perf_counter() - started)
+                self.breaker.failure()
+                self._count("failures")
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.latency.observe(time.perf_counter() - started)
+                    try:
+                        response.raise_for_status()
+                    except requests.HTTPError:
+                        # 4xx other than 429 is our request's fault, retrying won't help
+                        # and the upstream is healthy, so it doesn't count against the breaker
+                        self.breaker.success()
+                        self._count("failures")
+                        raise
+                    self.breaker.success()
+                    return response.json()
+                error = requests.HTTPError(f"{response.status_code} from {path}", response=response)
+            self.latency.observe(time.perf_counter() - started)
+
+        self.breaker.failure()
+        self._count("failures")
+        raise error
+
+    def find_by_ingredients(self, ingredients, number=5, quota=None):
+        return self.get("/recipes/findByIngredients", {"ingredients": ",".join(ingredients), "number": number}, quota)
+
+    # full information for several recipes in one call, in no particular order
+    def information_bulk(self, recipe_ids, quota=None):
+        return self.get("/recipes/informationBulk", {"ids": ",".join(map(str, recipe_ids)), "includeNutrition": "false"},
+                        quota)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["circuit"] = self.breaker.state
+        stats["circuit_opened"] = self.breaker.opened
+        stats["latency"] = self.latency.stats()
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+_client_lock = threading.Lock()
+
+
+# the app's shared client, built from config on first use
+def get_client(app=None):
+    app = app or current_app
+    with _client_lock:
+        client = app.extensions.get("spoonacular")
+        if client is None:
+            config = app.config
+            client = app.extensions["spoonacular"] = SpoonacularClient(
+                config.get("SPOONACULAR_API_KEY"),
+                base_url=config.get("SPOONACULAR_BASE_URL", DEFAULT_BASE_URL),
+                connect_timeout=config.get("SPOONACULAR_CONNECT_TIMEOUT", 3.05),
+                read_timeout=config.get("SPOONACULAR_READ_TIMEOUT", 10.0),
+                retries=config.get("SPOONACULAR_RETRIES", 2),
+                breaker=CircuitBreaker(config.get("SPOONACULAR_BREAKER_THRESHOLD", 5),
+                                       config.get("SPOONACULAR_BREAKER_RESET", 30.0)),
+                pool_size=config.get("SPOONACULAR_POOL_SIZE", 10),
+            )
+    return client
@@ -0,0 +1,126 @@
+import argparse
+import random
+import threading
+import time
+import zlib
+
+from flask import Flask, abort, jsonify, request
+
+# local stand-in for the spoonacular endpoints the app uses, for load testing
+# and offline development. point the app at it with
+#   SPOONACULAR_BASE_URL=http://127.0.0.1:5001 flask --app flaskapp run
+# and start it with
+#   python spoonacular_stub.py --port 5001 --latency 200 --jitter 100 --error-rate 0.05
+#
+# latency / jitter are in ms. error_rate is the share of requests that get a 503,
+# hang_rate the share that sleep for hang seconds first (to trip client timeouts).
+# everything can also be changed while it runs: POST /_stub/config with json.
+# recipes are generated from the ingredient names, so the same query always
+# gets the same answer.
+
+DEFAULTS = {"latency": 0, "jitter": 0, "error_rate": 0.0, "hang_rate": 0.0, "hang": 30.0}
+
+EXTRAS = ("flour", "sugar", "salt", "onion", "garlic", "rice", "lemon", "basil")
+
+
+def fake_recipe(recipe_id, ingredients):
+    rng = random.Random(recipe_id)
+    used = rng.sample(ingredients, k=max(1, min(len(ingredients), rng.randint(1, 4))))
+    missed = rng.sample(EXTRAS, k=rng.randint(0, 3))
+    return {
+        "id": recipe_id,
+        "title": " ".join(name.title() for name in used) + " Bake",
+        "image": f"https://img.spoonacular.com/recipes/{recipe_id}-312x231.jpg",
+        "usedIngredientCount": len(used),
+        "missedIngredientCount": len(missed),
+        "usedIngredients": [{"id": zlib.crc32(name.encode()), "name": name} for name in used],
+        "missedIngredients": [{"id": zlib.crc32(name.encode()), "name": name} for name in missed],
+        "unusedIngredients": [],
+        "likes": rng.randint(0, 500),
+    }
+
+
+def fake_information(recipe_id):
+    rng = random.Random(recipe_id)
+    slug = f"stub-recipe-{recipe_id}"
+    return {
+        "id": recipe_id,
+        "title": slug.replace("-", " ").title(),
+        "readyInMinutes": rng.choice((15, 20, 30, 45, 60, 90)),
+        "servings": rng.randint(1, 8),
+        "healthScore": rng.randint(0, 100),
+        "sourceUrl": f"https://example.com/{slug}",
+        "spoonacularSourceUrl": f"https://spoonacular.com/{slug}",
+    }
+
+
+def create_app(**config):
+    app = Flask(__name__)
+    app.config["STUB"] = dict(DEFAULTS, **config)
+    app.config["STUB_STATS"] = {"requests": 0, "errors": 0, "hangs": 0}
+    lock = threading.Lock()
+
+    def count(name):
+        with lock:
+            app.config["STUB_STATS"][name] += 1
+
+    @app.before_request
+    def inject_faults():
+        if request.path.startswith("/_stub"):
+            return None
+        stub = app.config["STUB"]
+        count("requests")
+
+        delay = stub["latency"] + random.uniform(-stub["jitter"], stub["jitter"])
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if random.random() < stub["hang_rate"]:
+            count("hangs")
+            time.sleep(stub["hang"])
+        if random.random() < stub["error_rate"]:
+            count("errors")
+            abort(503)
+        return None
+
+    @app.route("/recipes/findByIngredients")
+    def find_by_ingredients():
+        ingredients = sorted({name.strip() for name in request.args.get("ingredients", "").split(",") if name.strip()})
+        number = request.args.get("number", 10, type=int)
+        if not ingredients:
+            return jsonify([])
+        seed = zlib.crc32(",".join(ingredients).encode())
+        return jsonify([fake_recipe(seed % 900000 + 100000 + i, ingredients) for i in range(number)])
+
+    @app.route("/recipes/informationBulk")
+    def information_bulk():
+        ids = [int(value) for value in request.args.get("ids", "").split(",") if value.strip().isdigit()]
+        return jsonify([fake_information(recipe_id) for recipe_id in ids])
+
+    @app.route("/_stub/config", methods=["GET", "POST"])
+    def stub_config():
+        if request.method == "POST":
+            app.config["STUB"].update({key: float(value) for key, value in (request.get_json() or {}).items()
+                                       if key in DEFAULTS})
+        return jsonify(config=app.config["STUB"], stats=app.config["STUB_STATS"])
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local spoonacular stand-in with latency and error injection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--latency", type=float, default=0, help="ms added to every response")
+    parser.add_argument("--jitter", type=float, default=0, help="+/- ms of random variation")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of requests that stall first")
+    parser.add_argument("--hang", type=float, default=30.0, help="seconds a stalled request waits")
+    args = parser.parse_args()
+
+    app = create_app(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                     hang_rate=args.hang_rate, hang=args.hang)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+// in place row edits for the inventory table: forms marked data-fragment are sent
+// with an X-Fragment: row header, the server answers with just the new <tr> (or
+// nothing, after a delete) and it replaces the row the form sat in. without
+// javascript the same forms post and reload the whole page as before
+document.addEventListener("submit", function (event) {
+    var form = event.target;
+    var row = form.closest("tbody[data-rows] > tr");
+    if (!form.hasAttribute("data-fragment") || !row) {
+        return;
+    }
+    event.preventDefault();
+
+    var data = new FormData(form);
+    var url = form.action;
+    var options = {method: form.method.toUpperCase(), credentials: "same-origin", headers: {"X-Fragment": "row"}};
+    if (options.method === "GET") {
+        url += (url.indexOf("?") < 0 ? "?" : "&") + new URLSearchParams(data).toString();
+    } else {
+        options.body = data;
+    }
+
+    fetch(url, options)
+        .then(function (response) {
+            // anything unexpected (sent to the login page, server error): fall back to a normal submit
+            if (response.redirected || (!response.ok && response.status !== 422)) {
+                throw new Error(response.statusText);
+            }
+            return response.text();
+        })
+        .then(function (html) {
+            if (!html.trim()) {
+                row.remove();
+                return;
+            }
+            var body = document.createElement("tbody");
+            body.innerHTML = html;
+            row.replaceWith(body.querySelector("tr") || "");
+        })
+        .catch(function () {
+            form.submit();
+        });
+});
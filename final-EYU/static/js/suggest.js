@@ -0,0 +1,40 @@
+// ingredient autocomplete: asks /api/ingredients/suggest while the user types and
+// fills the input's <datalist>, so the page doesn't have to carry the whole catalog
+document.querySelectorAll("input[data-suggest-url]").forEach(function (input) {
+    var list = document.getElementById(input.getAttribute("list"));
+    var timer = null;
+    var last = null;
+
+    function fill(names) {
+        list.replaceChildren.apply(list, names.map(function (name) {
+            var option = document.createElement("option");
+            option.value = name;
+            return option;
+        }));
+    }
+
+    input.addEventListener("input", function () {
+        clearTimeout(timer);
+        var q = input.value.trim();
+        if (!q) {
+            fill([]);
+            return;
+        }
+        // wait for a pause in typing, one request per burst of keys
+        timer = setTimeout(function () {
+            if (q === last) {
+                return;
+            }
+            last = q;
+            fetch(input.dataset.suggestUrl + "?q=" + encodeURIComponent(q), {credentials: "same-origin"})
+                .then(function (response) { return response.ok ? response.json() : {suggestions: []}; })
+                .then(function (data) {
+                    // answers can arrive out of order, only show the one for the current text
+                    if (data.q === input.value.trim().slice(0, 50)) {
+                        fill(data.suggestions);
+                    }
+                })
+                .catch(function () {});
+        }, 150);
+    });
+});
@@ -3,6 +3,10 @@ import os
 import pytest
 import sqlite3
 from flaskapp import app as flask_app, get_db
+from db import close_pools
+import jobs
+import passwords
+import migrate
 
 @pytest.fixture(scope="function")
 def app():
@@ -11,7 +15,14 @@ def app():
 
     flask_app.config.update({
         "TESTING": True,
-        "DATABASE": test_db_path
+        "DATABASE": test_db_path,
+        "SECRET_KEY": "test",
+        "WTF_CSRF_ENABLED": False,
+        # jobs stay queued, tests run them with jobs.run_pending()
+        "JOBS_ENABLED": False,
+        # cheap hashes, checked inline. test_passwords.py turns the pool on
+        "BCRYPT_LOG_ROUNDS": 4,
+        "PASSWORD_POOL_ENABLED": False
     })
     
     with flask_app.app_context():
@@ -20,32 +31,52 @@ def app():
 
         print(f"Using test database: {flask_app.config['DATABASE']}")  # Debug print
 
-        # Read schema.sql and execute it
-        with open("schema.sql", "r") as schema:
-            schema_sql = schema.read()
-            print("Executing schema.sql...")
-            cur.executescript(schema_sql)
+        # build schema the same way production does, through the migrations
+        print("Applying migrations...")
+        migrate.upgrade(db)
 
         # Read data.sql and execute it (if exists)
         if os.path.exists("data.sql"):
-            with open("data.sql", "r") as data:
-                data_sql = data.read()
-                print("Executing data.sql...")
-                cur.executescript(data_sql)
-
-        db.commit()
+            print("Executing data.sql...")
+            migrate.seed(db)
 
 
     yield flask_app
 
-    with flask_app.app_context():
-        db= get_db()
-        db.close()
+    # stop job threads and close pooled connections before removing the file they point at
+    jobs.stop_runner(flask_app)
+    passwords.close_pool(flask_app)
+    close_pools(flask_app)
+    # in-process caches are keyed by table_version, which restarts with every new test database
+    flask_app.extensions.pop("ingredient_name_index", None)
+    flask_app.extensions.pop("reference_data", None)
+    flask_app.extensions.pop("local_recipe_index", None)
+    # login attempt counts would carry over into the next test
+    flask_app.extensions.pop("login_throttle", None)
+    # rendered rows are keyed by version counters, which restart with every test database
+    flask_app.extensions.pop("fragment_cache", None)
 
-    if os.path.exists(test_db_path):
-        os.remove(test_db_path)
+    for path in (test_db_path, test_db_path + "-wal", test_db_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
 #teardown
 @pytest.fixture()
 def client(app):
     return app.test_client()
 
+def register_and_login(client, username):
+    client.post("/register", data={"username": username, "email": f"{username}@email.com",
+                                   "password": "Test@123!", "confirm": "Test@123!"})
+    client.post("/login", data={"login_field": username, "password": "Test@123!"})
+    return client
+
+# the client, registered and logged in as "cook" (password Test@123!)
+@pytest.fixture()
+def logged_in_client(client):
+    return register_and_login(client, "cook")
+
+# a second browser, logged in as "baker"
+@pytest.fixture()
+def other_client(app):
+    return register_and_login(app.test_client(), "baker")
+
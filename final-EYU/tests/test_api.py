@@ -0,0 +1,112 @@
+import pytest
+
+
+@pytest.fixture
+def api(client):
+    client.post("/register", data={"username": "cook", "email": "cook@email.com",
+                                   "password": "Test@123!", "confirm": "Test@123!"})
+    response = client.post("/api/v1/login", json={"login": "cook", "password": "Test@123!"})
+    assert response.status_code == 200
+    assert response.get_json()["username"] == "cook"
+    return client
+
+
+def test_login_required_and_json_only(client):
+    assert client.get("/api/v1/inventory").status_code == 401
+    assert client.post("/api/v1/login", json={"login": "nobody", "password": "x"}).status_code == 401
+    assert client.post("/api/v1/inventory", data={"ingredient": "apples"}).status_code == 415
+
+
+def test_inventory_crud(api):
+    created = api.post("/api/v1/inventory", json={"ingredient": "Apples", "quantity": "3"})
+    assert created.status_code == 201
+    item = created.get_json()
+    assert (item["ingredient"], item["quantity"], item["category"]) == ("apples", "3", "Produce")
+    assert set(item["macros"]) == {"Carbohydrate", "Fiber"}
+
+    assert api.post("/api/v1/inventory", json={"ingredient": "apples"}).status_code == 409
+
+    patched = api.patch(f"/api/v1/inventory/{item['id']}", json={"quantity": "5"})
+    assert patched.get_json()["quantity"] == "5"
+    assert patched.get_json()["ingredient"] == "apples"
+    assert api.get(f"/api/v1/inventory/{item['id']}").get_json()["quantity"] == "5"
+
+    assert api.delete(f"/api/v1/inventory/{item['id']}").status_code == 204
+    assert api.get(f"/api/v1/inventory/{item['id']}").status_code == 404
+    assert api.delete(f"/api/v1/inventory/{item['id']}").status_code == 404
+
+
+def test_unknown_ingredient_is_created_in_one_call(api):
+    missing = api.post("/api/v1/inventory", json={"ingredient": "beef jerky"})
+    assert missing.status_code == 404
+    assert api.post("/api/v1/inventory", json={"ingredient": "beef jerky", "category": "Nope"}).status_code == 422
+
+    created = api.post("/api/v1/inventory", json={"ingredient": "beef jerky", "category": "Pantry",
+                                                  "macros": ["Protein"], "quantity": "2"})
+    assert created.status_code == 201
+    assert created.get_json()["macros"] == ["Protein"]
+
+    page = api.get("/api/v1/ingredients", query_string={"per_page": 500}).get_json()
+    jerky = next(item for item in page["items"] if item["ingredient"] == "beef jerky")
+    assert api.get(f"/api/v1/ingredients/{jerky['id']}").get_json()["macros"] == ["Protein"]
+
+
+def test_inventory_pages(api):
+    for name in ("apples", "spinach", "mushrooms"):
+        api.post("/api/v1/inventory", json={"ingredient": name})
+    first = api.get("/api/v1/inventory?per_page=2").get_json()
+    assert len(first["items"]) == 2 and first["next"]
+    second = api.get("/api/v1/inventory", query_string={"per_page": 2, "after": first["next"]}).get_json()
+    assert len(second["items"]) == 1
+    assert api.get("/api/v1/inventory?after=junk").status_code == 400
+    # W1sxXSx7ImEiOjJ9XQ is [[1],{"a":2}]
+    assert api.get("/api/v1/inventory?after=W1sxXSx7ImEiOjJ9XQ").status_code == 400
+
+
+def test_ingredients_categories_and_macros(api):
+    category = api.post("/api/v1/categories", json={"name": "Snacks"})
+    assert category.status_code == 201
+    assert api.post("/api/v1/categories", json={"name": "Snacks"}).status_code == 409
+
+    ingredient = api.post("/api/v1/ingredients", json={"ingredient": "pretzels", "category": "Snacks"}).get_json()
+    renamed = api.patch(f"/api/v1/ingredients/{ingredient['id']}", json={"ingredient": "salted pretzels",
+                                                                         "macros": ["Carbohydrate"]})
+    assert renamed.get_json() == {"id": ingredient["id"], "ingredient": "salted pretzels",
+                                  "category": "Snacks", "macros": ["Carbohydrate"]}
+    assert api.patch(f"/api/v1/ingredients/{ingredient['id']}", json={"ingredient": "apples"}).status_code == 409
+
+    # still has an ingredient filed under it
+    category_id = category.get_json()["id"]
+    assert api.delete(f"/api/v1/categories/{category_id}").status_code == 409
+    assert api.delete(f"/api/v1/ingredients/{ingredient['id']}").status_code == 204
+    assert api.delete(f"/api/v1/categories/{category_id}").status_code == 204
+
+    macros = api.get("/api/v1/macros").get_json()["items"]
+    assert "Protein" in [macro["name"] for macro in macros]
+    assert api.put("/api/v1/macros").status_code == 405
+
+
+def test_batch_reports_each_operation(api):
+    response = api.post("/api/v1/batch", json={"operations": [
+        {"method": "POST", "path": "/inventory", "body": {"ingredient": "apples"}},
+        {"method": "POST", "path": "/inventory", "body": {"ingredient": "apples"}},
+        {"method": "POST", "path": "/inventory", "body": {"ingredient": "beef jerky", "category": "Pantry"}},
+        {"method": "GET", "path": "/inventory"},
+        {"method": "DELETE", "path": "/nothing/1"},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["committed"] is True
+    assert [result["status"] for result in body["results"]] == [201, 409, 201, 200, 404]
+    assert len(body["results"][3]["body"]["items"]) == 2
+
+
+def test_atomic_batch_rolls_back_everything(api):
+    response = api.post("/api/v1/batch", json={"atomic": True, "operations": [
+        {"method": "POST", "path": "/inventory", "body": {"ingredient": "apples"}},
+        {"method": "PATCH", "path": "/inventory/999999", "body": {"quantity": "2"}},
+    ]})
+    assert response.status_code == 409
+    assert response.get_json()["committed"] is False
+    assert [result["status"] for result in response.get_json()["results"]] == [201, 404]
+    assert api.get("/api/v1/inventory").get_json()["items"] == []
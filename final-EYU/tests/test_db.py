@@ -0,0 +1,61 @@
+import threading
+from db import ConnectionPool, get_db, get_pool, pool_stats
+
+
+def test_pragmas_applied(app):
+    with app.app_context():
+        db = get_pool().acquire()
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        assert db.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        get_pool().release(db)
+
+
+def test_connections_are_reused(app):
+    # each app context is a request's worth of get_db()
+    for _ in range(3):
+        with app.app_context():
+            get_db().execute("SELECT 1").fetchone()
+
+    with app.app_context():
+        stats = pool_stats()["rw"]
+    assert stats["in_use"] == 0
+    assert stats["opened"] == 1
+    assert stats["reused"] >= 3
+
+
+def test_release_rolls_back_open_transaction(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    db = pool.acquire()
+    db.execute("CREATE TABLE t (x INTEGER)")
+    db.commit()
+    db.execute("INSERT INTO t VALUES (1)")
+    pool.release(db)
+
+    db = pool.acquire()
+    assert db.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    assert pool.stats()["rollbacks"] == 1
+    pool.release(db)
+    pool.close_all()
+
+
+def test_pool_is_thread_safe(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_idle=4)
+
+    def work():
+        for _ in range(50):
+            db = pool.acquire()
+            db.execute("SELECT 1").fetchone()
+            pool.release(db)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = pool.stats()
+    assert stats["in_use"] == 0
+    assert stats["opened"] <= 4 + stats["closed"]
+    assert stats["opened"] + stats["reused"] == 200
+    pool.close_all()
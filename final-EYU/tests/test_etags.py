@@ -0,0 +1,64 @@
+import queries
+from db import get_db
+
+
+def test_unchanged_home_page_is_304_without_the_inventory_query(logged_in_client, monkeypatch):
+    logged_in_client.post("/add_ingredient", data={"ingredient": "apples", "quantity": "2"})
+
+    first = logged_in_client.get("/")
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    etag = first.headers["ETag"]
+
+    def no_query(*args):
+        raise AssertionError("the inventory query ran")
+    monkeypatch.setattr(queries, "user_inventory_page", no_query)
+
+    again = logged_in_client.get("/", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == etag
+
+
+def test_inventory_changes_move_only_that_users_etag(logged_in_client, other_client, app):
+    etag = logged_in_client.get("/").headers["ETag"]
+    logged_in_client.post("/add_ingredient", data={"ingredient": "apples", "quantity": "2"})
+    changed = logged_in_client.get("/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert b"Apples" in changed.data
+    etag = changed.headers["ETag"]
+
+    # someone else's inventory isn't on this page
+    other_client.post("/add_ingredient", data={"ingredient": "apples", "quantity": "1"})
+    assert logged_in_client.get("/", headers={"If-None-Match": etag}).status_code == 304
+
+    # but the catalog is: a renamed ingredient shows up on every home page
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE ingredient SET ingredient_name = 'green apples' WHERE ingredient_name = 'apples'")
+        db.commit()
+    assert logged_in_client.get("/", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_catalog_etag_follows_macro_links(logged_in_client, app):
+    etag = logged_in_client.get("/ingredient").headers["ETag"]
+    assert logged_in_client.get("/ingredient", headers={"If-None-Match": etag}).status_code == 304
+
+    with app.app_context():
+        db = get_db()
+        db.execute("DELETE FROM ingredient_macronutrient WHERE rowid IN (SELECT rowid FROM ingredient_macronutrient LIMIT 1)")
+        db.commit()
+    assert logged_in_client.get("/ingredient", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_moving_an_inventory_row_bumps_both_users(app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO user (id, username, email, hashed_password) VALUES (91, 'a', 'a@a.com', 'x'), (92, 'b', 'b@b.com', 'x')")
+        db.execute("INSERT INTO inventory (user_id, ingredient_id, category_id) "
+                   "SELECT 91, id, category_id FROM ingredient LIMIT 1")
+        before = queries.page_versions(db, 91)[0], queries.page_versions(db, 92)[0]
+        db.execute("UPDATE inventory SET user_id = 92 WHERE user_id = 91")
+        after = queries.page_versions(db, 91)[0], queries.page_versions(db, 92)[0]
+        db.rollback()
+    assert after == (before[0] + 1, before[1] + 1)
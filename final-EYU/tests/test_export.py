@@ -0,0 +1,48 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+
+
+# logged in, with milk and tofu in the inventory
+@pytest.fixture()
+def stocked_client(logged_in_client):
+    for name in ("milk", "tofu"):
+        logged_in_client.post("/add_ingredient", data={"ingredient": name, "quantity": "2"})
+    return logged_in_client
+
+
+def test_export_inventory_csv(stocked_client):
+    response = stocked_client.get("/export/inventory")
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert response.is_streamed
+
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row["ingredient"] for row in rows] == ["milk", "tofu"]
+    assert set(rows[0]["macros"].split(";")) == {"Protein", "Fat", "Water"}
+
+
+def test_export_inventory_since_and_gzip(stocked_client):
+    response = stocked_client.get("/export/inventory?format=ndjson&gzip=1&since=2999-01-01")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data) == b""
+
+    response = stocked_client.get("/export/inventory?format=ndjson&gzip=1&since=2000-01-01")
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert {json.loads(line)["ingredient"] for line in lines} == {"milk", "tofu"}
+
+    assert stocked_client.get("/export/inventory?since=yesterday").status_code == 400
+    assert stocked_client.get("/export/inventory?format=xml").status_code == 400
+
+
+def test_export_ingredients_round_trips_through_import(stocked_client):
+    response = stocked_client.get("/export/ingredients?format=csv")
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) > 10
+    assert set(rows[0]) == {"ingredient", "category", "macros"}
+
+    response = stocked_client.post("/import", data={"target": "catalog", "file": (io.BytesIO(response.data), "ingredients.csv")},
+                           content_type="multipart/form-data")
+    assert f"{len(rows)} of {len(rows)} rows imported, 0 errors".encode() in response.data
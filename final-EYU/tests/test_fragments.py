@@ -0,0 +1,62 @@
+import fragments
+import queries
+
+
+def table(version, size):
+    return fragments.Table(version, None, ("x" * size,), size)
+
+
+def test_cache_evicts_least_recently_used_past_the_memory_cap():
+    cache = fragments.FragmentCache(max_bytes=250)
+    cache.put("a", table(1, 100))
+    cache.put("b", table(1, 100))
+    assert cache.get("a", 1) is not None
+    cache.put("c", table(1, 100))
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is not None and cache.get("c", 1) is not None
+    assert cache.stats()["bytes"] == 200
+    assert cache.stats()["evictions"] == 1
+
+    # a new version takes over the slot, an old one is a miss
+    cache.put("a", table(2, 50))
+    assert cache.get("a", 1) is None
+    assert cache.stats()["bytes"] == 150
+    # too big to keep at all
+    cache.put("d", table(1, 300))
+    assert cache.get("d", 1) is None
+
+
+def test_home_page_rows_come_from_the_cache(logged_in_client, app, monkeypatch):
+    logged_in_client.post("/add_ingredient", data={"ingredient": "apples", "quantity": "2"})
+    logged_in_client.post("/add_ingredient", data={"ingredient": "spinach", "quantity": "1"})
+    first = logged_in_client.get("/")
+
+    def no_query(*args):
+        raise AssertionError("the inventory query ran")
+    monkeypatch.setattr(queries, "user_inventory_page", no_query)
+
+    again = logged_in_client.get("/")
+    assert again.data == first.data
+    assert fragments.CSRF_PLACEHOLDER.encode() not in again.data
+    assert app.extensions["fragment_cache"].stats()["hits"] >= 1
+
+    # the edited row is rendered fresh, the others still come from the cache
+    newest = first.data.split(b"/inventory/update/")[1].split(b'"')[0].decode()
+    edit = logged_in_client.get(f"/inventory/update/{newest}")
+    assert b'name="new_name"' in edit.data
+    assert edit.data.count(b"Edit</button>") == 1
+
+
+def test_changes_show_up_in_the_rows(logged_in_client):
+    logged_in_client.post("/add_ingredient", data={"ingredient": "apples", "quantity": "2"})
+    assert b"Apples" in logged_in_client.get("/").data
+    logged_in_client.post("/add_ingredient", data={"ingredient": "spinach", "quantity": "1"})
+    assert b"Spinach" in logged_in_client.get("/").data
+
+
+def test_catalog_rows_shared_by_users(logged_in_client, other_client, app):
+    logged_in_client.get("/ingredient")
+    page = other_client.get("/ingredient")
+    assert page.status_code == 200
+    assert fragments.CSRF_PLACEHOLDER.encode() not in page.data
+    assert app.extensions["fragment_cache"].stats()["tables"] == 1
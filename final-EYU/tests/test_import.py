@@ -0,0 +1,94 @@
+import io
+import queries
+from db import get_db
+from importer import import_stream
+
+CSV = """ingredient,category,macros,quantity
+Kale,Produce,Fiber;Water,2 bunches
+milk,dairy,,1 gallon
+,Produce,,1
+durian,Fruit,,1
+tempeh,Plant Protein,Protein;Sugar,1
+miso,Pantry,Protein,1
+"""
+
+NDJSON = """{"ingredient": "kale", "category": "Produce", "macros": ["Fiber"], "quantity": "3"}
+not json
+["a", "list"]
+{"ingredient": "seitan", "category": "Plant Protein", "macros": "Protein"}
+"""
+
+
+def test_csv_import_reports_bad_rows_and_keeps_going(app):
+    with app.app_context():
+        result = import_stream(io.StringIO(CSV), "csv", chunk_size=2)
+        db = get_db()
+
+        assert (result.rows, result.imported, result.error_count) == (6, 3, 3)
+        assert [line for line, _ in result.errors] == [4, 5, 6]
+        kale = queries.ingredient_by_name(db, "kale")
+        assert kale.category_name == "Produce"
+        assert len(queries.ingredient_macro_ids(db, kale.id)) == 2
+        assert queries.ingredient_by_name(db, "miso")
+        assert queries.ingredient_by_name(db, "tempeh") is None
+
+
+def test_ndjson_import_into_inventory(app):
+    with app.app_context():
+        db = get_db()
+        user_id = db.execute("INSERT INTO user (username, email, hashed_password) VALUES ('u', 'u@u.com', 'x')").lastrowid
+        db.commit()
+
+        result = import_stream(io.StringIO(NDJSON), "ndjson", user_id=user_id)
+        assert (result.rows, result.imported, result.error_count) == (4, 2, 2)
+
+        # importing again updates quantities instead of duplicating rows
+        import_stream(io.StringIO('{"ingredient": "kale", "category": "Produce", "quantity": "5"}\n'), "ndjson", user_id=user_id)
+        inventory = {row.ingredient: row.quantity for row in queries.user_inventory_page(db, user_id).rows}
+        assert inventory == {"kale": "5", "seitan": "1"}
+
+
+def test_ndjson_rows_of_the_wrong_type_are_skipped(app):
+    lines = [
+        '{"ingredient": "kale", "category": "Produce"}',
+        '{"ingredient": "chard", "category": "Produce", "macros": 5}',
+        '{"ingredient": ["x"], "category": "Produce"}',
+        '{"ingredient": "leek", "category": "Produce"}',
+    ]
+    with app.app_context():
+        result = import_stream(io.StringIO("\n".join(lines)), "ndjson", chunk_size=1)
+        assert (result.rows, result.imported) == (4, 2)
+        assert [line for line, _ in result.errors] == [2, 3]
+        db = get_db()
+        assert queries.ingredient_by_name(db, "leek")
+        assert queries.ingredient_by_name(db, "['x']") is None
+
+
+def test_upload_endpoint(logged_in_client):
+    response = logged_in_client.post("/import", data={
+        "target": "inventory",
+        "file": (io.BytesIO(CSV.encode()), "items.csv"),
+    }, content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert b"3 of 6 rows imported, 3 errors" in response.data
+
+    response = logged_in_client.get("/")
+    assert b"Kale" in response.data and b"2 bunches" in response.data
+
+
+def test_upload_that_is_not_utf8(logged_in_client):
+    latin1 = "ingredient,category\ncr\xe8me,Dairy\nleek,Produce\n".encode("latin-1")
+    response = logged_in_client.post("/import", data={
+        "target": "catalog",
+        "file": (io.BytesIO(latin1), "items.csv"),
+    }, content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert b"1 of 2 rows imported, 1 errors" in response.data
+    assert b"not valid UTF-8" in response.data
+
+
+def test_cli_import(app, tmp_path):
+    path = tmp_path / "items.ndjson"
+    path.write_text(NDJSON)
+    result = app.test_cli_runner().invoke(args=["import-data", str(path)])
+    assert "2 of 4 rows imported, 2 errors" in result.output
@@ -23,7 +23,7 @@ def test_add_inventory(client):
     assert response.status_code == 200
     assert response.request.path == '/add_inventory_item'
 
-    response = client.post("/add_inventory_item", data={"item": "beef jerky", "category": "Pantry", "macros": "Protein", "quantity": "2"}, follow_redirects=True)
+    response = client.post("/add_inventory_item", data={"item": "beef jerky", "category": "Pantry", "macros": "1", "quantity": "2"}, follow_redirects=True)
     assert response.status_code == 200
     assert response.request.path == '/'
 
@@ -0,0 +1,123 @@
+import time
+import pytest
+import jobs
+import queries
+import recipes
+from db import get_db
+
+
+calls = []
+
+
+@jobs.handler("test_record")
+def record(payload):
+    calls.append(payload)
+
+
+@jobs.handler("test_fail")
+def fail(payload):
+    raise RuntimeError("boom")
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+def job_rows(app):
+    with app.app_context():
+        return [dict(row) for row in get_db().execute("SELECT * FROM job ORDER BY id")]
+
+
+def test_enqueue_and_run(app):
+    with app.app_context():
+        jobs.enqueue("test_record", {"n": 1})
+        jobs.enqueue("test_record", {"n": 2}, delay=60)
+        assert jobs.run_pending() == (1, 0)
+
+    assert calls == [{"n": 1}]
+    # the delayed one is still waiting
+    assert [row["status"] for row in job_rows(app)] == ["queued"]
+
+
+def test_dedupe_key_debounces(app):
+    with app.app_context():
+        first = jobs.enqueue("test_record", {"n": 1}, delay=10, dedupe_key="k")
+        second = jobs.enqueue("test_record", {"n": 2}, delay=20, dedupe_key="k")
+        assert first == second
+
+    rows = job_rows(app)
+    assert len(rows) == 1
+    assert rows[0]["payload"] == '{"n": 2}'
+    assert rows[0]["run_at"] > time.time() + 15
+
+
+def test_unknown_kind(app):
+    with app.app_context(), pytest.raises(ValueError):
+        jobs.enqueue("no_such_job")
+
+
+def test_failing_job_is_retried_then_failed(app):
+    app.config["JOB_RETRY_DELAY"] = 0
+    try:
+        with app.app_context():
+            jobs.enqueue("test_fail", max_attempts=2)
+            assert jobs.run_pending() == (0, 1)
+            assert job_rows(app)[0]["status"] == "queued"
+            assert jobs.run_pending() == (0, 1)
+    finally:
+        app.config.pop("JOB_RETRY_DELAY")
+
+    [row] = job_rows(app)
+    assert row["status"] == "failed"
+    assert row["attempts"] == 2
+    assert row["last_error"] == "RuntimeError: boom"
+
+
+def test_expired_lease_is_requeued(app):
+    with app.app_context():
+        job_id = jobs.enqueue("test_record", {"n": 1})
+        # a worker that claimed it and died
+        db = get_db()
+        assert queries.claim_job(db, job_id, time.time() - 1) is not None
+        db.commit()
+
+        assert jobs.run_pending() == (1, 0)
+    assert calls == [{"n": 1}]
+    assert job_rows(app) == []
+
+
+def test_runner_threads_run_jobs(app):
+    app.config["JOBS_ENABLED"] = True
+    try:
+        with app.app_context():
+            for n in range(5):
+                jobs.enqueue("test_record", {"n": n})
+        deadline = time.time() + 5
+        while len(calls) < 5 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        jobs.stop_runner(app)
+        app.config["JOBS_ENABLED"] = False
+
+    assert sorted(call["n"] for call in calls) == [0, 1, 2, 3, 4]
+    assert job_rows(app) == []
+
+
+def test_inventory_change_prefetches_recipes(logged_in_client, app, monkeypatch):
+    searched = []
+    monkeypatch.setattr(recipes, "fetch_recipes", lambda names: searched.append(names) or [{"id": 1, "title": "x"}])
+    monkeypatch.setattr(recipes, "fetch_details", lambda recipe_ids: [{"id": 1, "servings": 2}])
+
+    logged_in_client.post("/add_ingredient", data={"ingredient": "milk", "quantity": "1"})
+    logged_in_client.post("/add_ingredient", data={"ingredient": "butter", "quantity": "2"})
+
+    # two changes, one job
+    assert len(job_rows(app)) == 1
+    with app.app_context():
+        assert jobs.run_pending(now=time.time() + 60) == (1, 0)
+    assert searched == [["butter", "milk"]]
+
+    # the page is served from what the job cached
+    assert b"<h2>x</h2>" in logged_in_client.get("/get_recipes").data
+    assert searched == [["butter", "milk"]]
@@ -0,0 +1,95 @@
+import io
+import json
+import random
+import pytest
+import local_recipes
+import recipes
+from db import get_db
+
+
+def brute_force(rows, ingredients, limit):
+    have = set(ingredients)
+    scored = []
+    for position, (recipe_id, _, _, _, needed) in enumerate(rows):
+        used = len(have & set(needed))
+        if used:
+            scored.append((-used, len(set(needed)) - used, position, recipe_id))
+    return [(recipe_id, -used) for used, _, _, recipe_id in sorted(scored)[:limit]]
+
+
+def test_index_matches_brute_force():
+    rng = random.Random(7)
+    vocab = [f"ingredient {i}" for i in range(300)]
+    rows = [(i, f"Recipe {i}", None, None, rng.sample(vocab[:rng.choice((20, 300))], rng.randint(1, 12)))
+            for i in range(1, 3001)]
+    index = local_recipes.RecipeIndex(rows)
+
+    for _ in range(20):
+        pantry = rng.sample(vocab, rng.randint(1, 80))
+        found = [(recipe["id"], recipe["usedIngredientCount"]) for recipe in index.match(pantry, 10)]
+        assert found == brute_force(rows, pantry, 10)
+
+
+def test_match_reports_used_and_missed():
+    index = local_recipes.RecipeIndex([
+        (1, "Pancakes", "p.jpg", "https://example.com/p", ["egg", "flour", "milk"]),
+        (2, "Omelette", None, None, ["egg", "butter"]),
+        (3, "Toast", None, None, ["bread"]),
+    ])
+    [best, second] = index.match(["Eggs", "Milk"], limit=5)
+    assert best["id"] == 1 and best["usedIngredientCount"] == 2
+    assert {item["name"] for item in best["missedIngredients"]} == {"flour"}
+    assert best["sourceUrl"] == "https://example.com/p"
+    assert second["id"] == 2
+    assert index.match(["caviar"]) == []
+
+
+def test_import_json_and_csv(app):
+    corpus = json.dumps([
+        {"id": 10, "title": "Pancakes", "ingredients": ["Eggs", "flour", {"name": "milk"}], "url": "https://example.com/p"},
+        {"title": "", "ingredients": ["salt"]},
+        {"title": "Nothing", "ingredients": []},
+    ])
+    csv_corpus = "title,ingredients,image\nOmelette,egg;butter,o.jpg\n"
+    with app.app_context():
+        result = local_recipes.import_stream(io.StringIO(corpus), "json")
+        assert (result.rows, result.imported, result.error_count) == (3, 1, 2)
+        assert local_recipes.import_stream(io.StringIO(csv_corpus), "csv").imported == 1
+
+        found = local_recipes.find_recipes(["egg", "milk"]).recipes
+        assert [recipe["title"] for recipe in found] == ["Pancakes", "Omelette"]
+
+        # a new import shows up without a restart
+        local_recipes.import_stream(io.StringIO('[{"id": 10, "title": "Crepes", "ingredients": "egg;milk"}]'), "json")
+        assert local_recipes.find_recipes(["egg", "milk"]).recipes[0]["title"] == "Crepes"
+
+        local_recipes.import_stream(io.StringIO("[]"), "json", replace=True)
+        assert local_recipes.find_recipes(["egg"]).recipes == []
+
+
+@pytest.mark.parametrize("source, expected", [("auto", b"Pancakes"), ("local", b"Pancakes"), ("spoonacular", b"From Api")])
+def test_recipe_source(client, app, monkeypatch, source, expected):
+    monkeypatch.setattr(recipes, "fetch_recipes", lambda names: [{"id": 1, "title": "From Api"}])
+    monkeypatch.setattr(recipes, "fetch_details", lambda recipe_ids: [])
+    app.config["RECIPE_SOURCE"] = source
+    try:
+        with app.app_context():
+            local_recipes.import_stream(io.StringIO('[{"title": "Pancakes", "ingredients": ["milk", "flour"]}]'), "json")
+        client.post("/register", data={"username": "cook", "email": "cook@email.com",
+                                       "password": "Test@123!", "confirm": "Test@123!"})
+        client.post("/login", data={"login_field": "cook", "password": "Test@123!"})
+        client.post("/add_ingredient", data={"ingredient": "milk", "quantity": "1"})
+        assert expected in client.get("/get_recipes").data
+
+        # nothing local for butter: auto falls back to the api, local says so
+        with app.app_context():
+            [milk] = get_db().execute("SELECT id FROM inventory").fetchall()
+        client.post(f"/inventory/delete/{milk['id']}", data={})
+        client.post("/add_ingredient", data={"ingredient": "butter", "quantity": "1"})
+        page = client.get("/get_recipes").data
+        if source == "local":
+            assert b"No recipes found" in page
+        else:
+            assert b"From Api" in page
+    finally:
+        app.config["RECIPE_SOURCE"] = "auto"
@@ -0,0 +1,99 @@
+import sqlite3
+import migrate
+
+
+def schema_objects(db):
+    return {
+        (row[0], row[1]) for row in db.execute(
+            "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' AND name NOT LIKE 'schema_%'"
+        )
+    }
+
+
+def test_migrations_match_schema_sql(tmp_path):
+    migrated = sqlite3.connect(tmp_path / "migrated.db")
+    migrate.upgrade(migrated)
+
+    reference = sqlite3.connect(tmp_path / "reference.db")
+    with open("schema.sql", "r") as schema:
+        reference.executescript(schema.read())
+
+    assert schema_objects(migrated) == schema_objects(reference)
+    for table in ("user", "category", "macronutrient", "ingredient", "inventory", "ingredient_macronutrient"):
+        assert list(migrated.execute(f"PRAGMA table_info({table})")) == list(reference.execute(f"PRAGMA table_info({table})"))
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    db = sqlite3.connect(tmp_path / "inventory.db")
+    applied = migrate.upgrade(db)
+    assert [m.version for m in applied] == [m.version for m in migrate.discover()]
+    assert migrate.upgrade(db) == []
+    assert migrate.current_version(db) == applied[-1].version
+
+
+def test_existing_database_with_duplicates_is_upgraded(tmp_path):
+    # a database created from the old schema.sql, before indexes and schema_version
+    db = sqlite3.connect(tmp_path / "inventory.db")
+    with open("migrations/0001_initial.sql", "r") as f:
+        db.executescript(f.read())
+    migrate.seed(db)
+    db.execute("INSERT INTO user (username, email, hashed_password) VALUES ('a', 'a@a.com', 'x')")
+    for quantity in ("1", "2", "3"):
+        db.execute("INSERT INTO inventory (user_id, ingredient_id, category_id, quantity) VALUES (1, 1, 1, ?)", (quantity,))
+    db.commit()
+
+    migrate.upgrade(db)
+
+    assert db.execute("SELECT quantity FROM inventory").fetchall() == [("3",)]
+    assert migrate.current_version(db) == migrate.discover()[-1].version
+
+
+def test_duplicate_written_during_the_dedupe_still_gets_the_unique_index(tmp_path, monkeypatch):
+    db = sqlite3.connect(tmp_path / "inventory.db")
+    with open("migrations/0001_initial.sql", "r") as f:
+        db.executescript(f.read())
+    migrate.seed(db)
+    db.execute("INSERT INTO user (username, email, hashed_password) VALUES ('a', 'a@a.com', 'x')")
+    db.execute("INSERT INTO inventory (user_id, ingredient_id, category_id, quantity) VALUES (1, 1, 1, '1')")
+    db.commit()
+
+    # the app adds the same ingredient again once the batches are through
+    backfill = migrate.backfill
+
+    def backfill_then_duplicate(db, name, *args, **kwargs):
+        batches = backfill(db, name, *args, **kwargs)
+        if name != "0002_dedupe_inventory":
+            return batches
+        db.execute("INSERT INTO inventory (user_id, ingredient_id, category_id, quantity) VALUES (1, 1, 1, '2')")
+        db.commit()
+        return batches
+    monkeypatch.setattr(migrate, "backfill", backfill_then_duplicate)
+
+    migrate.upgrade(db)
+
+    assert db.execute("SELECT quantity FROM inventory").fetchall() == [("2",)]
+    assert db.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_inventory_user_ingredient'").fetchone()
+
+
+def test_backfill_resumes(tmp_path):
+    db = sqlite3.connect(tmp_path / "big.db")
+    db.execute("CREATE TABLE t (x INTEGER, y INTEGER)")
+    db.executemany("INSERT INTO t (x) VALUES (?)", [(i,) for i in range(25)])
+    db.commit()
+
+    sql = "UPDATE t SET y = x * 2 WHERE rowid > :lo AND rowid <= :hi"
+    # pretend a previous run got through the first 10 rows and died
+    migrate.ensure_version_table(db)
+    db.execute("INSERT INTO schema_backfill (name, last_rowid) VALUES ('fill_y', 10)")
+    db.commit()
+
+    assert migrate.backfill(db, "fill_y", "t", sql, batch_size=10) == 2
+    assert db.execute("SELECT COUNT(*) FROM t WHERE y IS NULL").fetchone()[0] == 10
+    # finished backfills are not run again
+    assert migrate.backfill(db, "fill_y", "t", sql, batch_size=10) == 0
+
+
+def test_cli_status(app):
+    result = app.test_cli_runner().invoke(args=["db", "status"])
+    assert result.exit_code == 0
+    assert "applied" in result.output and "pending" not in result.output
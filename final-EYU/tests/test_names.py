@@ -0,0 +1,81 @@
+import io
+import pytest
+import names
+import queries
+from db import get_db
+from writer import write
+
+
+@pytest.mark.parametrize("name, canonical", [
+    ("Olive-Oil", "olive oil"),
+    ("  olive   oils ", "olive oil"),
+    ("Apples", "apple"),
+    ("crushed tomatoes", "crushed tomato"),
+    ("blueberries", "blueberry"),
+    ("peaches", "peach"),
+    ("Beecher's mac_and_cheese", "beecher mac and cheese"),
+    ("hummus", "hummus"),
+    ("egg", "egg"),
+])
+def test_canonical_name(name, canonical):
+    assert names.canonical_name(name) == canonical
+
+
+def test_name_index_finds_typos():
+    index = names.NameIndex([(1, "olive oil", "olive oil"), (2, "chicken thigh", "chicken thigh"), (3, "apples", "apple")])
+    assert index.closest("olive oyl") == [("olive oil", pytest.approx(0.7))]
+    assert index.closest("chiken thighs")[0][0] == "chicken thigh"
+    assert index.closest("xylophone") == []
+
+
+def test_near_duplicates_resolve_to_the_catalog_row(app):
+    with app.app_context():
+        db = get_db()
+        user_id = write(queries.create_user, "names", "names@email.com", "x")
+
+        assert queries.ingredient_by_name(db, "Apple").ingredient_name == "apples"
+        assert write(queries.add_inventory_by_name, user_id, "apple", "3")
+        assert [row.ingredient for row in queries.user_inventory_page(db, user_id).rows] == ["apples"]
+
+        # no near copy goes into the catalog
+        assert write(queries.create_ingredient, "Olive-Oil", "Pantry") is None
+        assert queries.ingredient_name_taken(db, "olive oils")
+
+        ingredient_id = write(queries.create_ingredient, "green beans", "Produce")
+        assert db.execute("SELECT normalized_name FROM ingredient WHERE id = ?", (ingredient_id,)).fetchone()[0] == "green bean"
+        # renaming to a spelling of its own canonical name is fine
+        assert not queries.ingredient_name_taken(db, "green bean", ingredient_id)
+
+
+def test_similar_ingredient_follows_catalog_changes(app):
+    with app.app_context():
+        db = get_db()
+        assert queries.similar_ingredient(db, "olive oyl") == "olive oil"
+        assert queries.similar_ingredient(db, "pomegranite") is None
+
+        write(queries.create_ingredient, "pomegranate", "Produce")
+        assert queries.similar_ingredient(db, "pomegranite") == "pomegranate"
+
+
+def test_add_ingredient_suggests_instead_of_redirecting(logged_in_client):
+    response = logged_in_client.post("/add_ingredient", data={"ingredient": "olive oyl", "quantity": "1"})
+    assert response.status_code == 200
+    assert b"Did you mean 'olive oil'?" in response.data
+
+    # plural / punctuation differences go straight in
+    response = logged_in_client.post("/add_ingredient", data={"ingredient": "Olive-Oils", "quantity": "1"})
+    assert response.status_code == 302
+    response = logged_in_client.post("/add_ingredient", data={"ingredient": "olive oil", "quantity": "1"})
+    assert b"&#39;olive oil&#39; is already in your inventory" in response.data
+
+
+def test_import_merges_near_duplicates(logged_in_client, app):
+    data = b"ingredient,category,quantity\nApple,Produce,2\nolive-oil,Pantry,1\n"
+    logged_in_client.post("/import", data={"target": "inventory", "file": (io.BytesIO(data), "items.csv")},
+                          content_type="multipart/form-data")
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute("SELECT COUNT(*) FROM ingredient WHERE normalized_name IN ('apple', 'olive oil')").fetchone()[0] == 2
+        user_id = queries.user_by_login(db, "cook")["id"]
+        assert sorted(row.ingredient for row in queries.user_inventory_page(db, user_id).rows) == ["apples", "olive oil"]
@@ -0,0 +1,93 @@
+import pytest
+import pagination
+import queries
+from db import get_db
+from writer import write
+
+
+def catalog_names(db, count):
+    return [row.ingredient for row in queries.catalog_page(db, {"per_page": count}).rows]
+
+
+@pytest.fixture()
+def user_id(app):
+    with app.app_context():
+        user_id = write(queries.create_user, "pager", "pager@email.com", "x")
+        for name in catalog_names(get_db(), 12):
+            write(queries.add_inventory_by_name, user_id, name, "1")
+        return user_id
+
+
+def walk(fetch, per_page):
+    pages = [fetch({"per_page": per_page})]
+    while pages[-1].next_cursor:
+        pages.append(fetch({"per_page": per_page, "after": pages[-1].next_cursor}))
+    return pages
+
+
+def test_inventory_pages_cover_everything_once(app, user_id):
+    with app.app_context():
+        db = get_db()
+        pages = walk(lambda args: queries.user_inventory_page(db, user_id, args), 5)
+
+        assert [len(page.rows) for page in pages] == [5, 5, 2]
+        assert [row.id for page in pages for row in page.rows] == [row.id for row in queries.user_inventory_page(db, user_id, {"per_page": 12}).rows]
+        assert pages[0].prev_cursor is None and pages[-1].next_cursor is None
+
+        # prev from the last page is the middle page again
+        back = queries.user_inventory_page(db, user_id, {"per_page": 5, "before": pages[2].prev_cursor})
+        assert back.rows == pages[1].rows
+
+
+def test_inventory_cursor_is_stable_across_inserts(app, user_id):
+    with app.app_context():
+        db = get_db()
+        first = queries.user_inventory_page(db, user_id, {"per_page": 5})
+        second = queries.user_inventory_page(db, user_id, {"per_page": 5, "after": first.next_cursor})
+
+        # a new row goes to the top, the next page doesn't shift
+        write(queries.add_inventory_by_name, user_id, catalog_names(db, 13)[-1], "1")
+        again = queries.user_inventory_page(db, user_id, {"per_page": 5, "after": first.next_cursor})
+        assert again.rows == second.rows
+
+        # prev still lands on the old first page, with the new row one more page back
+        back = queries.user_inventory_page(db, user_id, {"per_page": 5, "before": second.prev_cursor})
+        assert back.rows == first.rows and back.prev_cursor
+
+        # prev from less than a page in runs into the start and shows a full first page
+        third_row = pagination.encode_cursor((first.rows[2].last_updated, first.rows[2].id))
+        newest = queries.user_inventory_page(db, user_id, {"per_page": 5, "before": third_row})
+        assert len(newest.rows) == 5 and newest.prev_cursor is None
+
+
+def test_catalog_pages_in_category_order(app):
+    with app.app_context():
+        db = get_db()
+        pages = walk(lambda args: queries.catalog_page(db, args), 7)
+        assert [row for page in pages for row in page.rows] == queries.catalog_page(db, {"per_page": pagination.MAX_PAGE_SIZE}).rows
+
+
+def test_bad_cursor(app):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            pagination.decode_cursor("not a cursor", 2)
+        with pytest.raises(ValueError):
+            pagination.decode_cursor(pagination.encode_cursor(("a", 1)), 3)
+        with pytest.raises(ValueError):
+            pagination.decode_cursor(pagination.encode_cursor(([1], {"a": 2})), 2)
+        assert pagination.decode_cursor(pagination.encode_cursor((None, 1.5)), 2) == [None, 1.5]
+
+
+def test_home_page_is_paginated(logged_in_client):
+    for name in ("milk", "tofu", "butter"):
+        logged_in_client.post("/add_ingredient", data={"ingredient": name, "quantity": "1"})
+
+    response = logged_in_client.get("/?per_page=2")
+    assert response.data.count(b"<tr>") == 3  # header + 2 rows
+    assert b"after=" in response.data
+
+    assert logged_in_client.get("/?after=garbage").status_code == 400
+    nested = pagination.encode_cursor(([1], {"a": 2}))
+    assert logged_in_client.get(f"/?after={nested}").status_code == 400
+    assert logged_in_client.get(f"/ingredient?after={nested}").status_code == 400
+    assert logged_in_client.get("/ingredient?per_page=3").status_code == 200
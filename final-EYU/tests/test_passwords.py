@@ -0,0 +1,59 @@
+import passwords
+from db import get_db
+
+
+def stored_hash(app):
+    with app.app_context():
+        return get_db().execute("SELECT hashed_password FROM user WHERE username = 'cook'").fetchone()[0]
+
+
+def test_hash_and_check(app):
+    with app.app_context():
+        hashed = passwords.hash_password("Test@123!")
+        assert passwords.rounds_of(hashed) == 4
+        assert passwords.check_password("Test@123!", hashed)
+        assert not passwords.check_password("wrong", hashed)
+        assert not passwords.check_password("Test@123!", "not a hash")
+
+
+def test_calibrate_stays_in_bounds():
+    assert passwords.MIN_ROUNDS <= passwords.calibrate(1) == passwords.MIN_ROUNDS
+    # never below the cost hashes had before calibration existed
+    assert passwords.MIN_ROUNDS == 12
+    assert passwords.calibrate(10 ** 9) == passwords.MAX_ROUNDS
+
+
+def test_pool_runs_in_other_processes(app, monkeypatch):
+    monkeypatch.setitem(app.config, "PASSWORD_POOL_ENABLED", True)
+    monkeypatch.setitem(app.config, "PASSWORD_WORKERS", 2)
+    with app.app_context():
+        hashed = passwords.hash_password("Test@123!")
+        assert passwords.check_password("Test@123!", hashed)
+        stats = passwords.get_pool().stats()
+    assert (stats["hashes"], stats["checks"], stats["workers"]) == (1, 1, 2)
+
+
+def test_login_rehashes_an_outdated_hash(logged_in_client, app, monkeypatch):
+    assert passwords.rounds_of(stored_hash(app)) == 4
+
+    monkeypatch.setitem(app.config, "BCRYPT_LOG_ROUNDS", 5)
+    logged_in_client.get("/logout")
+    response = logged_in_client.post("/login", data={"login_field": "cook", "password": "Test@123!"})
+    assert response.status_code == 302
+    assert passwords.rounds_of(stored_hash(app)) == 5
+
+    # and the new hash works
+    logged_in_client.get("/logout")
+    assert logged_in_client.post("/login", data={"login_field": "cook", "password": "Test@123!"}).status_code == 302
+
+
+def test_busy_pool_sheds_logins(logged_in_client, app, monkeypatch):
+    logged_in_client.get("/logout")
+
+    def busy(password, hashed):
+        raise passwords.PasswordBusy()
+
+    monkeypatch.setattr(passwords, "check_password", busy)
+    response = logged_in_client.post("/login", data={"login_field": "cook", "password": "Test@123!"})
+    assert response.status_code == 503
+    assert b"try again in a moment" in response.data
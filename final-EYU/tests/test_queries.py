@@ -0,0 +1,69 @@
+import sqlite3
+import pytest
+import queries
+import refdata
+from db import get_db
+from writer import write
+
+
+@pytest.fixture()
+def user_id(app):
+    with app.app_context():
+        return write(queries.create_user, "writer", "writer@email.com", "x")
+
+
+def test_create_user_conflict_returns_none(app, user_id):
+    with app.app_context():
+        assert write(queries.create_user, "writer", "other@email.com", "x") is None
+        assert write(queries.create_user, "other", "writer@email.com", "x") is None
+
+
+def test_add_inventory_by_name(app, user_id):
+    with app.app_context():
+        assert write(queries.add_inventory_by_name, user_id, "milk", "1")
+        # already in inventory / not in catalog
+        assert write(queries.add_inventory_by_name, user_id, "milk", "2") is None
+        assert write(queries.add_inventory_by_name, user_id, "dragonfruit", "1") is None
+        assert [row.quantity for row in queries.user_inventory_page(get_db(), user_id).rows] == ["1"]
+
+
+def test_create_ingredient_with_macros(app):
+    with app.app_context():
+        db = get_db()
+        macros = dict((name, macro_id) for macro_id, name in refdata.macro_choices(db))
+        ingredient_id = write(queries.create_ingredient, "kale", "Produce", [macros["Fiber"], macros["Water"]])
+        assert ingredient_id
+        assert sorted(queries.ingredient_macro_ids(db, ingredient_id)) == sorted([macros["Fiber"], macros["Water"]])
+
+        # duplicate name / unknown category insert nothing
+        assert write(queries.create_ingredient, "kale", "Produce") is None
+        assert write(queries.create_ingredient, "kiwi", "Nope") is None
+
+
+def test_update_inventory_replaces_macros_in_one_transaction(app, user_id):
+    with app.app_context():
+        db = get_db()
+        macros = dict((name, macro_id) for macro_id, name in refdata.macro_choices(db))
+        inventory_id = write(queries.add_inventory_by_name, user_id, "milk", "1")
+
+        assert write(queries.update_inventory, inventory_id, user_id, "whole milk", "Dairy", "3", [macros["Fat"]])
+        row = queries.inventory_row(db, inventory_id, user_id)
+        assert (row.ingredient, row.quantity, row.macros) == ("whole milk", "3", "Fat")
+
+        # name clash rolls back the whole update, quantity included
+        with pytest.raises(sqlite3.IntegrityError):
+            write(queries.update_inventory, inventory_id, user_id, "yogurt", "Dairy", "9", [])
+        row = queries.inventory_row(db, inventory_id, user_id)
+        assert (row.ingredient, row.quantity, row.macros) == ("whole milk", "3", "Fat")
+
+        # not this user's row
+        assert write(queries.update_inventory, inventory_id, user_id + 1, "milk", "Dairy", "1", []) is False
+
+
+def test_deleting_ingredient_cascades(app, user_id):
+    with app.app_context():
+        inventory_id = write(queries.add_inventory_by_name, user_id, "milk", "1")
+        ingredient_id = queries.ingredient_by_name(get_db(), "milk").id
+        write(queries.delete_ingredient, ingredient_id)
+        assert queries.inventory_item(get_db(), inventory_id, user_id) is None
+        assert queries.ingredient_macro_ids(get_db(), ingredient_id) == []
@@ -0,0 +1,86 @@
+import threading
+import pytest
+import query_planner
+from queries import PantryItem
+
+
+def test_rank_puts_perishables_and_recent_items_first():
+    items = [
+        PantryItem("rice", "Pantry", "2025-01-03 10:00:00"),
+        PantryItem("milk", "Dairy", "2025-01-01 10:00:00"),
+        PantryItem("spinach", "Produce", "2025-01-02 10:00:00"),
+        PantryItem("corn", "Canned Goods", "2025-01-04 10:00:00"),
+        PantryItem("tofu", "Plant Protein", "2025-01-01 09:00:00"),
+    ]
+    assert query_planner.rank(items) == ["spinach", "milk", "tofu", "corn", "rice"]
+
+
+def test_chunk_bounds_size_length_and_count():
+    names = [f"ingredient {i}" for i in range(100)]
+    chunks = query_planner.chunk(names, size=10, max_chunks=3)
+    assert chunks == [names[0:10], names[10:20], names[20:30]]
+
+    long_names = ["x" * 40] * 10
+    assert all(len(",".join(group)) <= 100 for group in query_planner.chunk(long_names, max_chars=100))
+    assert query_planner.chunk(["milk"]) == [["milk"]]
+
+
+def test_merge_dedupes_and_recounts_against_the_whole_pantry():
+    first = [{"id": 1, "title": "Pancakes", "usedIngredients": [{"name": "milk"}],
+              "missedIngredients": [{"name": "eggs"}, {"name": "flour"}], "usedIngredientCount": 1, "missedIngredientCount": 2}]
+    second = [{"id": 2, "title": "Toast", "usedIngredients": [{"name": "bread"}],
+               "missedIngredients": [], "usedIngredientCount": 1, "missedIngredientCount": 0},
+              dict(first[0], usedIngredients=[{"name": "egg"}], missedIngredients=[{"name": "milk"}, {"name": "flour"}])]
+
+    merged = query_planner.merge([first, second], ["milk", "egg", "bread"], limit=5)
+    assert [recipe["id"] for recipe in merged] == [1, 2]
+    assert merged[0]["usedIngredientCount"] == 2 and merged[0]["missedIngredients"] == [{"name": "flour"}]
+
+
+def test_merge_ranks_recipes_with_null_likes():
+    recipes = [{"id": i, "usedIngredients": [{"name": "milk"}], "missedIngredients": [], "likes": likes}
+               for i, likes in ((1, None), (2, 7), (3, 0))]
+    merged = query_planner.merge([recipes], ["milk"], limit=5)
+    assert [recipe["id"] for recipe in merged] == [2, 1, 3]
+
+
+def test_big_pantry_is_searched_in_concurrent_chunks(app, monkeypatch):
+    calls = []
+    barrier = threading.Barrier(3, timeout=5)
+
+    def fetch(names):
+        calls.append(names)
+        # all three chunks are in flight at once, or this times out
+        barrier.wait()
+        return [{"id": len(names) * 100 + i, "title": names[0], "usedIngredients": [{"name": names[0]}],
+                 "missedIngredients": [], "likes": i} for i in range(3)]
+
+    pantry = [f"item{i:02d}" for i in range(30)]
+    monkeypatch.setitem(app.config, "RECIPE_QUERY_CHUNK_SIZE", 10)
+    monkeypatch.setitem(app.config, "RECIPE_QUERY_MAX_CHUNKS", 3)
+    with app.app_context():
+        result = query_planner.find_recipes(pantry, fetch, limit=5)
+
+    assert len(calls) == 3
+    assert sorted(name for call in calls for name in call) == pantry
+    # every chunk answered with the same ids, they're merged into one list
+    assert len(result.recipes) == 3
+    assert result.source == "upstream"
+
+
+def test_failed_chunks_are_skipped_unless_all_fail(app, monkeypatch):
+    def fetch(names):
+        if "item00" in names:
+            raise ConnectionError("upstream down")
+        return [{"id": 1, "title": "ok"}]
+
+    pantry = [f"item{i:02d}" for i in range(20)]
+    monkeypatch.setitem(app.config, "RECIPE_QUERY_CHUNK_SIZE", 10)
+    with app.app_context():
+        assert [recipe["id"] for recipe in query_planner.find_recipes(pantry, fetch, limit=5).recipes] == [1]
+
+    def down(names):
+        raise ConnectionError("upstream down")
+
+    with app.app_context(), pytest.raises(ConnectionError):
+        query_planner.find_recipes([f"other{i:02d}" for i in range(20)], down, limit=5)
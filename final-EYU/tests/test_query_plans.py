@@ -0,0 +1,47 @@
+import re
+import pytest
+import queries
+from flaskapp import get_db
+
+# every named query in queries.py. new queries get picked up automatically
+QUERIES = {
+    name: sql for name, sql in vars(queries).items()
+    if name.isupper() and isinstance(sql, str)
+    and re.match(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", sql, re.IGNORECASE)
+}
+
+# a bare "SCAN table" is a full table scan. "SCAN table USING (COVERING) INDEX" is
+# an ordered walk of an index, which is fine for pages that list everything
+FULL_SCAN = re.compile(r"^SCAN \w+$")
+
+
+def query_plan(db, sql):
+    names = re.findall(r":(\w+)", sql)
+    params = dict.fromkeys(names) if names else (None,) * sql.count("?")
+    return [row["detail"] for row in db.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def test_queries_found():
+    assert "USER_INVENTORY_PAGE" in QUERIES
+    assert "CATALOG_PAGE" in QUERIES
+
+
+@pytest.mark.parametrize("name", sorted(QUERIES))
+def test_query_plan_uses_indexes(app, name):
+    with app.app_context():
+        plan = query_plan(get_db(), QUERIES[name])
+
+    assert not [step for step in plan if FULL_SCAN.match(step)], plan
+    assert not [step for step in plan if "USE TEMP B-TREE" in step], plan
+
+
+def test_home_page_reads_inventory_in_index_order(app):
+    with app.app_context():
+        plan = query_plan(get_db(), queries.USER_INVENTORY_PAGE)
+    assert any("idx_inventory_user_updated" in step for step in plan), plan
+
+
+def test_catalog_page_uses_covering_index(app):
+    with app.app_context():
+        plan = query_plan(get_db(), queries.CATALOG_PAGE)
+    assert any("COVERING INDEX idx_ingredient_category_name" in step for step in plan), plan
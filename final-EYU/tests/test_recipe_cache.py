@@ -0,0 +1,119 @@
+import threading
+import time
+import pytest
+import recipe_cache
+from db import get_db
+
+
+class FakeApi:
+
+    def __init__(self, delay=0, fail=False):
+        self.calls = []
+        self.delay = delay
+        self.fail = fail
+        self.called = threading.Event()
+
+    def __call__(self, ingredients):
+        # like the real client, every request is charged first
+        recipe_cache.take_quota()
+        self.calls.append(ingredients)
+        self.called.set()
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("upstream down")
+        return [{"id": len(self.calls), "title": " and ".join(ingredients)}]
+
+
+def test_key_ignores_order_case_and_plurals():
+    assert recipe_cache.cache_key(["Apples", "milk"]) == recipe_cache.cache_key(["milk", "apple", "apple"])
+    assert recipe_cache.cache_key(["milk"])[1] == ("milk",)
+
+
+def test_second_search_is_served_from_the_cache(app):
+    api = FakeApi()
+    with app.app_context():
+        first = recipe_cache.find_recipes(["milk", "eggs"], api)
+        assert first.source == "upstream"
+        assert api.calls == [["egg", "milk"]]
+
+    with app.app_context():
+        second = recipe_cache.find_recipes(["eggs", "milk"], api)
+    assert second.source == "fresh"
+    assert second.recipes == first.recipes
+    assert len(api.calls) == 1
+
+
+def test_stale_entries_are_served_while_refreshing(app):
+    api = FakeApi()
+    with app.app_context():
+        recipe_cache.find_recipes(["milk"], api, now=time.time() - recipe_cache.DEFAULT_TTL - 60)
+        api.called.clear()
+
+        result = recipe_cache.find_recipes(["milk"], api)
+        assert result.stale
+        assert api.called.wait(5)
+
+    # the background refresh lands in the table
+    for _ in range(50):
+        with app.app_context():
+            if recipe_cache.find_recipes(["milk"], api).source == "fresh":
+                break
+        time.sleep(0.05)
+    else:
+        pytest.fail("cache entry was never refreshed")
+    assert len(api.calls) == 2
+
+
+def test_expired_entry_beats_an_upstream_failure(app):
+    with app.app_context():
+        old = time.time() - recipe_cache.DEFAULT_TTL - recipe_cache.DEFAULT_STALE - 60
+        recipe_cache.find_recipes(["tofu"], FakeApi(), now=old)
+
+        result = recipe_cache.find_recipes(["tofu"], FakeApi(fail=True))
+        assert result.stale and result.recipes[0]["title"] == "tofu"
+
+        with pytest.raises(ConnectionError):
+            recipe_cache.find_recipes(["salmon"], FakeApi(fail=True))
+
+
+def test_daily_quota(app, monkeypatch):
+    monkeypatch.setitem(app.config, "RECIPE_API_DAILY_QUOTA", 2)
+    api = FakeApi()
+    with app.app_context():
+        recipe_cache.find_recipes(["milk"], api)
+        recipe_cache.find_recipes(["tofu"], api)
+        with pytest.raises(recipe_cache.QuotaExceeded):
+            recipe_cache.find_recipes(["salmon"], api)
+        # cached searches still work
+        assert recipe_cache.find_recipes(["milk"], api).source == "fresh"
+        assert get_db().execute("SELECT calls FROM api_quota").fetchall()[0][0] == 2
+    assert len(api.calls) == 2
+
+
+def test_concurrent_identical_searches_share_one_call(app):
+    api = FakeApi(delay=0.2)
+    results = []
+
+    def search():
+        with app.app_context():
+            results.append(recipe_cache.find_recipes(["butter", "corn"], api))
+
+    threads = [threading.Thread(target=search) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(api.calls) == 1
+    assert len(results) == 5 and all(result.recipes == results[0].recipes for result in results)
+
+
+def test_recipes_page(logged_in_client, monkeypatch):
+    import recipes
+    monkeypatch.setattr(recipes, "fetch_recipes", FakeApi())
+    monkeypatch.setattr(recipes, "fetch_details", lambda recipe_ids: [])
+
+    assert b"Your inventory is empty" in logged_in_client.get("/get_recipes").data
+
+    logged_in_client.post("/add_ingredient", data={"ingredient": "milk", "quantity": "1"})
+    assert b"<h2>milk</h2>" in logged_in_client.get("/get_recipes").data
@@ -0,0 +1,92 @@
+import threading
+import time
+import recipe_details
+import recipes
+from db import get_db
+
+
+class FakeBulk:
+
+    def __init__(self, delay=0, fail=False):
+        self.calls = []
+        self.delay = delay
+        self.fail = fail
+        self.done = threading.Event()
+
+    def __call__(self, recipe_ids):
+        self.calls.append(recipe_ids)
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("upstream down")
+        self.done.set()
+        return [{"id": recipe_id, "readyInMinutes": 20, "servings": 4, "instructions": "long text",
+                 "spoonacularSourceUrl": f"https://spoonacular.com/r-{recipe_id}"} for recipe_id in recipe_ids]
+
+
+def results(*recipe_ids):
+    return [{"id": recipe_id, "title": f"Recipe {recipe_id}"} for recipe_id in recipe_ids]
+
+
+def test_one_bulk_call_then_cached(app):
+    api = FakeBulk()
+    with app.app_context():
+        details = recipe_details.enrich(results(1, 2, 3), api)
+        assert api.calls == [[1, 2, 3]]
+        # only what the page uses is kept
+        assert details[2] == {"readyInMinutes": 20, "servings": 4, "spoonacularSourceUrl": "https://spoonacular.com/r-2"}
+
+    with app.app_context():
+        again = recipe_details.enrich(results(2, 3, 4), api)
+    assert api.calls == [[1, 2, 3], [4]]
+    assert set(again) == {2, 3, 4}
+
+
+def test_large_result_is_split_into_bulk_calls(app):
+    api = FakeBulk()
+    ids = list(range(1, recipe_details.BULK_SIZE + 6))
+    with app.app_context():
+        details = recipe_details.enrich(results(*ids), api)
+    assert sorted(len(call) for call in api.calls) == [5, recipe_details.BULK_SIZE]
+    assert set(details) == set(ids)
+
+
+def test_deadline_renders_partial_results_and_finishes_in_background(app):
+    api = FakeBulk(delay=0.5)
+    with app.app_context():
+        started = time.perf_counter()
+        assert recipe_details.enrich(results(7), api, timeout=0.05) == {}
+        assert time.perf_counter() - started < 0.4
+
+    # the late call still lands in the cache for the next view
+    assert api.done.wait(2)
+    deadline = time.time() + 2
+    while time.time() < deadline:
+        with app.app_context():
+            if recipe_details.cached(get_db(), [7]):
+                break
+        time.sleep(0.02)
+    with app.app_context():
+        assert recipe_details.enrich(results(7), api, timeout=0.05)[7]["servings"] == 4
+    assert len(api.calls) == 1
+
+
+def test_upstream_failure_means_no_details(app):
+    with app.app_context():
+        assert recipe_details.enrich(results(1), FakeBulk(fail=True)) == {}
+
+
+def test_recipe_url():
+    recipe = {"id": 42, "title": "Mac & Cheese!"}
+    assert recipe_details.recipe_url(recipe) == "https://spoonacular.com/recipes/mac-cheese-42"
+    assert recipe_details.recipe_url(recipe, {"sourceUrl": "https://example.com/mac"}) == "https://example.com/mac"
+
+
+def test_recipes_page_shows_details(logged_in_client, monkeypatch):
+    monkeypatch.setattr(recipes, "fetch_recipes", lambda names: results(5))
+    monkeypatch.setattr(recipes, "fetch_details", FakeBulk())
+
+    logged_in_client.post("/add_ingredient", data={"ingredient": "milk", "quantity": "1"})
+
+    page = logged_in_client.get("/get_recipes").data
+    assert b"Ready in 20 min" in page
+    assert b'href="https://spoonacular.com/r-5"' in page
@@ -0,0 +1,41 @@
+import sqlite3
+import refdata
+from db import get_read_db
+
+
+def traced(db):
+    statements = []
+    db.set_trace_callback(statements.append)
+    return statements
+
+
+def test_choices_load_once_per_process(app):
+    with app.app_context():
+        choices = refdata.category_choices(get_read_db())
+        assert choices[0] == ("", "Select a Category")
+        assert ("Dairy", "Dairy") in choices
+        assert refdata.category_id(get_read_db(), "Dairy")
+
+    # a later request only checks the version, it doesn't reload the lists
+    with app.app_context():
+        db = get_read_db()
+        statements = traced(db)
+        assert refdata.macro_choices(db, as_str=True)[0][0].isdigit()
+        refdata.category_choices(db)
+        db.set_trace_callback(None)
+    assert len(statements) == 1 and "table_version" in statements[0]
+
+
+def test_changes_from_another_connection_are_picked_up(app):
+    with app.app_context():
+        assert ("Spices", "Spices") not in refdata.category_choices(get_read_db())
+
+    # e.g. another worker, or the sqlite3 shell
+    other = sqlite3.connect(app.config["DATABASE"])
+    other.execute("INSERT INTO category (category_name) VALUES ('Spices')")
+    other.commit()
+    other.close()
+
+    with app.app_context():
+        assert ("Spices", "Spices") in refdata.category_choices(get_read_db())
+        assert refdata.category_id(get_read_db(), "Spices")
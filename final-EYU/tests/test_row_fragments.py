@@ -0,0 +1,58 @@
+import queries
+
+FRAGMENT = {"X-Fragment": "row"}
+
+
+def add_apples(client):
+    client.post("/add_ingredient", data={"ingredient": "apples", "quantity": "2"})
+    page = client.get("/").data
+    return int(page.split(b"/inventory/update/")[1].split(b'"')[0])
+
+
+def test_edit_form_is_one_row(logged_in_client, monkeypatch):
+    inventory_id = add_apples(logged_in_client)
+
+    def no_query(*args):
+        raise AssertionError("the inventory page query ran")
+    monkeypatch.setattr(queries, "user_inventory_page", no_query)
+
+    response = logged_in_client.get(f"/inventory/update/{inventory_id}", headers=FRAGMENT)
+    assert response.status_code == 200
+    assert response.data.lstrip().startswith(b"<tr>")
+    assert response.data.count(b"<tr") == 1
+    assert b'name="new_name"' in response.data
+    assert b"<html" not in response.data
+    assert logged_in_client.get("/inventory/update/999999", headers=FRAGMENT).status_code == 404
+
+
+def test_save_returns_the_updated_row(logged_in_client):
+    inventory_id = add_apples(logged_in_client)
+    form = {"new_name": "apples", "new_category": "Produce", "quantity": "7", "macros": []}
+
+    response = logged_in_client.post(f"/inventory/update/{inventory_id}", data=form, headers=FRAGMENT)
+    assert response.status_code == 200
+    assert response.data.count(b"<tr") == 1
+    assert b"<td>7</td>" in response.data
+    assert b'name="new_name"' not in response.data
+
+    # errors come back as the row with the form still open
+    response = logged_in_client.post(f"/inventory/update/{inventory_id}", data=dict(form, new_name="x"), headers=FRAGMENT)
+    assert response.status_code == 422
+    assert b'name="new_name"' in response.data
+
+
+def test_delete_returns_nothing(logged_in_client):
+    inventory_id = add_apples(logged_in_client)
+    response = logged_in_client.post(f"/inventory/delete/{inventory_id}", headers=FRAGMENT)
+    assert response.status_code == 200
+    assert response.data == b""
+    assert b"Apples" not in logged_in_client.get("/").data
+
+
+def test_without_the_header_the_pages_are_unchanged(logged_in_client):
+    inventory_id = add_apples(logged_in_client)
+    response = logged_in_client.get(f"/inventory/update/{inventory_id}")
+    assert b"<html" in response.data
+    assert b"js/rows.js" in response.data
+    response = logged_in_client.post(f"/inventory/delete/{inventory_id}")
+    assert response.status_code == 302
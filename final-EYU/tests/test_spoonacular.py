@@ -0,0 +1,160 @@
+import threading
+import pytest
+import requests
+from werkzeug.serving import make_server
+import spoonacular
+import spoonacular_stub
+
+
+@pytest.fixture()
+def stub():
+    app = spoonacular_stub.create_app()
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    app.config["URL"] = f"http://127.0.0.1:{server.server_port}"
+    yield app
+    server.shutdown()
+
+
+class QuotaSpent(Exception):
+    pass
+
+
+def client_for(stub, **kwargs):
+    kwargs.setdefault("backoff", 0.01)
+    return spoonacular.SpoonacularClient("key", base_url=stub.config["URL"], **kwargs)
+
+
+def test_find_by_ingredients(stub):
+    client = client_for(stub)
+    recipes = client.find_by_ingredients(["milk", "egg"], number=3)
+    assert len(recipes) == 3
+    assert recipes == client.find_by_ingredients(["egg", "milk"], number=3)
+
+    stats = client.stats()
+    assert stats["calls"] == 2 and stats["retries"] == 0
+    assert stats["latency"]["count"] == 2 and stats["circuit"] == "closed"
+
+
+def test_retries_then_gives_up(stub):
+    stub.config["STUB"]["error_rate"] = 1.0
+    client = client_for(stub, retries=2)
+    with pytest.raises(requests.HTTPError):
+        client.find_by_ingredients(["milk"])
+    assert stub.config["STUB_STATS"]["requests"] == 3
+    assert client.stats()["failures"] == 1
+
+
+def test_every_attempt_is_charged_to_the_quota(stub):
+    charged = []
+
+    def quota():
+        if len(charged) == 2:
+            raise QuotaSpent("spent")
+        charged.append(1)
+
+    stub.config["STUB"]["error_rate"] = 1.0
+    breaker = spoonacular.CircuitBreaker(threshold=1)
+    client = client_for(stub, retries=3, breaker=breaker, quota=quota)
+    # two attempts fit in the quota, the third is stopped before it goes out
+    with pytest.raises(QuotaSpent):
+        client.find_by_ingredients(["milk"])
+    assert stub.config["STUB_STATS"]["requests"] == 2
+    assert client.stats()["attempts"] == 2
+    assert breaker.state == "open"
+
+
+def test_spent_quota_does_not_use_up_the_half_open_trial(stub):
+    now = [0.0]
+    breaker = spoonacular.CircuitBreaker(threshold=1, reset_timeout=5, clock=lambda: now[0])
+    breaker.failure()
+    now[0] = 6
+
+    def spent():
+        raise QuotaSpent("spent")
+
+    with pytest.raises(QuotaSpent):
+        client_for(stub, breaker=breaker).find_by_ingredients(["milk"], quota=spent)
+    assert stub.config["STUB_STATS"]["requests"] == 0
+    # nothing went out, the next caller still gets the trial
+    assert client_for(stub, breaker=breaker).find_by_ingredients(["milk"])
+    assert breaker.state == "closed"
+
+
+def test_read_timeout(stub):
+    stub.config["STUB"].update(hang_rate=1.0, hang=1.0)
+    client = client_for(stub, read_timeout=0.1, retries=0)
+    with pytest.raises(requests.Timeout):
+        client.find_by_ingredients(["milk"])
+
+
+def test_circuit_breaker_fails_fast_and_recovers(stub):
+    now = [0.0]
+    breaker = spoonacular.CircuitBreaker(threshold=2, reset_timeout=10, clock=lambda: now[0])
+    client = client_for(stub, retries=0, breaker=breaker)
+
+    stub.config["STUB"]["error_rate"] = 1.0
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            client.find_by_ingredients(["milk"])
+    assert breaker.state == "open"
+
+    # open: no request goes out
+    with pytest.raises(spoonacular.CircuitOpenError):
+        client.find_by_ingredients(["milk"])
+    assert stub.config["STUB_STATS"]["requests"] == 2
+
+    # after the reset timeout one trial call goes through and closes it again
+    stub.config["STUB"]["error_rate"] = 0.0
+    now[0] = 11
+    assert breaker.state == "half-open"
+    assert client.find_by_ingredients(["milk"])
+    assert breaker.state == "closed"
+    assert client.stats()["short_circuited"] == 1
+
+
+def test_half_open_failure_reopens():
+    now = [0.0]
+    breaker = spoonacular.CircuitBreaker(threshold=1, reset_timeout=5, clock=lambda: now[0])
+    breaker.failure()
+    now[0] = 6
+    breaker.before_call()
+    # only one trial at a time
+    with pytest.raises(spoonacular.CircuitOpenError):
+        breaker.before_call()
+    breaker.failure()
+    assert breaker.state == "open"
+    assert breaker.opened == 2
+
+
+def test_half_open_trial_reports_other_request_errors(stub):
+    now = [0.0]
+    breaker = spoonacular.CircuitBreaker(threshold=1, reset_timeout=5, clock=lambda: now[0])
+    client = client_for(stub, retries=0, breaker=breaker)
+    breaker.failure()
+    now[0] = 6
+
+    def redirect_loop(*args, **kwargs):
+        raise requests.TooManyRedirects("exceeded 30 redirects")
+
+    get = client.session.get
+    client.session.get = redirect_loop
+    with pytest.raises(requests.TooManyRedirects):
+        client.find_by_ingredients(["milk"])
+    assert breaker.state == "open"
+
+    # the failed trial was reported, so the next reset timeout allows another one
+    client.session.get = get
+    now[0] = 12
+    assert client.find_by_ingredients(["milk"])
+    assert breaker.state == "closed"
+
+
+def test_latency_histogram():
+    histogram = spoonacular.LatencyHistogram()
+    for ms in (5, 20, 20, 40, 400):
+        histogram.observe(ms / 1000)
+    assert histogram.quantile(0.5) == 25
+    assert histogram.quantile(0.99) == 500
+    assert histogram.stats()["buckets"]["le_25ms"] == 2
@@ -0,0 +1,44 @@
+import queries
+from db import get_db
+from writer import write
+
+
+def test_prefix_matches_come_first(app):
+    with app.app_context():
+        db = get_db()
+        names = queries.suggest_ingredients(db, "  Chicken ", limit=10)
+        assert names[:3] == ["chicken breast", "chicken stock", "chicken thigh"]
+
+        # substring matches from the trigram index
+        assert "olive oil" in queries.suggest_ingredients(db, "oil")
+        assert "banana bread" in queries.suggest_ingredients(db, "bread")
+        assert queries.suggest_ingredients(db, "") == []
+        assert queries.suggest_ingredients(db, 'a"b') == []
+
+
+def test_search_index_follows_the_catalog(app):
+    with app.app_context():
+        db = get_db()
+        ingredient_id = write(queries.create_ingredient, "smoked paprika", "Pantry")
+        assert queries.suggest_ingredients(db, "paprik") == ["smoked paprika"]
+
+        write(queries.update_ingredient, ingredient_id, "sweet paprika", "Pantry")
+        assert queries.suggest_ingredients(db, "paprik") == ["sweet paprika"]
+
+        write(queries.delete_ingredient, ingredient_id)
+        assert queries.suggest_ingredients(db, "paprik") == []
+
+
+def test_suggest_endpoint(app, logged_in_client):
+    assert app.test_client().get("/api/ingredients/suggest?q=mil").status_code == 401
+
+    response = logged_in_client.get("/api/ingredients/suggest?q=mil&limit=3")
+    assert response.status_code == 200
+    assert response.json == {"q": "mil", "suggestions": ["milk"]}
+    assert "max-age" in response.headers["Cache-Control"]
+
+
+def test_home_page_does_not_ship_the_catalog(logged_in_client):
+    response = logged_in_client.get("/")
+    assert b"<option" not in response.data
+    assert b'data-suggest-url="/api/ingredients/suggest"' in response.data
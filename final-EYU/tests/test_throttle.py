@@ -0,0 +1,66 @@
+import pytest
+import throttle
+
+
+class Clock:
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_sliding_window_weighs_the_previous_window():
+    assert throttle.estimate(2, 10, elapsed=15, window=60) == 2 + 10 * 0.75
+    assert throttle.estimate(2, 10, elapsed=60, window=60) == 2
+
+
+@pytest.mark.parametrize("counter", [throttle.MemoryCounter, throttle.SQLiteCounter])
+def test_limits_per_login_name_and_ip(app, counter):
+    clock = Clock(6000.0)
+    limiter = throttle.LoginThrottle(counter(), window=60, ip_limit=5, login_limit=3, clock=clock)
+    with app.app_context():
+        assert [limiter.check("1.1.1.1", "Cook") for _ in range(3)] == [None, None, None]
+        # same account, differently spelled
+        assert limiter.check("1.1.1.1", " cook ") == 60
+        # another account from the same ip is fine until the ip limit
+        assert limiter.check("1.1.1.1", "other") is None
+        assert limiter.check("1.1.1.1", "third") is not None
+
+        # two windows later everything has aged out
+        clock.now += 120
+        assert limiter.check("1.1.1.1", "cook") is None
+
+    assert limiter.stats()["shed_login"] == 1
+    assert limiter.stats()["shed_ip"] == 1
+    assert limiter.stats()["allowed"] == 5
+
+
+def test_previous_window_still_counts(app):
+    clock = Clock(6000.0)
+    limiter = throttle.LoginThrottle(throttle.MemoryCounter(), window=60, login_limit=4, clock=clock)
+    for _ in range(4):
+        assert limiter.check("ip", "cook") is None
+    # 30 s into the next window half of the 4 still count
+    clock.now += 90
+    assert [limiter.check("ip", "cook") for _ in range(3)] == [None, None, 30]
+
+
+def test_login_route_sheds_before_checking_the_password(client, app, monkeypatch):
+    import passwords
+    monkeypatch.setitem(app.config, "LOGIN_THROTTLE_LOGIN_LIMIT", 2)
+    client.post("/register", data={"username": "cook", "email": "cook@email.com",
+                                   "password": "Test@123!", "confirm": "Test@123!"})
+
+    checks = []
+    check = passwords.check_password
+    monkeypatch.setattr(passwords, "check_password", lambda *args: checks.append(1) or check(*args))
+
+    for _ in range(2):
+        assert client.post("/login", data={"login_field": "cook", "password": "wrong"}).status_code == 200
+    response = client.post("/login", data={"login_field": "cook", "password": "Test@123!"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    assert b"Too many login attempts" in response.data
+    assert len(checks) == 2
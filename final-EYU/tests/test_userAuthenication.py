@@ -10,6 +10,13 @@ def test_register(client):
         assert response.request.path == '/login'
 
 def test_login(client):
+        client.post("/register", data={
+                "csrf_token": "",
+                "username": "testuser",
+                "email": "test@email.com",
+                "password": "Test@123!",
+                "confirm": "Test@123!"
+                })
         response = client.post('/login', data={
                 "csrf_token": "",
                 "login_field": "testuser",
@@ -0,0 +1,77 @@
+import sqlite3
+import pytest
+from db import pool_stats
+from writer import WriteQueue, write
+
+
+def insert_category(db, name):
+    return db.execute("INSERT INTO category (category_name) VALUES (?)", (name,)).lastrowid
+
+
+def category_names(app):
+    db = sqlite3.connect(app.config["DATABASE"])
+    names = {row[0] for row in db.execute("SELECT category_name FROM category")}
+    db.close()
+    return names
+
+
+def test_group_commit_batches_concurrent_writes(app):
+    writer = WriteQueue(app.config["DATABASE"], max_wait=0.05)
+    try:
+        futures = [writer.submit(insert_category, f"category {i}") for i in range(20)]
+        ids = [future.result(timeout=5) for future in futures]
+    finally:
+        writer.close()
+
+    assert len(set(ids)) == 20
+    stats = writer.stats()
+    assert stats["jobs"] == 20
+    assert stats["batches"] < 20
+
+
+def test_failing_job_only_rolls_back_itself(app):
+    writer = WriteQueue(app.config["DATABASE"], max_wait=0.05)
+    try:
+        ok = writer.submit(insert_category, "Snacks")
+        duplicate = writer.submit(insert_category, "Dairy")
+        also_ok = writer.submit(insert_category, "Spices")
+        ok.result(timeout=5)
+        also_ok.result(timeout=5)
+        with pytest.raises(sqlite3.IntegrityError):
+            duplicate.result(timeout=5)
+    finally:
+        writer.close()
+
+    assert {"Snacks", "Spices"} <= category_names(app)
+
+
+@pytest.mark.parametrize("queue_enabled", [False, True])
+def test_write_returns_result_in_both_modes(app, queue_enabled):
+    app.config["WRITE_QUEUE_ENABLED"] = queue_enabled
+    try:
+        with app.app_context():
+            assert write(insert_category, "Snacks")
+            with pytest.raises(sqlite3.IntegrityError):
+                write(insert_category, "Snacks")
+    finally:
+        app.config["WRITE_QUEUE_ENABLED"] = False
+
+    assert "Snacks" in category_names(app)
+
+
+def test_routes_use_write_queue(client):
+    client.application.config["WRITE_QUEUE_ENABLED"] = True
+    try:
+        client.post("/register", data={"username": "queued", "email": "queued@email.com",
+                                       "password": "Test@123!", "confirm": "Test@123!"})
+        client.post("/login", data={"login_field": "queued", "password": "Test@123!"})
+        for name in ("milk", "tofu", "corn"):
+            client.post("/add_ingredient", data={"ingredient": name, "quantity": "1"})
+
+        response = client.get("/")
+        assert b"Milk" in response.data and b"Tofu" in response.data and b"Corn" in response.data
+        with client.application.app_context():
+            # register + three adds, and the recipe prefetch each add (re)schedules
+            assert pool_stats()["writer"]["jobs"] == 7
+    finally:
+        client.application.config["WRITE_QUEUE_ENABLED"] = False
@@ -0,0 +1,138 @@
+import math
+import threading
+import time
+
+from flask import current_app
+
+import queries
+from writer import write
+
+# login throttling, so one client hammering /login can't burn a core on bcrypt.
+#
+# every login POST is counted against two keys, the client ip and the login
+# name it tries, in a sliding window: hits in the current window plus the
+# previous window's hits weighted by how much of it still overlaps. an attempt
+# over either limit is turned away with 429 before the user lookup or any
+# password check runs. rejected attempts count too, so a client that keeps
+# hammering stays locked out instead of getting a fresh try every window.
+#
+# counts are kept in memory per process by default. LOGIN_THROTTLE_BACKEND=sqlite
+# keeps them in the login_throttle table instead, so the limits hold across
+# every worker process sharing the database.
+
+DEFAULT_WINDOW = 60         # seconds
+DEFAULT_IP_LIMIT = 30       # attempts per window from one ip
+DEFAULT_LOGIN_LIMIT = 10    # attempts per window at one username / email
+
+# in memory: past this many keys, drop the ones that have gone quiet
+MAX_KEYS = 100_000
+
+_limiter_lock = threading.Lock()
+
+
+# sliding window estimate: all of this window, the part of the last one still inside it
+def estimate(current, previous, elapsed, window):
+    return current + previous * (1 - elapsed / window)
+
+
+class MemoryCounter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> [window number, hits in it, hits in the window before]
+        self._counts = {}
+        self._pruned = None
+
+    def hit(self, key, window):
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is None or entry[0] < window - 1:
+                entry = self._counts[key] = [window, 0, 0]
+            elif entry[0] == window - 1:
+                entry[:] = [window, 0, entry[1]]
+            entry[1] += 1
+            if len(self._counts) > MAX_KEYS and self._pruned != window:
+                self._prune(window)
+            return entry[1], entry[2]
+
+    # at most once per window: drop quiet keys, then the oldest ones if a flood of
+    # made up login names still has us over MAX_KEYS
+    def _prune(self, window):
+        self._pruned = window
+        for key in [key for key, entry in self._counts.items() if entry[0] < window - 1]:
+            del self._counts[key]
+        for key in list(self._counts)[:max(0, len(self._counts) - MAX_KEYS // 2)]:
+            del self._counts[key]
+
+
+class SQLiteCounter:
+
+    def __init__(self):
+        self._pruned = None
+
+    def hit(self, key, window):
+        if self._pruned != window:
+            # once per window per process is plenty
+            self._pruned = window
+            write(queries.prune_throttle, window - 1)
+        return write(queries.throttle_hit, key, window)
+
+
+class LoginThrottle:
+
+    def __init__(self, counter, window=DEFAULT_WINDOW, ip_limit=DEFAULT_IP_LIMIT,
+                 login_limit=DEFAULT_LOGIN_LIMIT, clock=time.time):
+        self.counter = counter
+        self.window = window
+        self.limits = {"ip": ip_limit, "login": login_limit}
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._stats = {"allowed": 0, "shed_ip": 0, "shed_login": 0}
+
+    def _over(self, kind, value, now):
+        window, offset = divmod(now, self.window)
+        current, previous = self.counter.hit(f"{kind}:{value}", int(window))
+        if estimate(current, previous, offset, self.window) <= self.limits[kind]:
+            return None
+        # the previous window's share keeps shrinking, the next window starts clean of this one
+        return max(1, math.ceil(self.window - offset))
+
+    # None if this attempt may go ahead, else seconds to tell the client to wait
+    def check(self, ip, login):
+        now = self.clock()
+        retry_after = self._over("ip", ip, now)
+        kind = "ip"
+        if retry_after is None and login:
+            retry_after = self._over("login", login.strip().lower(), now)
+            kind = "login"
+        with self._lock:
+            self._stats["allowed" if retry_after is None else f"shed_{kind}"] += 1
+        return retry_after
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, window=self.window, **{f"{kind}_limit": limit for kind, limit in self.limits.items()})
+
+
+def get_throttle(app=None):
+    app = app or current_app._get_current_object()
+    if not app.config.get("LOGIN_THROTTLE_ENABLED", True):
+        return None
+    with _limiter_lock:
+        throttle = app.extensions.get("login_throttle")
+        if throttle is None:
+            config = app.config
+            counter = SQLiteCounter() if config.get("LOGIN_THROTTLE_BACKEND") == "sqlite" else MemoryCounter()
+            throttle = app.extensions["login_throttle"] = LoginThrottle(
+                counter,
+                window=config.get("LOGIN_THROTTLE_WINDOW", DEFAULT_WINDOW),
+                ip_limit=config.get("LOGIN_THROTTLE_IP_LIMIT", DEFAULT_IP_LIMIT),
+                login_limit=config.get("LOGIN_THROTTLE_LOGIN_LIMIT", DEFAULT_LOGIN_LIMIT),
+            )
+    return throttle
+
+
+# None if the login attempt may go ahead, else seconds until it's worth retrying
+def check_login(ip, login):
+    throttle = get_throttle()
+    return None if throttle is None else throttle.check(ip or "unknown", login)
@@ -0,0 +1,168 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+from db import connect, get_db
+
+# optional single-writer pipeline (WRITE_QUEUE_ENABLED).
+#
+# sqlite only lets one connection write at a time, so instead of every request
+# thread fighting over the lock, mutations are handed to one writer thread.
+# it drains whatever is waiting into a single transaction (group commit): each
+# job runs inside its own SAVEPOINT so a failing job only undoes itself, then
+# the whole batch commits once and every caller's future is resolved.
+#
+# a job is a plain function fn(db, *args) that runs statements and returns a
+# value. it must not commit, write() takes care of that in both modes.
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "future")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class WriteQueue:
+
+    def __init__(self, database, pragmas=None, max_batch=64, max_wait=0.002):
+        self.database = database
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {"jobs": 0, "failed": 0, "batches": 0, "largest_batch": 0}
+        # autocommit mode, transactions are managed explicitly below
+        self._db = connect(database, pragmas, isolation_level=None)
+
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        job = _Job(fn, args, kwargs)
+        self._queue.put(job)
+        return job.future
+
+    def close(self, timeout=5):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            if job is None:
+                break
+
+            # collect whatever else arrives within max_wait into the same transaction
+            batch = [job]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+
+            self._commit_batch(batch)
+
+        self._db.close()
+
+    def _commit_batch(self, batch):
+        db = self._db
+        outcomes = []
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for job in batch:
+                db.execute("SAVEPOINT job")
+                try:
+                    result = job.fn(db, *job.args, **job.kwargs)
+                except Exception as e:
+                    db.execute("ROLLBACK TO job")
+                    db.execute("RELEASE job")
+                    outcomes.append((job, None, e))
+                else:
+                    db.execute("RELEASE job")
+                    outcomes.append((job, result, None))
+            db.execute("COMMIT")
+        except Exception as e:
+            # the commit itself failed, nothing in the batch was written
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            for job in batch:
+                job.future.set_exception(e)
+            with self._lock:
+                self._stats["failed"] += len(batch)
+            return
+
+        with self._lock:
+            self._stats["jobs"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+            self._stats["failed"] += sum(1 for _, _, error in outcomes if error is not None)
+
+        # only tell callers once their write is durable
+        for job, result, error in outcomes:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+
+_writer_lock = threading.Lock()
+
+
+def get_writer(app=None):
+    app = app or current_app
+    database = app.config["DATABASE"]
+    with _writer_lock:
+        writer = app.extensions.get("sqlite_writer")
+        if writer is None or writer.database != database:
+            if writer is not None:
+                writer.close()
+            writer = app.extensions["sqlite_writer"] = WriteQueue(
+                database,
+                pragmas=app.config.get("SQLITE_PRAGMAS"),
+                max_batch=app.config.get("WRITE_QUEUE_MAX_BATCH", 64),
+                max_wait=app.config.get("WRITE_QUEUE_MAX_WAIT", 0.002),
+            )
+    return writer
+
+
+# run a mutation and commit it. with WRITE_QUEUE_ENABLED it goes through the
+# writer thread and this blocks until its batch commits; otherwise it runs on
+# the request's connection in its own transaction. either way the job's return
+# value (or exception) comes back to the caller
+def write(fn, *args, **kwargs):
+    if current_app.config.get("WRITE_QUEUE_ENABLED"):
+        future = get_writer().submit(fn, *args, **kwargs)
+        return future.result(timeout=current_app.config.get("WRITE_QUEUE_TIMEOUT", 30))
+
+    db = get_db()
+    # take the write lock up front, a deferred transaction that upgrades
+    # later can fail with "database is locked" without waiting on busy_timeout
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        result = fn(db, *args, **kwargs)
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+    return result